@@ -4,39 +4,52 @@ It exposes an endpoint to obtain recommendations based on a query.
 """
 
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, conlist, validator
 from contextlib import asynccontextmanager
-from typing import List
-from src.utils.logger import logger
+from typing import List, Optional
+from src.utils.logger import logger, stats as logging_stats
 from src.model.embeddings import load_embedding_model
-from src.config.model_config import MODEL_CONFIG
+from src.config.model_config import MODEL_CONFIG, start_config_watcher
 
 # Import recommendation service
-from src.api.recommendation_service import get_movie_recommendations
+from src.api.recommendation_service import (
+    get_movie_recommendations_async,
+    get_movie_recommendations_batch,
+    get_similar_movies,
+    start_catalog_watcher,
+)
+from src.api.executor import InferenceExecutor, Overloaded
+from src.api.filter_index import date_to_days
+from src.api.preload import ModelPreloader, ModelNotReady
+from src.utils.cache_manager import CACHE
+from src.utils.artifact_cache import ARTIFACT_CACHE
+from src.api.result_cache import RESULT_CACHE
+from src.model.query_cache import QUERY_CACHE
+from src.utils.metrics import add_collector, render as render_metrics
 
 
+# Bounded pool running blocking inference work; owned by the lifespan handler
+inference_executor = InferenceExecutor.from_env()
+# Background model loading and readiness state
+model_preloader = ModelPreloader()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Lifecycle event handler for the FastAPI application.
     Loads models on startup and ensures proper cleanup on shutdown.
     """
-    # Load models on startup
-    for model_name, config in MODEL_CONFIG.items():
-        if config.get("preload", False):
-            logger.info(f"Preloading model: {model_name}")
-            try:
-                # Warm-up: execute a complete recommendation
-                logger.info(f"Warming up complete pipeline for model: {model_name}")
-                warm_up_query = "Action movie with explosions and car chases"
-                _ = get_movie_recommendations(
-                    sentence=warm_up_query,
-                    model_name=model_name,
-                    top_k=5
-                )
-                logger.info(f"Model {model_name} warmed up successfully")
-            except Exception as e:
-                logger.error(f"Error preloading model '{model_name}': {e}")
+    # Pick up models_config.json / SSM changes without a config read per request
+    start_config_watcher()
+    # Swap in catalog generations published by incremental ingestion
+    start_catalog_watcher()
+    inference_executor.start()
+
+    # Load preloaded models concurrently in the background; /health/ready
+    # reports when they are all warmed up
+    model_preloader.start()
+    model_preloader.preload()
 
     # 'yield' gives control to the app; once the app stops, the code after
     # yield executes, equivalent to 'shutdown' or final cleanup.
@@ -44,6 +57,8 @@ async def lifespan(app: FastAPI):
 
     # Log application shutdown
     logger.info("The app is shutting down...")
+    model_preloader.shutdown()
+    inference_executor.shutdown()
 
 # Define FastAPI application with lifespan
 app = FastAPI(title="Movie Recommender API",lifespan=lifespan)
@@ -53,10 +68,96 @@ app = FastAPI(title="Movie Recommender API",lifespan=lifespan)
 async def read_root():
     return {"message": "Welcome to the Movie Recommender API."}
 
-# Request payload model for recommendation
-class RecommendRequest(BaseModel):
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request, exc: Overloaded):
+    logger.warning(f"Rejected request to {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(ModelNotReady)
+async def model_not_ready_handler(request, exc: ModelNotReady):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc), "model_name": exc.model_name, "state": exc.state},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.get("/health/live")
+async def health_live():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness: 200 once every preloaded model is warmed up, 503 before, with per-model state."""
+    readiness = model_preloader.readiness()
+    return JSONResponse(status_code=200 if readiness["ready"] else 503, content=readiness)
+
+@app.get("/stats/executor")
+async def executor_stats():
+    """Queue depth, rejections, queue-wait and per-stage latency of the inference executor."""
+    return inference_executor.stats()
+
+@app.get("/stats/cache")
+async def cache_stats():
+    """Size, budget, hits, evictions and per-entry load time of the model/data cache."""
+    return {**CACHE.stats(), "artifacts": ARTIFACT_CACHE.stats(), "results": RESULT_CACHE.stats()}
+
+def _collect_metrics() -> list:
+    """Cache, memory, executor and logging values exported by /metrics (read at scrape time)."""
+    cache, results, queries = CACHE.stats(), RESULT_CACHE.stats(), QUERY_CACHE.stats()
+    artifacts, executor, logs = ARTIFACT_CACHE.stats(), inference_executor.stats(), logging_stats()
+    return [
+        ("movie_recommender_cache_hits_total", "counter", "Lookups answered from a cache.", [
+            ({"cache": "data"}, cache["hits"]),
+            ({"cache": "query_embeddings"}, queries["hits"]),
+            ({"cache": "results"}, results["hits"]),
+            ({"cache": "artifacts"}, artifacts["hits"]),
+        ]),
+        ("movie_recommender_cache_misses_total", "counter", "Lookups that had to load, encode, score or download.", [
+            ({"cache": "data"}, cache["misses"]),
+            ({"cache": "query_embeddings"}, queries["misses"]),
+            ({"cache": "results"}, results["misses"]),
+            ({"cache": "artifacts"}, artifacts["downloads"]),
+        ]),
+        ("movie_recommender_cache_evictions_total", "counter", "Entries evicted from a cache.", [
+            ({"cache": "data"}, cache["evictions"]),
+            ({"cache": "query_embeddings"}, queries["evictions"]),
+            ({"cache": "results"}, results["evictions"]),
+            ({"cache": "artifacts"}, artifacts["evictions"]),
+        ]),
+        ("movie_recommender_cached_bytes", "gauge",
+         "Measured memory of each loaded model, vector index and catalog.",
+         [({"namespace": entry["namespace"], "key": entry["key"]}, entry["size_mb"] * 1024**2)
+          for entry in cache["entries"]]),
+        ("movie_recommender_cache_budget_bytes", "gauge", "Memory budget of the data cache (0: none).",
+         [({}, cache["budget_mb"] * 1024**2)]),
+        ("movie_recommender_process_rss_bytes", "gauge", "Resident memory of this process.",
+         [({}, cache["process_rss_mb"] * 1024**2)]),
+        ("movie_recommender_executor_in_flight", "gauge", "Requests admitted to the inference executor.",
+         [({}, executor["in_flight"])]),
+        ("movie_recommender_executor_queue_depth", "gauge", "Admitted requests waiting for a worker.",
+         [({}, executor["queued"])]),
+        ("movie_recommender_executor_rejected_total", "counter", "Requests rejected with 503 (queue full).",
+         [({}, executor["rejected"])]),
+        ("movie_recommender_log_records_dropped_total", "counter", "Log records dropped by sampling or a full queue.",
+         [({"reason": "sampled", "module": module}, count) for module, count in logs["sampled_out"].items()]
+         + [({"reason": "queue_full"}, logs["queue_dropped"])]),
+    ]
+
+add_collector(_collect_metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: stage latency histograms per model, cache counters, memory and executor gauges."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# Single query with its own filters and top_k (also used by /recommend/batch)
+class BatchQuery(BaseModel):
     sentence: str
-    model_name: str
     top_k: int = 5
     date_from: str = "1902-04-17"
     date_to: str = "2021-03-24"
@@ -65,6 +166,16 @@ class RecommendRequest(BaseModel):
     min_rating: float = 0.0
     max_rating: float = 10.0
 
+    @validator("date_from", "date_to")
+    def check_date(cls, value):
+        # An unparsable date is a client error (422), not a failure of the filter
+        date_to_days(value)
+        return value
+
+# Request payload model for recommendation
+class RecommendRequest(BatchQuery):
+    model_name: str
+
 # Response model for a movie recommendation
 class Recommendation(BaseModel):
     title: str
@@ -79,35 +190,136 @@ class RecommendResponse(BaseModel):
     recommendations: List[Recommendation]
     model_info: dict  # Extra debug info to verify which model is used.
 
+# Request payload model for batch recommendation (one model for all queries)
+class BatchRecommendRequest(BaseModel):
+    model_name: str
+    queries: conlist(BatchQuery, min_items=1)
+
+# Recommendations of one query within a batch
+class BatchResult(BaseModel):
+    sentence: str
+    recommendations: List[Recommendation]
+
+# Response model for the /recommend/batch endpoint
+class BatchRecommendResponse(BaseModel):
+    results: List[BatchResult]
+    model_info: dict
+
+# Response model for the /similar/{movie_id} endpoint
+class SimilarResponse(BaseModel):
+    movie_id: int
+    recommendations: List[Recommendation]
+    model_info: dict
+
+def _model_info(model_name: str) -> dict:
+    """Extra debug info to verify which model is used."""
+    config = MODEL_CONFIG.get(model_name, {})
+    return {
+        "model_name": model_name,
+        "model_type": config.get("type", "sentence_transformer"),
+        "model_path": config.get("model_path", model_name)
+    }
+
 @app.post("/recommend", response_model=RecommendResponse)
 async def recommend(request: RecommendRequest):
-    try:
-        recommendations = get_movie_recommendations(
-            sentence=request.sentence,
-            model_name=request.model_name,
-            top_k=request.top_k,
-            date_from=request.date_from,
-            date_to=request.date_to,
-            min_popularity=request.min_popularity,
-            max_popularity=request.max_popularity,
-            min_rating=request.min_rating,
-            max_rating=request.max_rating
-        )
-
-        # Get the configuration used for the model to verify the selected model
-        from src.config.model_config import MODEL_CONFIG
-        config = MODEL_CONFIG.get(request.model_name, {})
-        model_info = {
-            "model_name": request.model_name,
-            "model_type": config.get("type", "sentence_transformer"),
-            "model_path": config.get("model_path", request.model_name)
-        }
-
-        return RecommendResponse(
-            sentence=request.sentence,
-            recommendations=recommendations,
-            model_info=model_info
-        )
-    except Exception as e:
-        logger.error(f"Error in /recommend endpoint: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+    # Fast 503 instead of a cold model load inside the request
+    model_preloader.ensure_ready(request.model_name)
+    # Reject early with 503 when the inference queue is full
+    async with inference_executor.admit():
+        try:
+            recommendations = await get_movie_recommendations_async(
+                executor=inference_executor,
+                sentence=request.sentence,
+                model_name=request.model_name,
+                top_k=request.top_k,
+                date_from=request.date_from,
+                date_to=request.date_to,
+                min_popularity=request.min_popularity,
+                max_popularity=request.max_popularity,
+                min_rating=request.min_rating,
+                max_rating=request.max_rating
+            )
+
+            # Get the configuration used for the model to verify the selected model
+            model_info = _model_info(request.model_name)
+
+            return RecommendResponse(
+                sentence=request.sentence,
+                recommendations=recommendations,
+                model_info=model_info
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error in /recommend endpoint: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/recommend/batch", response_model=BatchRecommendResponse)
+async def recommend_batch(request: BatchRecommendRequest):
+    # Fast 503 instead of a cold model load inside the request
+    model_preloader.ensure_ready(request.model_name)
+    # Reject early with 503 when the inference queue is full
+    async with inference_executor.admit():
+        try:
+            queries = [query.dict() for query in request.queries]
+            # The whole batch is encoded and scored in one executor call
+            results = await inference_executor.run(
+                "batch",
+                get_movie_recommendations_batch,
+                queries=queries,
+                model_name=request.model_name
+            )
+
+            return BatchRecommendResponse(
+                results=[
+                    BatchResult(sentence=query.sentence, recommendations=recommendations)
+                    for query, recommendations in zip(request.queries, results)
+                ],
+                model_info=_model_info(request.model_name)
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error in /recommend/batch endpoint: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/similar/{movie_id}", response_model=SimilarResponse)
+async def similar(movie_id: int, model_name: str, top_k: int = 5, date_from: Optional[str] = None,
+                  date_to: Optional[str] = None, min_popularity: Optional[float] = None,
+                  max_popularity: Optional[float] = None, min_rating: Optional[float] = None,
+                  max_rating: Optional[float] = None):
+    """Movies similar to a catalog movie, from the model's neighbour table when it has one."""
+    for date in (date_from, date_to):
+        if date is not None:
+            try:
+                date_to_days(date)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+    # Fast 503 instead of a cold model load inside the request
+    model_preloader.ensure_ready(model_name)
+    # Reject early with 503 when the inference queue is full
+    async with inference_executor.admit():
+        try:
+            recommendations = await inference_executor.run(
+                "similar",
+                get_similar_movies,
+                movie_id=movie_id,
+                model_name=model_name,
+                top_k=top_k,
+                date_from=date_from,
+                date_to=date_to,
+                min_popularity=min_popularity,
+                max_popularity=max_popularity,
+                min_rating=min_rating,
+                max_rating=max_rating
+            )
+            return SimilarResponse(
+                movie_id=movie_id,
+                recommendations=recommendations,
+                model_info=_model_info(model_name)
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error in /similar endpoint: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,190 @@
+"""
+In-memory movie catalog used by the recommendation service.
+Besides the DataFrame it keeps, built once at load time, the filter index and
+a compact column store (numpy arrays) used to materialize results with one
+fancy-index per column instead of per-row DataFrame lookups.
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+from src.api.filter_index import DATE_COLUMN, FilterIndex
+from src.api.title_index import TitleIndex
+
+
+def _intern_strings(values) -> np.ndarray:
+    """Object array of interned strings (missing values become "")."""
+    return np.array(
+        [sys.intern(value) if isinstance(value, str) else "" for value in values],
+        dtype=object
+    )
+
+
+def _float_column(values: pd.Series) -> np.ndarray:
+    array = values.to_numpy()
+    return array if array.dtype in (np.float32, np.float64) else array.astype(np.float64)
+
+
+def _to_floats(values: np.ndarray) -> list:
+    """
+    Python floats of the selected values; float32 values go through their
+    shortest repr so 7.3 stays 7.3 instead of 7.300000190734863.
+    """
+    if values.dtype == np.float32:
+        return [float(value) for value in values.astype(str)]
+    return values.tolist()
+
+
+# Strings stored as one UTF-8 byte buffer plus byte offsets. Used for catalogs
+# attached from shared memory: only the rows of a result are decoded, so no
+# per-process Python string objects are created.
+class StringColumn:
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, values):
+        encoded = [value.encode("utf-8") if isinstance(value, str) else b"" for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, rows) -> np.ndarray:
+        rows = np.asarray(rows, dtype=np.int64)
+        starts, stops = self.offsets[rows].tolist(), self.offsets[rows + 1].tolist()
+        return np.array([self.data[start:stop].tobytes().decode("utf-8") for start, stop in zip(starts, stops)],
+                        dtype=object)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + self.offsets.nbytes
+
+
+class Catalog:
+    # Version of the to_arrays() layout (part of shared memory segment names)
+    arrays_version = 2
+
+    def __init__(self, df: pd.DataFrame):
+        self._df = df
+        self.filter_index = FilterIndex(df)
+        # Column store for result materialization
+        self.titles = _intern_strings(df["title"].to_numpy(dtype=object))
+        self.overviews = _intern_strings(df["overview"].to_numpy(dtype=object))
+        # Numeric columns keep their stored dtype (float32 memory maps of a column store)
+        self.popularity = _float_column(df["popularity"])
+        self.ratings = _float_column(df["vote_average"])
+        self.ids = df["id"].to_numpy() if "id" in df.columns else None
+        # Hashed title/id lookups (built once) and lazy type-ahead search
+        self.title_index = TitleIndex(self.titles, self.ids)
+
+    def __len__(self):
+        return self.filter_index.size
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """The catalog DataFrame (built on first use for catalogs attached from shared memory)."""
+        if self._df is None:
+            release_days = self.filter_index.columns["release_date"].values
+            release_dates = np.full(len(self), np.datetime64("NaT"), dtype="datetime64[s]")
+            known = ~np.isnan(release_days)
+            release_dates[known] = release_days[known].astype(np.int64).astype("datetime64[D]")
+            rows = np.arange(len(self))
+            columns = {"title": self.titles[rows], "overview": self.overviews[rows], "release_date": release_dates,
+                       "popularity": self.popularity, "vote_average": self.ratings}
+            if self.ids is not None:
+                columns = {"id": self.ids, **columns}
+            self._df = pd.DataFrame(columns, copy=False)
+        return self._df
+
+    @property
+    def nbytes(self) -> int:
+        """Footprint of the DataFrame, filter index and column store (strings are shared)."""
+        columns = (self.titles, self.overviews, self.popularity, self.ratings)
+        df_bytes = 0 if self._df is None else int(self._df.memory_usage(deep=True).sum())
+        if getattr(self, "segment", None) is not None:
+            # Attached from shared memory: only the lazily built DataFrame is private
+            return df_bytes
+        return df_bytes + self.filter_index.nbytes + self.title_index.nbytes + sum(c.nbytes for c in columns)
+
+    def title_rows(self, titles) -> np.ndarray:
+        """Row ids of the movies with any of the given titles (every row of a duplicate title)."""
+        return self.title_index.title_rows(titles)
+
+    def id_rows(self, ids) -> np.ndarray:
+        """Row ids of the movies with any of the given ids."""
+        return self.title_index.id_rows(ids)
+
+    def suggest_titles(self, query: str, limit: int = 20) -> list:
+        """
+        Type-ahead matches of a partial title, most relevant (then most popular) first.
+
+        Returns:
+            list of (label, value) tuples: the label is the title with its release
+            year, so duplicate titles can be told apart; the value is the movie id
+            (the title when the catalog has no id column)
+        """
+        rows = self.title_index.suggest(query, limit, rank=self.popularity)
+        titles = self.titles[rows].tolist()
+        days = self.filter_index.columns[DATE_COLUMN].values[rows]
+        suggestions = []
+        for row, title, day in zip(rows.tolist(), titles, days.tolist()):
+            label = title if np.isnan(day) else f"{title} ({np.datetime64(int(day), 'D').astype(object).year})"
+            suggestions.append((label, title if self.ids is None else self.ids[row].item()))
+        return suggestions
+
+    def to_arrays(self) -> dict:
+        """The serving columns and filter index as flat numpy arrays (for shared memory)."""
+        titles = self.titles if isinstance(self.titles, StringColumn) else StringColumn.from_strings(self.titles)
+        overviews = (self.overviews if isinstance(self.overviews, StringColumn)
+                     else StringColumn.from_strings(self.overviews))
+        arrays = {
+            "title.data": titles.data, "title.offsets": titles.offsets,
+            "overview.data": overviews.data, "overview.offsets": overviews.offsets,
+            "popularity": self.popularity, "vote_average": self.ratings,
+            **self.filter_index.to_arrays(),
+            **self.title_index.to_arrays(),
+        }
+        if self.ids is not None:
+            arrays["id"] = self.ids
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: dict):
+        """Builds a catalog over to_arrays() output without copying it."""
+        catalog = cls.__new__(cls)
+        catalog._df = None
+        catalog.titles = StringColumn(arrays["title.data"], arrays["title.offsets"])
+        catalog.overviews = StringColumn(arrays["overview.data"], arrays["overview.offsets"])
+        catalog.popularity = arrays["popularity"]
+        catalog.ratings = arrays["vote_average"]
+        catalog.ids = arrays.get("id")
+        catalog.filter_index = FilterIndex.from_arrays(len(catalog.titles), arrays)
+        catalog.title_index = TitleIndex.from_arrays(catalog.titles, arrays)
+        return catalog
+
+    def records(self, row_ids, scores) -> list:
+        """
+        Builds the recommendation dicts for the given catalog row ids and scores.
+        """
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        titles = self.titles[row_ids].tolist()
+        overviews = self.overviews[row_ids].tolist()
+        popularity = _to_floats(self.popularity[row_ids])
+        ratings = _to_floats(self.ratings[row_ids])
+        scores = np.asarray(scores, dtype=np.float64).tolist()
+        return [
+            {
+                "title": title,
+                "overview": overview,
+                "score": score,
+                "popularity": movie_popularity,
+                "rating": rating,
+            }
+            for title, overview, score, movie_popularity, rating
+            in zip(titles, overviews, scores, popularity, ratings)
+        ]
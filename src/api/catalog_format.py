@@ -0,0 +1,213 @@
+"""
+Columnar storage of the movie catalog.
+A column store is a directory ('movies_processed.cols') with one .npy file per
+column and a schema.json. Types are fixed when it is written: dates are int32
+days since the epoch, numerics float32 (integers int32/int64), low-cardinality
+strings categorical codes, and other strings one UTF-8 blob plus offsets.
+Loading memory-maps the numeric arrays (zero-copy) and reads only the
+requested columns, instead of parsing the whole CSV:
+
+    python -m src.api.catalog_format convert --csv data/processed/movies_processed.csv
+    python -m src.api.catalog_format report --csv data/processed/movies_processed.csv
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.utils.logger import logger
+
+# Columns the service needs (catalog ids, result fields and filter columns)
+SERVING_COLUMNS = ("id", "title", "overview", "release_date", "popularity", "vote_average")
+DATE_COLUMNS = ("release_date",)
+# String columns with at most this share of distinct values are stored as categories
+CATEGORY_MAX_RATIO = 0.1
+_MISSING_DAY = np.iinfo(np.int32).min
+_SCHEMA_FILE = "schema.json"
+
+
+def columnar_path_for(catalog_path: str) -> str:
+    """'movies_processed.csv' -> 'movies_processed.cols'"""
+    return f"{os.path.splitext(catalog_path)[0]}.cols"
+
+
+def _source_stamp(path: str) -> dict:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _column_kind(name: str, values: pd.Series) -> str:
+    if name in DATE_COLUMNS:
+        return "date"
+    if pd.api.types.is_bool_dtype(values) or pd.api.types.is_float_dtype(values):
+        return "float32"
+    if pd.api.types.is_integer_dtype(values):
+        fits = values.empty or (values.min() >= np.iinfo(np.int32).min and values.max() <= np.iinfo(np.int32).max)
+        return "int32" if fits else "int64"
+    if values.nunique(dropna=True) <= CATEGORY_MAX_RATIO * len(values):
+        return "category"
+    return "string"
+
+
+def _write_column(directory: str, name: str, kind: str, values: pd.Series) -> dict:
+    path = os.path.join(directory, name)
+    if kind == "date":
+        dates = pd.to_datetime(values, errors="coerce")
+        days = dates.to_numpy(dtype="datetime64[D]").astype(np.int64)
+        days[dates.isna().to_numpy()] = _MISSING_DAY
+        np.save(f"{path}.npy", days.astype(np.int32))
+    elif kind in ("float32", "int32", "int64"):
+        np.save(f"{path}.npy", values.to_numpy(dtype=kind))
+    elif kind == "category":
+        codes, categories = pd.factorize(values, use_na_sentinel=True)
+        np.save(f"{path}.npy", codes.astype(np.int32))
+        return {"kind": kind, "categories": [str(category) for category in categories]}
+    else:
+        # Offsets count characters of the decoded blob, so reading decodes once
+        # and slices instead of decoding every row
+        texts = [value if isinstance(value, str) else "" for value in values]
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum([len(text) for text in texts], out=offsets[1:])
+        np.save(f"{path}.npy", np.frombuffer("".join(texts).encode("utf-8"), dtype=np.uint8))
+        np.save(f"{path}.offsets.npy", offsets)
+    return {"kind": kind}
+
+
+def write_columnar(df: pd.DataFrame, path: str, source_path: str = None) -> dict:
+    """
+    Writes a DataFrame as a column store directory, replacing any previous one.
+
+    Args:
+        df: Catalog DataFrame
+        path: Output directory ('<base>.cols')
+        source_path: CSV the data came from; its size and mtime are recorded so
+            a column store older than its CSV is not used
+
+    Returns:
+        dict: The schema
+    """
+    tmp_path = f"{path}.{os.getpid()}.part"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    columns = {name: _write_column(tmp_path, name, _column_kind(name, df[name]), df[name]) for name in df.columns}
+    schema = {"rows": len(df), "columns": columns, "source": _source_stamp(source_path) if source_path else None}
+    with open(os.path.join(tmp_path, _SCHEMA_FILE), "w") as f:
+        json.dump(schema, f, indent=2)
+    # Swap directories: readers see the old or the new store, never a partial one
+    old_path = f"{path}.{os.getpid()}.old"
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return schema
+
+
+def read_schema(path: str) -> dict:
+    with open(os.path.join(path, _SCHEMA_FILE)) as f:
+        return json.load(f)
+
+
+def is_current(path: str, source_path: str) -> bool:
+    """True when a column store exists and was written from the current version of source_path."""
+    if not os.path.exists(os.path.join(path, _SCHEMA_FILE)):
+        return False
+    source = read_schema(path).get("source")
+    return source is None or not os.path.exists(source_path) or source == _source_stamp(source_path)
+
+
+def _read_column(path: str, name: str, spec: dict) -> pd.Series:
+    values = np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+    kind = spec["kind"]
+    if kind == "date":
+        dates = values.astype("datetime64[D]").astype("datetime64[s]")
+        dates[values == _MISSING_DAY] = np.datetime64("NaT")
+        return pd.Series(dates, name=name, copy=False)
+    if kind == "category":
+        return pd.Series(pd.Categorical.from_codes(values, categories=spec["categories"]), name=name)
+    if kind == "string":
+        offsets = np.load(os.path.join(path, f"{name}.offsets.npy"))
+        text = values.tobytes().decode("utf-8")
+        bounds = offsets.tolist()
+        texts = np.array([text[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])], dtype=object)
+        return pd.Series(texts, name=name, dtype=object, copy=False)
+    # Numeric columns stay read-only memory maps shared through the page cache
+    return pd.Series(values, name=name, copy=False)
+
+
+def read_columnar(path: str, columns=SERVING_COLUMNS) -> pd.DataFrame:
+    """
+    Loads (the given columns of) a column store as a DataFrame.
+
+    Args:
+        path: Column store directory
+        columns: Columns to read; columns missing from the store are skipped
+            (None reads every column)
+    """
+    schema = read_schema(path)
+    names = [name for name in schema["columns"] if columns is None or name in columns]
+    return pd.DataFrame({name: _read_column(path, name, schema["columns"][name]) for name in names}, copy=False)
+
+
+def read_catalog_file(csv_path: str, columns=SERVING_COLUMNS) -> pd.DataFrame:
+    """
+    Reads a local catalog: from its column store when one is current (or the
+    path is a '.cols' directory), otherwise from the CSV, restricted to columns.
+    """
+    if csv_path.endswith(".cols"):
+        return read_columnar(csv_path, columns)
+    columnar_path = columnar_path_for(csv_path)
+    if is_current(columnar_path, csv_path):
+        return read_columnar(columnar_path, columns)
+    logger.info(f"No current column store for {csv_path}, parsing the CSV")
+    return pd.read_csv(csv_path, usecols=lambda name: columns is None or name in columns)
+
+
+def _measure(load_fn, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        load_fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the catalog CSV to a column store or time its loading.")
+    parser.add_argument("command", choices=["convert", "report"])
+    parser.add_argument("--csv", default=os.getenv("MOVIES_CSV_PATH", "data/processed/movies_processed.csv"))
+    parser.add_argument("--output", default=None, help="Column store directory (defaults to '<base>.cols')")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    output = args.output or columnar_path_for(args.csv)
+
+    if args.command == "convert":
+        start = time.perf_counter()
+        schema = write_columnar(pd.read_csv(args.csv), output, source_path=args.csv)
+        kinds = ", ".join(f"{name}: {spec['kind']}" for name, spec in schema["columns"].items())
+        logger.info(f"Wrote {schema['rows']} rows to {output} in {time.perf_counter() - start:.1f}s ({kinds})")
+        return
+
+    from src.api.catalog import Catalog
+    loaders = {
+        "csv (all columns)": lambda: pd.read_csv(args.csv),
+        "csv (serving columns)": lambda: pd.read_csv(args.csv, usecols=lambda name: name in SERVING_COLUMNS),
+        "column store": lambda: read_columnar(output),
+        "column store + Catalog": lambda: Catalog(read_columnar(output)),
+        "csv + Catalog": lambda: Catalog(pd.read_csv(args.csv, usecols=lambda name: name in SERVING_COLUMNS)),
+    }
+    csv_mb = os.path.getsize(args.csv) / 1024**2
+    store_mb = sum(entry.stat().st_size for entry in os.scandir(output)) / 1024**2
+    print(f"Catalog: {args.csv} ({csv_mb:.1f} MB) | column store: {output} ({store_mb:.1f} MB) | "
+          f"best of {args.repeats}, warm page cache")
+    print("| loader | seconds |")
+    print("|--------|---------|")
+    for name, load_fn in loaders.items():
+        print(f"| {name} | {_measure(load_fn, args.repeats):.3f} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Catalog generations.
+A generation is one consistent set of serving artifacts: the movies catalog
+file and, for every model, an embeddings matrix with the same rows in the same
+order. Incremental ingestion (src.model.ingest_catalog) writes a new
+generation's files under new names ('movies.g3.csv', 'embeddings_x.g3.npy')
+and then atomically replaces the generation manifest that points to them, so
+a process never pairs a catalog with embeddings of another generation.
+
+Without a manifest the catalog is MOVIES_CSV_PATH and each model's embeddings
+are its configured embeddings_path (generation 0).
+"""
+import json
+import os
+from types import MappingProxyType
+from typing import Mapping, NamedTuple
+
+DEFAULT_CATALOG_PATH = "data/processed/movies_processed.csv"
+
+
+class CatalogGeneration(NamedTuple):
+    generation: int
+    catalog_path: str
+    embeddings: Mapping
+    rows: int
+
+
+def catalog_base_path() -> str:
+    """The configured catalog (MOVIES_CSV_PATH), which also locates the manifest."""
+    return os.getenv("MOVIES_CSV_PATH", DEFAULT_CATALOG_PATH)
+
+
+def manifest_path_for(catalog_path: str) -> str:
+    """'movies_processed.csv' -> 'movies_processed.generation.json'"""
+    return f"{os.path.splitext(catalog_path)[0]}.generation.json"
+
+
+def generation_path(path: str, generation: int) -> str:
+    """Path of a generation's copy of an artifact: 'embeddings_x.npy' -> 'embeddings_x.g3.npy'."""
+    base, extension = os.path.splitext(path)
+    return f"{base}.g{generation}{extension}"
+
+
+def read_generation(catalog_path: str = None) -> CatalogGeneration:
+    """
+    Reads the current generation from the manifest next to the catalog
+    (generation 0 when there is no manifest or the catalog is on S3).
+    """
+    catalog_path = catalog_path or catalog_base_path()
+    manifest_path = manifest_path_for(catalog_path)
+    if catalog_path.startswith("s3://") or not os.path.exists(manifest_path):
+        return CatalogGeneration(0, catalog_path, MappingProxyType({}), -1)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    return CatalogGeneration(
+        generation=int(manifest["generation"]),
+        catalog_path=manifest["catalog_path"],
+        embeddings=MappingProxyType(dict(manifest.get("embeddings", {}))),
+        rows=int(manifest.get("rows", -1)),
+    )
+
+
+def write_generation(catalog_path: str, generation: CatalogGeneration):
+    """Atomically publishes a generation manifest (the swap point for running processes)."""
+    manifest_path = manifest_path_for(catalog_path)
+    tmp_path = f"{manifest_path}.{os.getpid()}.part"
+    with open(tmp_path, "w") as f:
+        json.dump({
+            "generation": generation.generation,
+            "catalog_path": generation.catalog_path,
+            "embeddings": dict(generation.embeddings),
+            "rows": generation.rows,
+        }, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def embeddings_path_for(generation: CatalogGeneration, model_name: str, config: Mapping) -> str:
+    """The embeddings of a model in the given generation (its configured path if not listed)."""
+    return generation.embeddings.get(model_name) or config.get("embeddings_path")
@@ -0,0 +1,167 @@
+"""
+Inference executor for the FastAPI app.
+Blocking work (data loading, encoding, filtering and scoring) runs in a
+bounded worker pool instead of on the event loop. Requests beyond the pool
+capacity plus a bounded queue are rejected early (admission control) so the
+API can answer 503 with Retry-After instead of piling up latency.
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+
+import numpy as np
+
+from src.utils.logger import logger
+
+
+class Overloaded(Exception):
+    """Raised when a request is rejected because the executor queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Inference queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+# Fixed-size window of recent durations per stage, summarized on demand
+class _LatencyWindow:
+    def __init__(self, size: int = 1024):
+        self._values = defaultdict(lambda: deque(maxlen=size))
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self._values[stage].append(seconds * 1000)
+            self._counts[stage] += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            snapshot = {stage: (list(values), self._counts[stage]) for stage, values in self._values.items()}
+        result = {}
+        for stage, (values, count) in snapshot.items():
+            p50, p95, p99 = np.percentile(values, [50, 95, 99]) if values else (0.0, 0.0, 0.0)
+            result[stage] = {
+                "count": count,
+                "avg_ms": float(np.mean(values)) if values else 0.0,
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+            }
+        return result
+
+
+class InferenceExecutor:
+    def __init__(self, kind: str = "thread", max_workers: int = None, max_queue: int = 64,
+                 retry_after: int = 1):
+        """
+        Args:
+            kind: "thread" (shared in-process caches) or "process" (for GIL-bound work;
+                  each worker process keeps its own caches)
+            max_workers: Pool size (defaults to the number of CPU cores)
+            max_queue: Requests allowed to wait for a worker before new ones are rejected
+            retry_after: Seconds suggested to rejected clients
+        """
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unsupported executor kind: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.pool = None
+        self.in_flight = 0
+        self.rejected = 0
+        self.latencies = _LatencyWindow()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            kind=os.getenv("INFERENCE_EXECUTOR", "thread").lower(),
+            max_workers=int(os.getenv("INFERENCE_WORKERS", "0")) or None,
+            max_queue=int(os.getenv("INFERENCE_MAX_QUEUE", "64")),
+            retry_after=int(os.getenv("INFERENCE_RETRY_AFTER_SECONDS", "1")),
+        )
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def start(self):
+        if self.pool is not None:
+            return
+        if self.kind == "process":
+            self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers)
+        else:
+            self.pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="inference"
+            )
+        logger.info(f"Inference executor started ({self.kind}, {self.max_workers} workers, "
+                    f"queue {self.max_queue})")
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+            logger.info("Inference executor shut down")
+
+    @asynccontextmanager
+    async def admit(self):
+        """
+        Admission control for one request.
+
+        Raises:
+            Overloaded: If the pool and its queue are already full
+        """
+        # The event loop is single-threaded, so this check-and-increment is atomic
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            raise Overloaded(self.retry_after)
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    async def run(self, stage: str, fn, *args, **kwargs):
+        """
+        Runs fn(*args, **kwargs) in the pool, recording its queue wait and duration.
+        """
+        if self.pool is None:
+            raise RuntimeError("Inference executor is not started")
+        submitted = time.perf_counter()
+        if self.kind == "process":
+            # Callables must be picklable; the wait is measured end to end
+            result = await asyncio.get_running_loop().run_in_executor(
+                self.pool, _call, fn, args, kwargs
+            )
+            self.latencies.record(stage, time.perf_counter() - submitted)
+            return result
+
+        def timed():
+            started = time.perf_counter()
+            self.latencies.record("queue_wait", started - submitted)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.latencies.record(stage, time.perf_counter() - started)
+
+        return await asyncio.get_running_loop().run_in_executor(self.pool, timed)
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - self.max_workers),
+            "rejected": self.rejected,
+            "stages": self.latencies.summary(),
+        }
+
+
+def _call(fn, args, kwargs):
+    return fn(*args, **kwargs)
@@ -0,0 +1,157 @@
+"""
+Columnar filter index over the movie catalog.
+It is built once when the catalog is loaded and resolves the date, popularity
+and rating range filters to candidate row ids with binary search instead of
+building pandas boolean masks on every request.
+"""
+import numpy as np
+import pandas as pd
+
+# Catalog columns covered by the index
+DATE_COLUMN = "release_date"
+NUMERIC_COLUMNS = ("popularity", "vote_average")
+
+
+def date_to_days(value) -> int:
+    """
+    Converts a 'YYYY-MM-DD' date (string or timestamp) to days since the epoch.
+
+    Raises:
+        ValueError: If the value cannot be parsed as a date
+    """
+    timestamp = pd.Timestamp(value)
+    if pd.isna(timestamp):
+        raise ValueError(f"Invalid date: {value}")
+    return int(timestamp.value // (86400 * 10**9))
+
+
+# Sorted view of one column: values in ascending order plus the row ids that
+# produce that order. Rows with missing values are left out, so they never
+# match a range (as with the previous pandas comparisons).
+class _SortedColumn:
+    def __init__(self, values: np.ndarray):
+        self.values = values
+        valid_rows = np.flatnonzero(~np.isnan(values))
+        order = np.argsort(values[valid_rows], kind="stable")
+        self.row_ids = valid_rows[order]
+        self.sorted_values = values[self.row_ids]
+
+    @classmethod
+    def from_arrays(cls, values: np.ndarray, row_ids: np.ndarray, sorted_values: np.ndarray):
+        column = cls.__new__(cls)
+        column.values, column.row_ids, column.sorted_values = values, row_ids, sorted_values
+        return column
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.row_ids.nbytes + self.sorted_values.nbytes
+
+    def range(self, low=None, high=None):
+        """Returns the (start, stop) slice of row_ids whose value is in [low, high]."""
+        # Bounds are compared at the column's precision (float32 columns included)
+        cast = self.sorted_values.dtype.type
+        start = 0 if low is None else np.searchsorted(self.sorted_values, cast(low), side="left")
+        stop = len(self.sorted_values) if high is None else np.searchsorted(self.sorted_values, cast(high), side="right")
+        return int(start), int(max(start, stop))
+
+
+class FilterIndex:
+    def __init__(self, df: pd.DataFrame):
+        """
+        Builds the sorted columns from the catalog DataFrame.
+        Dates are parsed once to integer days (missing/invalid dates become NaN).
+        """
+        self.size = len(df)
+        release_dates = pd.to_datetime(df[DATE_COLUMN], errors="coerce")
+        days = (release_dates.to_numpy(dtype="datetime64[D]").astype(np.int64)).astype(np.float64)
+        days[release_dates.isna().to_numpy()] = np.nan
+        self.columns = {DATE_COLUMN: _SortedColumn(days)}
+        for column in NUMERIC_COLUMNS:
+            values = df[column].to_numpy()
+            if values.dtype not in (np.float32, np.float64):
+                values = values.astype(np.float64)
+            self.columns[column] = _SortedColumn(values)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self.columns.values())
+
+    def to_arrays(self) -> dict:
+        """The sorted columns as flat arrays ('<column>.values', '.row_ids', '.sorted_values')."""
+        arrays = {}
+        for name, column in self.columns.items():
+            arrays[f"{name}.values"] = column.values
+            arrays[f"{name}.row_ids"] = column.row_ids
+            arrays[f"{name}.sorted_values"] = column.sorted_values
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, size: int, arrays: dict):
+        """Rebuilds an index from to_arrays() output (e.g. read-only shared memory maps)."""
+        index = cls.__new__(cls)
+        index.size = size
+        index.columns = {
+            name: _SortedColumn.from_arrays(arrays[f"{name}.values"], arrays[f"{name}.row_ids"],
+                                            arrays[f"{name}.sorted_values"])
+            for name in (DATE_COLUMN,) + NUMERIC_COLUMNS
+        }
+        return index
+
+    def _constrained(self, date_from, date_to, min_popularity, max_popularity, min_rating, max_rating) -> list:
+        """Binary searches every bounded column and keeps only those that filter something."""
+        ranges = {
+            DATE_COLUMN: (
+                None if date_from is None else date_to_days(date_from),
+                None if date_to is None else date_to_days(date_to),
+            ),
+            "popularity": (min_popularity, max_popularity),
+            "vote_average": (min_rating, max_rating),
+        }
+        constrained = []
+        for column, (low, high) in ranges.items():
+            if low is None and high is None:
+                continue
+            start, stop = self.columns[column].range(low, high)
+            if stop - start < self.size:
+                constrained.append((stop - start, column, start, stop, low, high))
+        return constrained
+
+    def canonical(self, date_from=None, date_to=None, min_popularity=None, max_popularity=None,
+                  min_rating=None, max_rating=None) -> tuple:
+        """
+        Canonical form of the range filters: the sorted-order slice of each
+        column they constrain. Filters that select the same rows get the same
+        key, e.g. bounds beyond the catalog's values and no bounds at all.
+        """
+        constrained = self._constrained(date_from, date_to, min_popularity, max_popularity, min_rating, max_rating)
+        return tuple(sorted((column, start, stop) for _, column, start, stop, _, _ in constrained))
+
+    def query(self, date_from=None, date_to=None, min_popularity=None, max_popularity=None,
+              min_rating=None, max_rating=None):
+        """
+        Resolves the range filters (all bounds inclusive, None means unbounded).
+
+        Returns:
+            None if no row is filtered out, otherwise a sorted int64 array of
+            the catalog row ids matching every range
+        """
+        constrained = self._constrained(date_from, date_to, min_popularity, max_popularity, min_rating, max_rating)
+        if not constrained:
+            return None
+
+        # Start from the most selective column and intersect with the others
+        constrained.sort(key=lambda item: item[0])
+        _, column, start, stop, _, _ = constrained[0]
+        candidates = self.columns[column].row_ids[start:stop]
+        for _, column, _, _, low, high in constrained[1:]:
+            if len(candidates) == 0:
+                break
+            values = self.columns[column].values[candidates]
+            keep = ~np.isnan(values)
+            if low is not None:
+                keep &= values >= low
+            if high is not None:
+                keep &= values <= high
+            candidates = candidates[keep]
+
+        return np.sort(candidates)
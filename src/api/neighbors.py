@@ -0,0 +1,308 @@
+"""
+Precomputed item-to-item neighbour table used by "Search by Movie" and
+/similar/{movie_id}.
+For every catalog row it stores the row ids (int32) and cosine scores
+(float16) of its `size` most similar movies, so a movie-to-movie query is a
+lookup of one row plus the request filters instead of a full similarity pass.
+When the filters leave fewer than top_k neighbours, the service falls back to
+a search with the movie's embedding.
+
+Tables are built offline, stored next to the embeddings
+('embeddings_x.npy' -> 'embeddings_x.neighbors.npz') and refreshed
+incrementally by src.model.ingest_catalog:
+    python -m src.api.neighbors build --model <model_name>
+    python -m src.api.neighbors report --model <model_name>
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from src.api.vector_index import FlatIndex, index_path_for
+from src.utils.logger import logger
+
+DEFAULT_NEIGHBORS = 100
+# Rows scored per matrix product while building, bounding the (rows x tile) score block
+_BUILD_CHUNK = 1024
+# Matrix rows read (and upcast to float32) at a time while building: the query
+# rows of one pass and each slice of the catalog they are scored against
+_BUILD_TILE = 16384
+# Above this share of changed rows an update rebuilds the whole table
+_REBUILD_FRACTION = 0.2
+
+
+def _top_neighbors(embeddings: np.ndarray, rows: np.ndarray, size: int, chunk: int = _BUILD_CHUNK,
+                   tile: int = _BUILD_TILE):
+    """
+    Exact top-size neighbours (the row itself left out) of the given rows.
+
+    The matrix (possibly a float16 memmap) is read tile by tile and every
+    (chunk x tile) score block is merged into a running top-size per row, so
+    memory does not grow with the catalog and no float32 copy of it is made.
+    """
+    ids = np.empty((len(rows), size), dtype=np.int32)
+    scores = np.empty((len(rows), size), dtype=np.float16)
+    for group_start in range(0, len(rows), tile):
+        group_rows = rows[group_start:group_start + tile]
+        queries = np.asarray(embeddings[group_rows], dtype=np.float32)
+        best_ids = np.zeros((len(group_rows), size), dtype=np.int64)
+        best_scores = np.full((len(group_rows), size), -np.inf, dtype=np.float32)
+        for column_start in range(0, len(embeddings), tile):
+            columns = np.asarray(embeddings[column_start:column_start + tile], dtype=np.float32)
+            for start in range(0, len(group_rows), chunk):
+                block_rows = group_rows[start:start + chunk]
+                block = queries[start:start + chunk].dot(columns.T)
+                own = np.flatnonzero((block_rows >= column_start) & (block_rows < column_start + len(columns)))
+                block[own, block_rows[own] - column_start] = -np.inf
+                # Candidates: the running top-size, then this tile's columns
+                candidates = np.concatenate([best_scores[start:start + chunk], block], axis=1)
+                top = np.argpartition(-candidates, size - 1, axis=1)[:, :size]
+                kept_ids = np.take_along_axis(best_ids[start:start + chunk], np.minimum(top, size - 1), axis=1)
+                best_ids[start:start + chunk] = np.where(top < size, kept_ids, top - size + column_start)
+                best_scores[start:start + chunk] = np.take_along_axis(candidates, top, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        ids[group_start:group_start + len(group_rows)] = np.take_along_axis(best_ids, order, axis=1)
+        scores[group_start:group_start + len(group_rows)] = np.take_along_axis(best_scores, order, axis=1)
+    return ids, scores
+
+
+# Top-M neighbours of every catalog row, best first.
+class NeighborTable:
+    def __init__(self, ids: np.ndarray, scores: np.ndarray):
+        """
+        Args:
+            ids: int32 array (rows, size) of neighbour row ids
+            scores: float16 array (rows, size) of their cosine scores
+        """
+        self.ids = ids
+        self.scores = scores
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def size(self) -> int:
+        return self.ids.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.ids.nbytes + self.scores.nbytes
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, size: int = DEFAULT_NEIGHBORS, chunk: int = _BUILD_CHUNK):
+        """
+        Computes the exact table of an L2-normalized embedding matrix.
+
+        Args:
+            size: Neighbours kept per movie (capped at rows - 1)
+            chunk: Rows scored per matrix product
+        """
+        size = max(1, min(size, len(embeddings) - 1))
+        ids, scores = _top_neighbors(embeddings, np.arange(len(embeddings)), size, chunk)
+        return cls(ids, scores)
+
+    def update(self, embeddings: np.ndarray, rows: np.ndarray, chunk: int = _BUILD_CHUNK):
+        """
+        Returns the table of new embeddings where only the given rows changed
+        (or were appended), recomputing as few rows as possible:
+        - changed rows and rows whose list held a changed row are recomputed;
+        - every other list merges in the changed rows that now score higher.
+        The result matches a full rebuild (up to ties at float16 precision).
+        """
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        num_rows = len(embeddings)
+        if len(rows) > _REBUILD_FRACTION * num_rows or self.size > num_rows - 1:
+            return NeighborTable.build(embeddings, self.size, chunk)
+
+        ids = np.empty((num_rows, self.size), dtype=np.int32)
+        scores = np.empty((num_rows, self.size), dtype=np.float16)
+        ids[:len(self)], scores[:len(self)] = self.ids, self.scores
+        stale = np.flatnonzero(np.isin(self.ids, rows).any(axis=1))
+        recompute = np.union1d(rows, stale)
+        others = np.setdiff1d(np.arange(num_rows), recompute, assume_unique=True)
+
+        changed = np.asarray(embeddings[rows], dtype=np.float32)
+        for start in range(0, len(others), chunk):
+            block_rows = others[start:start + chunk]
+            new_scores = np.asarray(embeddings[block_rows], dtype=np.float32).dot(changed.T)
+            candidate_ids = np.concatenate([ids[block_rows], np.broadcast_to(rows, new_scores.shape)], axis=1)
+            candidate_scores = np.concatenate([scores[block_rows].astype(np.float32), new_scores], axis=1)
+            top = np.argpartition(-candidate_scores, self.size - 1, axis=1)[:, :self.size]
+            top_scores = np.take_along_axis(candidate_scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            ids[block_rows] = np.take_along_axis(np.take_along_axis(candidate_ids, top, axis=1), order, axis=1)
+            scores[block_rows] = np.take_along_axis(top_scores, order, axis=1)
+
+        ids[recompute], scores[recompute] = _top_neighbors(embeddings, recompute, self.size, chunk)
+        logger.info(f"Neighbour table updated: {len(recompute)} rows recomputed, {len(others)} merged")
+        return NeighborTable(ids, scores)
+
+    def lookup(self, row: int, top_k: int, candidates=None, exclude=None) -> np.ndarray:
+        """
+        Neighbours of a row that pass the request filters.
+
+        Args:
+            row: Catalog row of the movie
+            top_k: Number of neighbours wanted
+            candidates: Optional sorted array of allowed row ids (None allows all)
+            exclude: Optional row ids to leave out
+
+        Returns:
+            numpy array of at most top_k row ids, best first
+        """
+        ids = self.ids[row]
+        keep = np.ones(len(ids), dtype=bool)
+        if candidates is not None:
+            if len(candidates) == 0:
+                return np.empty(0, dtype=np.int64)
+            positions = np.minimum(np.searchsorted(candidates, ids), len(candidates) - 1)
+            keep &= candidates[positions] == ids
+        if exclude is not None and len(exclude):
+            keep &= ~np.isin(ids, exclude)
+        return ids[keep][:top_k].astype(np.int64)
+
+    def save(self, path: str):
+        """Persists the table as a .npz file."""
+        np.savez(path, num_rows=np.int64(len(self)), ids=self.ids, scores=self.scores)
+
+    @classmethod
+    def load(cls, source, num_rows: int):
+        """
+        Loads a persisted table.
+
+        Raises:
+            ValueError: If the table was built for a different number of rows
+        """
+        with np.load(source) as data:
+            if int(data["num_rows"]) != num_rows:
+                raise ValueError(f"Neighbour table was built for {int(data['num_rows'])} rows, "
+                                 f"embeddings have {num_rows}")
+            return cls(data["ids"], data["scores"])
+
+
+def load_neighbor_table(embeddings_path: str, num_rows: int, neighbors_config: dict):
+    """
+    Loads the neighbour table configured by a model's "neighbors" key.
+
+    Returns:
+        NeighborTable, or None when the file is missing or stale (movie-to-movie
+        queries then run a full search)
+    """
+    path = neighbors_config.get("path") or index_path_for(embeddings_path, "neighbors")
+    try:
+        if path.startswith("s3://"):
+            from src.utils.s3_utils import download_model_from_s3
+            path = download_model_from_s3(path)
+        table = NeighborTable.load(path, num_rows)
+        logger.info(f"Loaded neighbour table from {path} ({table.size} per movie, {table.nbytes / 1024**2:.1f} MB)")
+        return table
+    except Exception as e:
+        logger.warning(f"Could not load neighbour table from {path} ({e}), similar movies use full search")
+        return None
+
+
+def similar_rows(table: NeighborTable, embeddings: np.ndarray, row: int, top_k: int, candidates=None,
+                 exclude=None):
+    """
+    Serves a movie-to-movie query from the table.
+
+    The selected neighbours are re-scored against the full-precision embeddings,
+    so scores match a search with the movie's embedding.
+
+    Returns:
+        tuple (row ids, float32 scores) best first, or None when the table cannot
+        answer: fewer than top_k neighbours pass the filters although more
+        movies do
+    """
+    row_ids = table.lookup(row, top_k, candidates, exclude)
+    if len(row_ids) < top_k:
+        # Short is fine only if no other movie passes the filters
+        excluded = np.union1d([row], [] if exclude is None else exclude)
+        if candidates is not None:
+            excluded = np.intersect1d(excluded, candidates, assume_unique=True)
+        available = (len(embeddings) if candidates is None else len(candidates)) - len(excluded)
+        if len(row_ids) < min(top_k, available):
+            return None
+    query = np.asarray(embeddings[row], dtype=np.float32)
+    scores = np.asarray(embeddings[row_ids], dtype=np.float32).dot(query)
+    order = np.argsort(-scores, kind="stable")
+    return row_ids[order], scores[order]
+
+
+def benchmark(embeddings: np.ndarray, table: NeighborTable, num_queries: int = 200, top_k: int = 10,
+              filter_fractions=(1.0, 0.5, 0.1, 0.01), seed: int = 0):
+    """
+    Latency of movie-to-movie queries served from the table against a full
+    exact search, with random filters keeping a fraction of the catalog.
+
+    Returns:
+        list of dicts with keys fraction, table_ms, search_ms, fallback_rate, agreement
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(embeddings), min(num_queries, len(embeddings)), replace=False)
+    exact = FlatIndex(embeddings)
+    results = []
+    for fraction in filter_fractions:
+        candidates = None if fraction >= 1.0 else np.sort(
+            rng.choice(len(embeddings), max(1, int(fraction * len(embeddings))), replace=False))
+        start = time.perf_counter()
+        answers = [similar_rows(table, embeddings, row, top_k, candidates, [row]) for row in rows]
+        table_ms = (time.perf_counter() - start) * 1000 / len(rows)
+
+        start = time.perf_counter()
+        truth = []
+        for row in rows:
+            allowed = np.setdiff1d(np.arange(len(embeddings)) if candidates is None else candidates, [row])
+            truth.append(exact.search(embeddings[row], top_k, allowed)[0])
+        search_ms = (time.perf_counter() - start) * 1000 / len(rows)
+
+        served = [(answer[0], expected) for answer, expected in zip(answers, truth) if answer is not None]
+        results.append({
+            "fraction": fraction,
+            "table_ms": table_ms,
+            "search_ms": search_ms,
+            "fallback_rate": 1 - len(served) / len(rows),
+            "agreement": float(np.mean([len(set(a.tolist()) & set(b.tolist())) / max(len(b), 1)
+                                        for a, b in served])) if served else float("nan"),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or evaluate the neighbour table of a model.")
+    parser.add_argument("command", choices=["build", "report"])
+    parser.add_argument("--model", required=True, help="Model name in the models configuration")
+    parser.add_argument("--size", type=int, default=None, help=f"Neighbours per movie (default {DEFAULT_NEIGHBORS})")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    from src.api.vector_index import _load_model_embeddings
+    config, embeddings_path, embeddings = _load_model_embeddings(args.model)
+    neighbors_config = config.get("neighbors") or {}
+    size = args.size or int(neighbors_config.get("size", DEFAULT_NEIGHBORS))
+    path = neighbors_config.get("path") or index_path_for(embeddings_path, "neighbors")
+
+    if args.command == "build":
+        start = time.perf_counter()
+        table = NeighborTable.build(embeddings, size)
+        logger.info(f"Built neighbour table ({len(table)} x {table.size}, {table.nbytes / 1024**2:.1f} MB) "
+                    f"in {time.perf_counter() - start:.1f}s")
+        from src.utils.s3_utils import save_artifact
+        save_artifact(path, table.save)
+        logger.info(f"Neighbour table saved to {path}")
+    else:
+        table = load_neighbor_table(embeddings_path, len(embeddings), neighbors_config)
+        if table is None:
+            table = NeighborTable.build(embeddings, size)
+        print(f"Model: {args.model} | rows: {len(embeddings)} | neighbours: {table.size} | top_k: {args.top_k}")
+        print("| filter keeps | table (ms/query) | full search (ms/query) | fallback rate | agreement@k |")
+        print("|--------------|------------------|------------------------|---------------|-------------|")
+        for row in benchmark(embeddings, table, num_queries=args.queries, top_k=args.top_k):
+            print(f"| {row['fraction']:.0%} | {row['table_ms']:.3f} | {row['search_ms']:.3f} | "
+                  f"{row['fallback_rate']:.0%} | {row['agreement']:.3f} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Background model preloading and readiness tracking for the FastAPI app.
+Models marked `preload: true` are loaded concurrently after startup (model
+download/construction and embeddings/index load in parallel, then a warm-up
+query) while the app already accepts traffic. Requests for a model that is
+not loaded yet are answered immediately with 503 + Retry-After and trigger
+a background load, instead of loading the model mid-request.
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import time
+
+from src.config.model_config import MODEL_CONFIG
+from src.model.embeddings import load_embedding_model
+from src.api.recommendation_service import _load_data, get_movie_recommendations, is_model_loaded
+from src.utils.logger import logger
+
+# Threads used for background loads (S3 downloads, model construction, embeddings)
+PRELOAD_WORKERS = int(os.getenv("PRELOAD_WORKERS", "4"))
+# "reject": answer 503 and load in the background; "load": load inside the request
+COLD_MODEL_POLICY = os.getenv("COLD_MODEL_POLICY", "reject").lower()
+MODEL_LOADING_RETRY_AFTER_SECONDS = int(os.getenv("MODEL_LOADING_RETRY_AFTER_SECONDS", "5"))
+
+WARM_UP_QUERY = "Action movie with explosions and car chases"
+
+
+class ModelNotReady(Exception):
+    """Raised when a request targets a model that is still loading."""
+
+    def __init__(self, model_name: str, state: str, retry_after: int):
+        super().__init__(f"Model '{model_name}' is not ready ({state}), retry after {retry_after}s")
+        self.model_name = model_name
+        self.state = state
+        self.retry_after = retry_after
+
+
+class ModelPreloader:
+    def __init__(self, max_workers: int = PRELOAD_WORKERS, cold_policy: str = COLD_MODEL_POLICY,
+                 retry_after: int = MODEL_LOADING_RETRY_AFTER_SECONDS):
+        """
+        Args:
+            max_workers: Threads running the blocking load steps
+            cold_policy: "reject" (503 and background load) or "load" (load inside the request)
+            retry_after: Seconds suggested to clients of a model that is still loading
+        """
+        if cold_policy not in ("reject", "load"):
+            raise ValueError(f"Unsupported cold model policy: {cold_policy}")
+        self.max_workers = max(1, max_workers)
+        self.cold_policy = cold_policy
+        self.retry_after = retry_after
+        self.pool = None
+        self._tasks = {}
+        self._errors = {}
+        self._failed_at = {}
+        self._load_seconds = {}
+
+    def start(self):
+        if self.pool is None:
+            self.pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="preload"
+            )
+
+    def shutdown(self):
+        for task in self._tasks.values():
+            task.cancel()
+        if self.pool is not None:
+            # Do not block shutdown on loads that are still downloading
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    @staticmethod
+    def is_loaded(model_name: str) -> bool:
+        """True when the catalog, the model and its vector index are all cached."""
+        return is_model_loaded(model_name)
+
+    def state(self, model_name: str) -> str:
+        task = self._tasks.get(model_name)
+        if task is not None and not task.done():
+            return "loading"
+        if self.is_loaded(model_name):
+            return "ready"
+        if model_name in self._errors:
+            return "failed"
+        return "not_loaded"
+
+    def preload(self):
+        """Schedules the background load of every `preload: true` model."""
+        for model_name, config in MODEL_CONFIG.items():
+            if config.get("preload", False):
+                self.load_in_background(model_name)
+
+    def load_in_background(self, model_name: str) -> asyncio.Task:
+        """Starts loading a model unless a load is already running; must run on the event loop."""
+        task = self._tasks.get(model_name)
+        if task is None or task.done():
+            task = asyncio.get_running_loop().create_task(self._load(model_name))
+            self._tasks[model_name] = task
+        return task
+
+    async def _load(self, model_name: str):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        logger.info(f"Preloading model: {model_name}")
+        self._errors.pop(model_name, None)
+        try:
+            # Model download/construction and catalog + embeddings load in parallel
+            await asyncio.gather(
+                loop.run_in_executor(self.pool, load_embedding_model, model_name),
+                loop.run_in_executor(self.pool, _load_data, model_name),
+            )
+            # Warm-up: execute a complete recommendation
+            await loop.run_in_executor(
+                self.pool, lambda: get_movie_recommendations(sentence=WARM_UP_QUERY, model_name=model_name, top_k=5)
+            )
+            self._load_seconds[model_name] = time.perf_counter() - start
+            logger.info(f"Model {model_name} warmed up successfully in {self._load_seconds[model_name]:.2f}s")
+        except Exception as e:
+            self._errors[model_name] = str(getattr(e, "detail", e))
+            self._failed_at[model_name] = time.monotonic()
+            logger.error(f"Error preloading model '{model_name}': {self._errors[model_name]}")
+
+    def ensure_ready(self, model_name: str):
+        """
+        Checks that a model can be served without loading it in the request.
+
+        Raises:
+            ModelNotReady: If the model is loading, or is not loaded and the
+                cold policy is "reject" (a background load is started; after a
+                failure, not more often than every retry_after seconds)
+        """
+        if model_name not in MODEL_CONFIG or self.is_loaded(model_name):
+            return
+        state = self.state(model_name)
+        if state != "loading" and self.cold_policy == "load":
+            return
+        failed_recently = (state == "failed"
+                           and time.monotonic() - self._failed_at[model_name] < self.retry_after)
+        if state != "loading" and not failed_recently:
+            self.load_in_background(model_name)
+            state = "loading"
+        raise ModelNotReady(model_name, state, self.retry_after)
+
+    def readiness(self) -> dict:
+        """Per-model readiness; the app is ready once every preloaded model is."""
+        models = {}
+        for model_name, config in MODEL_CONFIG.items():
+            models[model_name] = {
+                "preload": bool(config.get("preload", False)),
+                "state": self.state(model_name),
+                "load_seconds": self._load_seconds.get(model_name),
+                "error": self._errors.get(model_name),
+            }
+        ready = all(info["state"] == "ready" for info in models.values() if info["preload"])
+        return {"ready": ready, "models": models}
@@ -0,0 +1,321 @@
+"""
+Compressed embedding storage for the vector index layer.
+A QuantizedIndex keeps only compact codes in RAM (int8 with per-dimension
+scales, float16, or product-quantization codes), scores every candidate on
+the codes, and re-ranks the best `rerank` candidates exactly against the
+full-precision matrix, which stays memory-mapped on disk.
+
+PQ codes are trained offline and persisted next to the embeddings file:
+    python -m src.api.quantization build --model <model_name>
+    python -m src.api.quantization report --model <model_name>
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from src.api.vector_index import BaseVectorIndex, normalize_embeddings, top_k_indices, index_path_for
+from src.utils.logger import logger
+
+QUANTIZATION_TYPES = ("int8", "float16", "pq")
+
+# Rows decoded per block when scoring codes, bounding the float32 temporaries
+_SCORE_CHUNK = 16384
+
+
+def _chunks(num_rows: int, size: int = _SCORE_CHUNK):
+    for start in range(0, num_rows, size):
+        yield start, min(start + size, num_rows)
+
+
+def _kmeans(data: np.ndarray, num_clusters: int, iterations: int, rng) -> np.ndarray:
+    """Plain (L2) k-means used to train the product-quantization codebooks."""
+    centroids = data[rng.choice(len(data), num_clusters, replace=len(data) < num_clusters)].copy()
+    for _ in range(iterations):
+        assignment = _nearest(data, centroids)
+        counts = np.bincount(assignment, minlength=num_clusters)
+        order = np.argsort(assignment, kind="stable")
+        non_empty = counts > 0
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[non_empty]
+        centroids[non_empty] = np.add.reduceat(data[order], starts, axis=0) / counts[non_empty, None]
+        # Re-seed empty clusters with random points
+        empty = np.flatnonzero(~non_empty)
+        centroids[empty] = data[rng.choice(len(data), len(empty))]
+    return centroids
+
+
+def _nearest(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    distances = (centroids ** 2).sum(axis=1)[None, :] - 2 * data.dot(centroids.T)
+    return np.argmin(distances, axis=1)
+
+
+class QuantizedIndex(BaseVectorIndex):
+    index_type = "quantized"
+
+    def __init__(self, embeddings: np.ndarray, kind: str, codes: np.ndarray, scales: np.ndarray = None,
+                 codebooks: np.ndarray = None, rerank: int = 200):
+        """
+        Args:
+            embeddings: Full-precision, L2-normalized matrix used for exact re-ranking
+                        (normally a read-only memory map)
+            kind: "int8", "float16" or "pq"
+            codes: Compressed rows (int8, float16 or uint8 PQ codes)
+            scales: Per-dimension scales of int8 codes
+            codebooks: PQ codebooks of shape (subvectors, 256, dim / subvectors)
+            rerank: Number of approximate candidates re-scored exactly
+        """
+        super().__init__(embeddings)
+        self.kind = kind
+        self.codes = codes
+        self.scales = scales
+        self.codebooks = codebooks
+        self.rerank = rerank
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, kind: str = "int8", rerank: int = 200, subvectors: int = None,
+              iterations: int = 15, sample_size: int = 20000, seed: int = 0):
+        """
+        Compresses an L2-normalized embedding matrix.
+
+        Args:
+            kind: "int8", "float16" or "pq"
+            subvectors: Number of PQ subvectors (bytes per row); must divide the
+                        dimension (defaults to dim / 8)
+        """
+        if kind not in QUANTIZATION_TYPES:
+            raise ValueError(f"Unsupported quantization type: {kind}")
+        num_rows, dim = embeddings.shape
+
+        if kind == "float16":
+            codes = np.empty((num_rows, dim), dtype=np.float16)
+            for start, stop in _chunks(num_rows):
+                codes[start:stop] = embeddings[start:stop]
+            return cls(embeddings, kind, codes, rerank=rerank)
+
+        if kind == "int8":
+            max_abs = np.zeros(dim, dtype=np.float32)
+            for start, stop in _chunks(num_rows):
+                max_abs = np.maximum(max_abs, np.abs(np.asarray(embeddings[start:stop], dtype=np.float32)).max(axis=0))
+            scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+            codes = np.empty((num_rows, dim), dtype=np.int8)
+            for start, stop in _chunks(num_rows):
+                block = np.asarray(embeddings[start:stop], dtype=np.float32) / scales
+                codes[start:stop] = np.clip(np.rint(block), -127, 127)
+            return cls(embeddings, kind, codes, scales=scales, rerank=rerank)
+
+        subvectors = subvectors or max(1, dim // 8)
+        if dim % subvectors:
+            raise ValueError(f"PQ subvectors ({subvectors}) must divide the dimension ({dim})")
+        sub_dim = dim // subvectors
+        rng = np.random.default_rng(seed)
+        sample_rows = rng.choice(num_rows, min(sample_size, num_rows), replace=False)
+        sample = np.asarray(embeddings[np.sort(sample_rows)], dtype=np.float32)
+        codebooks = np.stack([
+            _kmeans(sample[:, j * sub_dim:(j + 1) * sub_dim], 256, iterations, rng)
+            for j in range(subvectors)
+        ]).astype(np.float32)
+        codes = np.empty((num_rows, subvectors), dtype=np.uint8)
+        index = cls(embeddings, kind, codes, codebooks=codebooks, rerank=rerank)
+        index._encode(np.arange(num_rows))
+        return index
+
+    def _encode(self, rows: np.ndarray):
+        """Computes the codes of the given rows with the existing scales/codebooks."""
+        for start, stop in _chunks(len(rows)):
+            block = np.asarray(self.embeddings[rows[start:stop]], dtype=np.float32)
+            if self.kind == "float16":
+                self.codes[rows[start:stop]] = block
+            elif self.kind == "int8":
+                self.codes[rows[start:stop]] = np.clip(np.rint(block / self.scales), -127, 127)
+            else:
+                sub_dim = block.shape[1] // len(self.codebooks)
+                for j, codebook in enumerate(self.codebooks):
+                    self.codes[rows[start:stop], j] = _nearest(block[:, j * sub_dim:(j + 1) * sub_dim], codebook)
+
+    def update(self, embeddings: np.ndarray, rows: np.ndarray):
+        """
+        Returns an index over a new version of the embeddings that keeps the
+        scales/codebooks: only the given rows (changed or appended) are re-encoded.
+        """
+        codes = np.empty((len(embeddings),) + self.codes.shape[1:], dtype=self.codes.dtype)
+        kept = min(len(self), len(embeddings))
+        codes[:kept] = self.codes[:kept]
+        index = type(self)(embeddings, self.kind, codes, scales=self.scales, codebooks=self.codebooks,
+                           rerank=self.rerank)
+        index._encode(np.asarray(rows, dtype=np.int64))
+        return index
+
+    @property
+    def code_nbytes(self) -> int:
+        """Bytes of the compressed representation (codes, scales and codebooks)."""
+        extra = sum(array.nbytes for array in (self.scales, self.codebooks) if array is not None)
+        return self.codes.nbytes + extra
+
+    @property
+    def nbytes(self) -> int:
+        return super().nbytes + self.code_nbytes
+
+    def _approximate_scores(self, query: np.ndarray, rows=None) -> np.ndarray:
+        """Scores the query against the codes of all rows (or the given row ids)."""
+        codes = self.codes if rows is None else self.codes[rows]
+        scores = np.empty(len(codes), dtype=np.float32)
+        if self.kind == "pq":
+            num_subvectors, _, sub_dim = self.codebooks.shape
+            # Lookup table: dot product of each query subvector with every centroid
+            table = np.einsum("jd,jkd->jk", query.reshape(num_subvectors, sub_dim), self.codebooks)
+            subvector_ids = np.arange(num_subvectors)
+            for start, stop in _chunks(len(codes)):
+                scores[start:stop] = table[subvector_ids, codes[start:stop]].sum(axis=1)
+            return scores
+        weights = query * self.scales if self.kind == "int8" else query
+        for start, stop in _chunks(len(codes)):
+            scores[start:stop] = codes[start:stop].astype(np.float32).dot(weights)
+        return scores
+
+    def search(self, query_embedding: np.ndarray, top_k: int, candidates=None):
+        query = normalize_embeddings(np.ravel(query_embedding))
+        approximate = self._approximate_scores(query, candidates)
+        shortlist = top_k_indices(approximate, max(top_k, self.rerank))
+        row_ids = shortlist if candidates is None else candidates[shortlist]
+        # Exact re-ranking of the shortlist (sorted reads are friendlier to the memory map)
+        row_ids = np.sort(row_ids)
+        exact = np.asarray(self.embeddings[row_ids], dtype=np.float32).dot(query)
+        top = top_k_indices(exact, top_k)
+        return row_ids[top], exact[top]
+
+    def save(self, path: str):
+        """Persists the codes (not the full-precision embeddings) as a .npz file."""
+        arrays = {"num_rows": np.int64(len(self)), "kind": np.array(self.kind), "codes": self.codes}
+        if self.scales is not None:
+            arrays["scales"] = self.scales
+        if self.codebooks is not None:
+            arrays["codebooks"] = self.codebooks
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str, embeddings: np.ndarray, rerank: int = 200):
+        """
+        Loads persisted codes for the given embeddings.
+
+        Raises:
+            ValueError: If the codes were built for a different number of rows
+        """
+        with np.load(path) as data:
+            if int(data["num_rows"]) != len(embeddings):
+                raise ValueError(
+                    f"Codes were built for {int(data['num_rows'])} rows, embeddings have {len(embeddings)}"
+                )
+            return cls(
+                embeddings,
+                str(data["kind"]),
+                data["codes"],
+                scales=data["scales"] if "scales" in data else None,
+                codebooks=data["codebooks"] if "codebooks" in data else None,
+                rerank=rerank,
+            )
+
+
+def load_quantized_index(embeddings: np.ndarray, embeddings_path: str, quantization_config: dict) -> QuantizedIndex:
+    """
+    Builds the QuantizedIndex selected by a model's "quantization" configuration,
+    e.g. {"type": "int8", "rerank": 200} or {"type": "pq", "subvectors": 48}.
+
+    int8 and float16 codes are computed at load time. PQ codes are trained
+    offline (python -m src.api.quantization build) and read from
+    '<embeddings>.pq.npz'; if that file is missing or stale they are trained
+    at load time.
+    """
+    kind = quantization_config.get("type", "int8").lower()
+    rerank = int(quantization_config.get("rerank", 200))
+    if kind == "pq":
+        path = quantization_config.get("path") or index_path_for(embeddings_path, "pq")
+        try:
+            if path.startswith("s3://"):
+                from src.utils.s3_utils import download_to_cache
+                path = download_to_cache(path)
+            return QuantizedIndex.load(path, embeddings, rerank=rerank)
+        except Exception as e:
+            logger.warning(f"Could not load PQ codes from {path} ({e}), training them now")
+    return QuantizedIndex.build(
+        embeddings, kind=kind, rerank=rerank, subvectors=quantization_config.get("subvectors")
+    )
+
+
+def benchmark(embeddings: np.ndarray, indexes: dict, num_queries: int = 200, top_k: int = 10, seed: int = 0):
+    """
+    Measures memory, latency and recall@k of quantized indexes against the exact
+    float32 path, using perturbed catalog rows as queries. Memory is the size of
+    the codes, i.e. what stays resident when the float32 matrix is memory-mapped.
+
+    Args:
+        indexes: Mapping of a label to a QuantizedIndex
+
+    Returns:
+        list of dicts with keys name, memory_mb, recall, latency_ms (the first row is float32)
+    """
+    from src.api.vector_index import FlatIndex
+    rng = np.random.default_rng(seed)
+    queries = np.asarray(embeddings[rng.choice(len(embeddings), min(num_queries, len(embeddings)), replace=False)],
+                         dtype=np.float32)
+    queries = normalize_embeddings(queries + 0.05 * rng.standard_normal(queries.shape, dtype=np.float32))
+    exact = FlatIndex(np.asarray(embeddings, dtype=np.float32))
+
+    start = time.perf_counter()
+    truth = [set(exact.search(q, top_k)[0].tolist()) for q in queries]
+    rows = [{
+        "name": "float32",
+        "memory_mb": exact.embeddings.nbytes / 1024**2,
+        "recall": 1.0,
+        "latency_ms": (time.perf_counter() - start) * 1000 / len(queries),
+    }]
+    for name, index in indexes.items():
+        start = time.perf_counter()
+        results = [index.search(q, top_k)[0] for q in queries]
+        latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        recall = np.mean([len(truth[i] & set(r.tolist())) / top_k for i, r in enumerate(results)])
+        rows.append({"name": name, "memory_mb": index.code_nbytes / 1024**2, "recall": float(recall),
+                     "latency_ms": latency_ms})
+    return rows
+
+
+def main():
+    from src.api.vector_index import _load_model_embeddings
+    parser = argparse.ArgumentParser(description="Build or evaluate the quantized embeddings of a model.")
+    parser.add_argument("command", choices=["build", "report"])
+    parser.add_argument("--model", required=True, help="Model name in the models configuration")
+    parser.add_argument("--subvectors", type=int, default=None, help="PQ subvectors (default dim/8)")
+    parser.add_argument("--rerank", type=int, default=None, help="Candidates re-ranked exactly")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    config, embeddings_path, embeddings = _load_model_embeddings(args.model)
+    quantization_config = dict(config.get("quantization") or {})
+    subvectors = args.subvectors or quantization_config.get("subvectors")
+    rerank = args.rerank or int(quantization_config.get("rerank", 200))
+    path = quantization_config.get("path") or index_path_for(embeddings_path, "pq")
+
+    if args.command == "build":
+        start = time.perf_counter()
+        index = QuantizedIndex.build(embeddings, kind="pq", rerank=rerank, subvectors=subvectors)
+        logger.info(f"Trained PQ codes ({index.codes.shape[1]} subvectors) in {time.perf_counter() - start:.1f}s")
+        from src.utils.s3_utils import save_artifact
+        save_artifact(path, index.save)
+        logger.info(f"PQ codes saved to {path}")
+    else:
+        indexes = {
+            kind: load_quantized_index(embeddings, embeddings_path,
+                                       {"type": kind, "rerank": rerank, "subvectors": subvectors, "path": path})
+            for kind in QUANTIZATION_TYPES
+        }
+        print(f"Model: {args.model} | rows: {len(embeddings)} | dim: {embeddings.shape[1]} | "
+              f"rerank: {rerank} | top_k: {args.top_k}")
+        print("| storage | resident memory (MB) | recall@k | latency (ms/query) |")
+        print("|---------|----------------------|----------|--------------------|")
+        for row in benchmark(embeddings, indexes, num_queries=args.queries, top_k=args.top_k):
+            print(f"| {row['name']} | {row['memory_mb']:.1f} | {row['recall']:.3f} | {row['latency_ms']:.3f} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,169 +1,602 @@
-from src.model.embeddings import load_embedding_model, generate_embeddings
-from src.config.model_config import MODEL_CONFIG, load_model_config
-from sklearn.metrics.pairwise import cosine_similarity
+from src.model.embeddings import encode_queries, encode_queries_async
+from src.model.query_cache import QUERY_CACHE, normalize_query
+from src.config.model_config import MODEL_CONFIG, get_model_config, add_config_listener
 import numpy as np
-import pandas as pd
-from src.model.model_wrappers import BaseEmbeddingModel
 from fastapi import HTTPException
 from src.utils.logger import logger
 from typing import List
-import boto3
-from urllib.parse import urlparse
 import os
-from src.utils.s3_utils import read_from_s3
+import time
+import asyncio
+import threading
+from src.utils.cache_manager import CACHE, process_rss_bytes
+from src.utils.metrics import span, profile_if_slow
+from src.utils.s3_utils import read_from_s3, download_to_cache
+from src.api.catalog import Catalog
+from src.api.catalog_format import read_catalog_file
+from src.api.catalog_store import CatalogGeneration, read_generation, embeddings_path_for
+from src.api.result_cache import RESULT_CACHE, config_digest
+from src.api.shared_store import SHARED_MEMORY, shared_catalog, shared_embeddings, collect as collect_shared_segments
+from src.api.vector_index import normalize_embeddings, is_normalized, load_normalized_memmap, load_vector_index
+from src.api.neighbors import load_neighbor_table, similar_rows
 
-# Cache for dataframe and embeddings
-_CACHE = {}
+# Memory-map embeddings (and download S3 artifacts once to a local cache) so
+# every worker process on the host shares the same page-cache-backed data
+USE_MMAP = os.getenv("USE_MMAP", "false").lower() == "true"
+
+# Catalog generation served by this process; replaced atomically (a single
+# reference assignment) by refresh_catalog_generation()
+_GENERATION = read_generation()
+_GENERATION_LOCK = threading.Lock()
+
+# Seconds between checks of the catalog generation manifest (0 disables)
+CATALOG_POLL_SECONDS = float(os.getenv("CATALOG_POLL_SECONDS", "30"))
+
+def _catalog_key(generation: CatalogGeneration) -> str:
+    return f"movies@g{generation.generation}"
+
+def _index_key(model_name: str, generation: CatalogGeneration) -> str:
+    return f"{model_name}@g{generation.generation}"
+
+def get_catalog_generation() -> CatalogGeneration:
+    """Returns the catalog generation currently served."""
+    return _GENERATION
+
+def is_model_loaded(model_name: str) -> bool:
+    """True when the catalog, the model and its vector index are cached for the current generation."""
+    generation = _GENERATION
+    return (("catalog", _catalog_key(generation)) in CACHE and ("model", model_name) in CACHE
+            and ("index", _index_key(model_name, generation)) in CACHE)
 
 def clear_cache():
-    """Clears the embeddings cache"""
-    global _CACHE
-    _CACHE.clear()
+    """
+    Clears the cached vector indexes, models, query embeddings and results.
+    Pinned entries (the catalog and preloaded models) are kept.
+    """
+    CACHE.clear("index")
+    CACHE.clear("model")
+    QUERY_CACHE.clear()
+    RESULT_CACHE.clear()
     logger.info("Cache cleared")
 
-def _load_data(model_name: str):
+def _on_config_change(old_models, new_models):
+    """
+    Drops cached embeddings, query embeddings and results of models whose
+    configuration changed or was removed in a new config snapshot.
+    """
+    for model_name in set(old_models) | set(new_models):
+        if old_models.get(model_name) != new_models.get(model_name):
+            CACHE.pop("index", _index_key(model_name, _GENERATION))
+            QUERY_CACHE.clear(model_name)
+            RESULT_CACHE.clear(model_name)
+            logger.info(f"Configuration changed for {model_name}, cached data dropped")
+
+add_config_listener(_on_config_change)
+
+def _load_catalog(generation: CatalogGeneration = None) -> Catalog:
+    """
+    Loads the movies DataFrame of a generation (the current one by default) and
+    builds its Catalog (filter index and column store) once per process;
+    concurrent first callers share one load.
+    """
+    generation = generation or _GENERATION
+    return CACHE.get_or_load("catalog", _catalog_key(generation), lambda: _read_catalog(generation))
+
+def _read_catalog(generation: CatalogGeneration) -> Catalog:
+    logger.info(f"Loading movies DataFrame (generation {generation.generation})...")
+    start = time.perf_counter()
+    csv_path = generation.catalog_path
+    if csv_path.startswith('s3://'):
+        csv_path = download_to_cache(csv_path)
+    if SHARED_MEMORY:
+        # Published once per host; other processes attach the same memory
+        catalog = shared_catalog(csv_path, generation.generation, lambda: read_catalog_file(csv_path))
+    else:
+        # Column store next to the CSV when it is current, the CSV otherwise
+        catalog = Catalog(read_catalog_file(csv_path))
+    catalog = CACHE.put("catalog", _catalog_key(generation), catalog, pinned=True,
+                        load_seconds=time.perf_counter() - start)
+    logger.info(f"DataFrame loaded successfully in {time.perf_counter() - start:.2f}s "
+                f"(process RSS: {_process_rss_mb():.0f} MB)")
+    return catalog
+
+def _process_rss_mb() -> float:
+    """Resident memory of the current process in MB."""
+    return process_rss_bytes() / (1024**2)
+
+def _load_embeddings(embeddings_path: str, dtype: str = "float32", mmap: bool = USE_MMAP) -> np.ndarray:
+    """
+    Loads an embeddings .npy as an L2-normalized matrix, normalized once so
+    every request scores with a plain dot product.
+    With mmap (USE_MMAP) the matrix is a read-only memory map instead of a private copy;
+    with SHARED_MEMORY it is attached from a segment published once per host.
+    """
+    if SHARED_MEMORY:
+        if embeddings_path.startswith('s3://'):
+            embeddings_path = download_to_cache(embeddings_path)
+        embeddings = np.load(embeddings_path, mmap_mode="r")
+        if embeddings.dtype == np.dtype(dtype) and is_normalized(embeddings):
+            # Already servable: the file's page cache is shared by every process
+            return embeddings
+        return shared_embeddings(embeddings_path, dtype, lambda: normalize_embeddings(embeddings, dtype))
+    if mmap:
+        if embeddings_path.startswith('s3://'):
+            embeddings_path = download_to_cache(embeddings_path)
+        return load_normalized_memmap(embeddings_path, dtype)
+    if embeddings_path.startswith('s3://'):
+        embeddings = read_from_s3(embeddings_path)
+    else:
+        embeddings = np.load(embeddings_path)
+    return normalize_embeddings(embeddings, dtype)
+
+def _load_data(model_name: str, generation: CatalogGeneration = None):
     """
     Load movie data and embeddings from storage and cache them in memory.
     
     Args:
         model_name: Name of the model to load embeddings for
+        generation: Catalog generation to load (defaults to the current one); the
+            catalog and the index always come from the same generation
     
     Returns:
-        tuple: (DataFrame with movie data, numpy array of embeddings)
+        tuple: (Catalog with movie data, vector index over the L2-normalized embeddings)
     
     Raises:
-        ValueError: If model configuration or embeddings path is not found
+        ValueError: If model configuration or embeddings path is not found, or
+            the embeddings do not match the catalog rows
     """
+    generation = generation or _GENERATION
+    index_key = _index_key(model_name, generation)
     try:
-        logger.info(f"Requesting data for model: {model_name}")
-        logger.info(f"Current _CACHE state: {list(_CACHE.keys())}")
+        logger.debug(f"Requesting data for model {model_name} (cached indexes: {CACHE.keys('index')})")
         
         # Load DataFrame if not in cache
-        if 'df' not in _CACHE:
-            logger.info("Loading movies DataFrame...")
-            csv_path = os.getenv("MOVIES_CSV_PATH", "data/processed/movies_processed.csv")
-            if csv_path.startswith('s3://'):
-                _CACHE['df'] = read_from_s3(csv_path)
-            else:
-                _CACHE['df'] = pd.read_csv(csv_path)
-            logger.info("DataFrame loaded successfully")
+        catalog = _load_catalog(generation)
         
-        # Load embeddings for this model
-        if model_name not in _CACHE:
-            logger.info(f"Embeddings not found in cache for {model_name}, loading...")
-            config = MODEL_CONFIG.get(model_name)
-            if not config:
-                raise ValueError(f"No configuration found for model {model_name}")
-            
-            embeddings_path = config.get("embeddings_path")
-            if not embeddings_path:
-                raise ValueError(f"Embeddings path not specified for model {model_name}")
-            
-            if embeddings_path.startswith('s3://'):
-                _CACHE[model_name] = read_from_s3(embeddings_path)
-            else:
-                _CACHE[model_name] = np.load(embeddings_path)
-            logger.info(f"Embeddings loaded successfully for {model_name}")
+        # Load embeddings for this model (single-flight across threads)
+        vector_index = CACHE.get_or_load("index", index_key, lambda: _load_vector_index(model_name, generation))
+        if len(vector_index) != len(catalog):
+            raise ValueError(f"Embeddings of {model_name} have {len(vector_index)} rows, "
+                             f"the catalog has {len(catalog)}")
         
-        return _CACHE['df'], _CACHE[model_name]
+        return catalog, vector_index
     except Exception as e:
         logger.error(f"Error in _load_data: {str(e)}")
         # Clear cache in case of error
-        if model_name in _CACHE:
-            del _CACHE[model_name]
+        CACHE.pop("index", index_key)
         raise
 
-def get_movie_recommendations(sentence: str, model_name: str = "paraphrase-MiniLM-L6-v2", 
-                            top_k: int = 5, exclude_movies: list = None, **kwargs):
-    """Get movie recommendations based on a query."""
-    # Get updated configuration without depending on previously imported variable
-    current_config = load_model_config()
-    logger.info(f"Available models in MODEL_CONFIG: {current_config.keys()}")
+def _load_vector_index(model_name: str, generation: CatalogGeneration):
+    """Loads a model's embeddings and vector index for a generation and caches them."""
+    logger.info(f"Embeddings not found in cache for {model_name}, loading...")
+    config = MODEL_CONFIG.get(model_name)
+    if not config:
+        raise ValueError(f"No configuration found for model {model_name}")
+    
+    embeddings_path = embeddings_path_for(generation, model_name, config)
+    if not embeddings_path:
+        raise ValueError(f"Embeddings path not specified for model {model_name}")
+    
+    start = time.perf_counter()
+    index_config, quantization = config.get("index"), config.get("quantization")
+    neighbors = config.get("neighbors")
+    if generation.generation:
+        # Explicit artifact paths belong to the configured (generation 0) embeddings;
+        # later generations keep their index files next to their own embeddings
+        index_config = {k: v for k, v in (index_config or {}).items() if k != "path"}
+        quantization = quantization and {k: v for k, v in quantization.items() if k != "path"}
+        neighbors = neighbors and {k: v for k, v in neighbors.items() if k != "path"}
+    # Quantized models keep only their codes in RAM; the full-precision
+    # matrix used for re-ranking is always memory-mapped
+    mmap = USE_MMAP or bool(quantization)
+    embeddings = _load_embeddings(embeddings_path, config.get("embeddings_dtype", "float32"), mmap)
+    vector_index = load_vector_index(embeddings, embeddings_path, index_config, quantization)
+    if neighbors is not None:
+        vector_index.neighbors = load_neighbor_table(embeddings_path, len(vector_index), neighbors)
+    nbytes = vector_index.nbytes + (vector_index.neighbors.nbytes if vector_index.neighbors else 0)
+    CACHE.put("index", _index_key(model_name, generation), vector_index, nbytes=nbytes,
+              pinned=bool(config.get("preload", False)), load_seconds=time.perf_counter() - start)
+    logger.info(f"Embeddings loaded successfully for {model_name} in {time.perf_counter() - start:.2f}s "
+                f"(mmap: {mmap}, index: {nbytes / 1024**2:.1f} MB, "
+                f"process RSS: {_process_rss_mb():.0f} MB)")
+    return vector_index
+
+def refresh_catalog_generation(force: bool = False) -> CatalogGeneration:
+    """
+    Switches to a new catalog generation if the manifest changed.
+
+    The new catalog and the indexes of every model cached for the old generation
+    are loaded first; then the generation reference is swapped and the old
+    entries are dropped. Requests already running keep the catalog and index
+    objects they hold, so nothing in flight fails.
+
+    Returns:
+        CatalogGeneration: The generation served after the refresh
+    """
+    global _GENERATION
+    with _GENERATION_LOCK:
+        old = _GENERATION
+        new = read_generation()
+        if new == old and not force:
+            return old
+        start = time.perf_counter()
+        models = [key.rsplit("@g", 1)[0] for key in CACHE.keys("index") if key.endswith(f"@g{old.generation}")]
+        logger.info(f"Loading catalog generation {new.generation} (models: {models})")
+        for model_name in models:
+            _load_data(model_name, new)
+        if not models:
+            _load_catalog(new)
+        _GENERATION = new
+        if _catalog_key(new) != _catalog_key(old):
+            CACHE.pop("catalog", _catalog_key(old))
+            for model_name in models:
+                CACHE.pop("index", _index_key(model_name, old))
+            # Result keys name their generation; this only frees the memory
+            RESULT_CACHE.clear()
+        if SHARED_MEMORY:
+            # Segments of the old generation go once no process uses them any more
+            collect_shared_segments()
+        logger.info(f"Catalog generation {new.generation} is live ({len(_load_catalog(new))} movies, "
+                    f"swapped in {time.perf_counter() - start:.2f}s)")
+        return new
+
+def _watch_catalog(interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            refresh_catalog_generation()
+        except Exception as e:
+            logger.error(f"Error refreshing catalog generation: {e}")
+
+_CATALOG_WATCHER = None
+
+def start_catalog_watcher(interval: float = None):
+    """
+    Starts (once per process) a daemon thread that polls the catalog generation
+    manifest and swaps in new generations written by incremental ingestion.
+    """
+    global _CATALOG_WATCHER
+    interval = CATALOG_POLL_SECONDS if interval is None else interval
+    if interval <= 0 or (_CATALOG_WATCHER is not None and _CATALOG_WATCHER.is_alive()):
+        return
+    _CATALOG_WATCHER = threading.Thread(target=_watch_catalog, args=(interval,), name="catalog-watcher",
+                                        daemon=True)
+    _CATALOG_WATCHER.start()
+    logger.info(f"Catalog watcher started (every {interval:.0f}s)")
+
+def _filter_indices(catalog: Catalog, exclude_movies: list = None, **kwargs):
+    """
+    Resolves the request filters to catalog row ids using the precomputed FilterIndex.
+
+    Returns:
+        None when every movie passes, otherwise a sorted numpy array of row ids
+    """
+    filtered_indices = catalog.filter_index.query(
+        date_from=kwargs.get('date_from'),
+        date_to=kwargs.get('date_to'),
+        min_popularity=kwargs.get('min_popularity'),
+        max_popularity=kwargs.get('max_popularity'),
+        min_rating=kwargs.get('min_rating'),
+        max_rating=kwargs.get('max_rating'),
+    )
+
+    # Exclude movies if specified
+    if exclude_movies:
+        excluded = catalog.title_rows(exclude_movies)
+        if len(excluded):
+            if filtered_indices is None:
+                filtered_indices = np.arange(len(catalog))
+            filtered_indices = np.setdiff1d(filtered_indices, excluded, assume_unique=True)
+    return filtered_indices
+
+def _recommend(catalog: Catalog, vector_index, query_embedding: np.ndarray, top_k: int,
+               exclude_movies: list = None, model_name: str = "", **kwargs):
+    """
+    Filters the catalog, searches the vector index and builds the recommendations list.
+    Each step is timed as a stage of model_name.
+    """
+    # Apply filters (None means the full catalog passes)
+    with span("filter", model_name):
+        filtered_indices = _filter_indices(catalog, exclude_movies, **kwargs)
+    num_filtered = len(catalog) if filtered_indices is None else len(filtered_indices)
+    logger.debug(f"Movies after filtering: {num_filtered} of {len(catalog)}")
+    
+    if num_filtered == 0:
+        logger.warning(f"No movies match the filter criteria with current parameters")
+        return []
+    
+    # Search the top_k most similar movies within the filtered ones
+    top_k = min(top_k, num_filtered)
+    with span("search", model_name):
+        top_indices, similarity_scores = vector_index.search(query_embedding, top_k, filtered_indices)
+    
+    # Gather the result columns in bulk from the catalog column store
+    with span("results", model_name):
+        recommendations = catalog.records(top_indices, similarity_scores)
+    logger.debug(f"Selected top {top_k} movies from {num_filtered} filtered movies")
+    logger.debug(f"Selected movies: {[rec['title'] for rec in recommendations]}")
+    return recommendations
+
+# Request keys that define the filter of a query (queries sharing them share the mask)
+_FILTER_KEYS = ("date_from", "date_to", "min_popularity", "max_popularity", "min_rating", "max_rating")
+
+def _load_cached(model_name: str, sentence: str, top_k: int, exclude_movies: list = None, **kwargs):
+    """
+    Loads the model's data and looks the request up in the result cache.
+
+    The key is canonical: the normalized sentence, the filters resolved to the
+    catalog slices they select and the excluded rows, plus the model's config
+    and the catalog generation, so equivalent requests share one entry and a
+    changed config or catalog never serves stale results.
+
+    Returns:
+        tuple: (catalog, vector index, result key or None when the cache is
+        disabled, cached recommendations or None)
+    """
+    generation = _GENERATION
+    with span("load_data", model_name):
+        catalog, vector_index = _load_data(model_name, generation)
+    if not RESULT_CACHE.enabled:
+        return catalog, vector_index, None, None
+    with span("result_cache", model_name):
+        filters = {name: kwargs.get(name) for name in _FILTER_KEYS}
+        excluded = tuple(catalog.title_rows(exclude_movies).tolist()) if exclude_movies else ()
+        key = (model_name, config_digest(get_model_config()[model_name]), generation.generation,
+               normalize_query(sentence), catalog.filter_index.canonical(**filters), excluded)
+        recommendations = RESULT_CACHE.get(key, top_k)
+    if recommendations is not None:
+        logger.debug(f"Result cache hit for {model_name} (top_k={top_k})")
+    return catalog, vector_index, key, recommendations
+
+def _recommend_cached(key: tuple, catalog: Catalog, vector_index, query_embedding: np.ndarray, top_k: int,
+                      exclude_movies: list = None, model_name: str = "", **kwargs):
+    """
+    Runs _recommend for top_k rounded up to the result cache's bucket, caches
+    the list and returns its first top_k recommendations.
+    """
+    if key is None:
+        return _recommend(catalog, vector_index, query_embedding, top_k, exclude_movies, model_name, **kwargs)
+    cached_k = RESULT_CACHE.cache_top_k(top_k)
+    recommendations = _recommend(catalog, vector_index, query_embedding, cached_k, exclude_movies, model_name,
+                                 **kwargs)
+    RESULT_CACHE.put(key, cached_k, recommendations)
+    return recommendations[:top_k]
+
+def get_movie_recommendations_batch(queries: List[dict], model_name: str = "paraphrase-MiniLM-L6-v2"):
+    """
+    Get recommendations for many queries of the same model in one call.
+    
+    All sentences are encoded in a single batch; queries with identical filters
+    share one filter mask and are scored together with a single matrix-matrix
+    product.
+    
+    Args:
+        queries: List of dicts with "sentence" and optional "top_k",
+                 "exclude_movies" and filter keys (date_from, date_to,
+                 min/max_popularity, min/max_rating)
+        model_name: Name of the model used for every query
+    
+    Returns:
+        list: One recommendations list per query, in input order
+    """
+    current_config = get_model_config()
     if model_name not in current_config:
         raise ValueError(f"Model {model_name} does not exist in configuration")
+    if not queries:
+        return []
     
     try:
-        logger.info(f"Applying filters with parameters:")
-        logger.info(f"- Date range: {kwargs.get('date_from')} to {kwargs.get('date_to')}")
-        logger.info(f"- Popularity range: {kwargs.get('min_popularity')} to {kwargs.get('max_popularity')}")
-        logger.info(f"- Rating range: {kwargs.get('min_rating')} to {kwargs.get('max_rating')}")
+        catalog, vector_index = _load_data(model_name)
+        query_embeddings = encode_queries(model_name, [query["sentence"] for query in queries])
         
-        # Load data and embeddings
-        df, movie_embeddings = _load_data(model_name)
+        # Group queries by their filter so each mask is computed once
+        groups = {}
+        for position, query in enumerate(queries):
+            exclude_movies = tuple(sorted(query.get("exclude_movies") or ()))
+            key = tuple(query.get(name) for name in _FILTER_KEYS) + (exclude_movies,)
+            groups.setdefault(key, []).append(position)
+        logger.info(f"Batch of {len(queries)} queries for {model_name} in {len(groups)} filter groups")
         
-        # Generate embedding for query
-        model = load_embedding_model(model_name)
-        logger.info(f"Model loaded: {model.__class__.__name__}")
+        results = [[] for _ in queries]
+        for key, positions in groups.items():
+            filters = dict(zip(_FILTER_KEYS, key[:-1]))
+            filtered_indices = _filter_indices(catalog, list(key[-1]), **filters)
+            num_filtered = len(catalog) if filtered_indices is None else len(filtered_indices)
+            if num_filtered == 0:
+                continue
+            top_ks = [min(int(queries[p].get("top_k", 5)), num_filtered) for p in positions]
+            matches = vector_index.search_batch(query_embeddings[positions], top_ks, filtered_indices)
+            for position, (top_indices, similarity_scores) in zip(positions, matches):
+                results[position] = catalog.records(top_indices, similarity_scores)
+        return results
+    except Exception as e:
+        logger.error(f"Error in get_movie_recommendations_batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Generate query embedding
-        query_embedding = generate_embeddings(model, [sentence], show_progress_bar=False)
-        
-        # Apply filters
-        mask = (
-            (df['release_date'] >= kwargs.get('date_from')) &
-            (df['release_date'] <= kwargs.get('date_to')) &
-            (df['popularity'] >= kwargs.get('min_popularity')) &
-            (df['popularity'] <= kwargs.get('max_popularity')) &
-            (df['vote_average'] >= kwargs.get('min_rating')) &
-            (df['vote_average'] <= kwargs.get('max_rating'))
-        )
-        
-        # Exclude movies if specified
-        if exclude_movies:
-            mask = mask & ~df['title'].isin(exclude_movies)
-            
-        # Get indices that meet the filters
-        filtered_indices = df[mask].index
-        logger.info(f"Total movies before filtering: {len(df)}")
-        logger.info(f"Movies after filtering: {len(filtered_indices)}")
-        
-        if len(filtered_indices) == 0:
-            logger.warning(f"No movies match the filter criteria with current parameters")
-            return []
-        
-        # Calculate cosine similarity with filtered embeddings
-        similarity_scores = cosine_similarity(query_embedding, movie_embeddings[filtered_indices])[0]
+def get_movie_recommendations(sentence: str, model_name: str = "paraphrase-MiniLM-L6-v2", 
+                            top_k: int = 5, exclude_movies: list = None, **kwargs):
+    """
+    Get movie recommendations based on a query.
+    Every stage is timed into the stage histogram (src/utils/metrics.py), and
+    sampled slow requests are profiled.
+    """
+    with span("request", model_name), profile_if_slow(f"recommend-{model_name}"):
+        return _get_movie_recommendations(sentence, model_name, top_k, exclude_movies, **kwargs)
+
+def _get_movie_recommendations(sentence: str, model_name: str, top_k: int, exclude_movies: list = None,
+                               **kwargs):
+    # Read the current configuration snapshot (refreshed by the config watcher)
+    with span("config", model_name):
+        current_config = get_model_config()
+    if model_name not in current_config:
+        raise ValueError(f"Model {model_name} does not exist in configuration")
+    
+    try:
+        filters = {name: value for name, value in kwargs.items() if value is not None}
+        logger.info(f"Recommendations from {model_name} (top_k={top_k}, filters: {filters})")
         
-        # Get indices of top_k movies within filtered ones
-        top_k = min(top_k, len(filtered_indices))
-        top_indices = np.argsort(-similarity_scores)[:top_k]
+        # Load data and embeddings; identical requests are answered from the result cache
+        catalog, vector_index, key, cached = _load_cached(model_name, sentence, top_k, exclude_movies, **kwargs)
+        if cached is not None:
+            return cached
         
-        # Log selected movies with their scores
-        logger.info(f"Selected top {top_k} movies from {len(filtered_indices)} filtered movies")
+        # Generate query embedding (served from the query cache when possible)
+        with span("encode", model_name):
+            query_embedding = encode_queries(model_name, [sentence])[0]
         
-        # Build recommendations list
-        recommendations = []
-        for idx in top_indices:
-            # Get original DataFrame index
-            original_idx = filtered_indices[idx]
-            movie_title = df.iloc[original_idx]["title"]
-            movie_overview = df.iloc[original_idx]["overview"]
-            popularity = df.iloc[original_idx]["popularity"]
-            rating = df.iloc[original_idx]["vote_average"]
+        return _recommend_cached(key, catalog, vector_index, query_embedding, top_k, exclude_movies, model_name,
+                                 **kwargs)
+    except Exception as e:
+        logger.error(f"Error in get_movie_recommendations: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _profiled(label: str, fn):
+    """fn wrapped so that sampled slow calls are profiled on the worker thread running them."""
+    def call(*args, **kwargs):
+        with profile_if_slow(label):
+            return fn(*args, **kwargs)
+    return call
+
+async def _run_in_thread(stage: str, fn, *args, **kwargs):
+    """Fallback runner with the InferenceExecutor.run signature."""
+    return await asyncio.to_thread(fn, *args, **kwargs)
+
+async def get_movie_recommendations_async(sentence: str, model_name: str = "paraphrase-MiniLM-L6-v2",
+                                          top_k: int = 5, exclude_movies: list = None,
+                                          executor=None, **kwargs):
+    """
+    Async variant of get_movie_recommendations used by the API.
+    Data loading, filtering and scoring run in the inference executor (or a
+    worker thread) and the query is encoded through the model's micro-batcher,
+    so the event loop is never blocked by inference.
+    
+    Stages are timed like in get_movie_recommendations; sampled slow load and
+    search stages are profiled on the worker thread running them.
+    
+    Args:
+        executor: Optional InferenceExecutor; with a process pool the whole
+                  synchronous pipeline runs in a worker process
+    """
+    with span("config", model_name):
+        current_config = get_model_config()
+    if model_name not in current_config:
+        raise ValueError(f"Model {model_name} does not exist in configuration")
+    
+    if executor is not None and executor.kind == "process":
+        return await executor.run(
+            "recommend", get_movie_recommendations, sentence, model_name, top_k, exclude_movies, **kwargs
+        )
+    
+    try:
+        run = executor.run if executor is not None else _run_in_thread
+        with span("request", model_name):
+            catalog, vector_index, key, cached = await run(
+                "load", _profiled(f"load-{model_name}", _load_cached), model_name, sentence, top_k,
+                exclude_movies, **kwargs
+            )
+            if cached is not None:
+                return cached
             
-            logger.info(f"Selected movie: {movie_title} (popularity: {popularity:.2f}, rating: {rating:.2f})")
+            start = time.perf_counter()
+            pool = executor.pool if executor is not None else None
+            with span("encode", model_name):
+                query_embedding = (await encode_queries_async(model_name, [sentence], executor=pool))[0]
+            if executor is not None:
+                executor.latencies.record("encode", time.perf_counter() - start)
             
-            recommendations.append({
-                "title": movie_title,
-                "overview": movie_overview,
-                "score": float(similarity_scores[idx]),
-                "popularity": float(popularity),
-                "rating": float(rating)
-            })
+            return await run("search", _profiled(f"search-{model_name}", _recommend_cached), key, catalog,
+                             vector_index, query_embedding, top_k, exclude_movies, model_name, **kwargs)
+    except Exception as e:
+        logger.error(f"Error in get_movie_recommendations_async: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _recommend_similar(catalog: Catalog, vector_index, row: int, top_k: int, exclude_rows: np.ndarray,
+                       **kwargs):
+    """
+    Recommendations similar to a catalog row, leaving out exclude_rows.
+
+    Served from the model's neighbour table when enough of the movie's
+    neighbours pass the filters; otherwise the movie's precomputed embedding is
+    searched like a query (never re-encoding its overview).
+    """
+    filtered_indices = _filter_indices(catalog, **kwargs)
+    if vector_index.neighbors is not None:
+        match = similar_rows(vector_index.neighbors, vector_index.embeddings, row, top_k,
+                             filtered_indices, exclude_rows)
+        if match is not None:
+            logger.debug(f"Similar movies served from the neighbour table ({len(match[0])} of top {top_k})")
+            return catalog.records(*match)
+        logger.info(f"Filters leave fewer than {top_k} precomputed neighbours, running a full search")
+    
+    if filtered_indices is None:
+        filtered_indices = np.arange(len(catalog))
+    filtered_indices = np.setdiff1d(filtered_indices, exclude_rows, assume_unique=True)
+    if len(filtered_indices) == 0:
+        logger.warning(f"No movies match the filter criteria with current parameters")
+        return []
+    query_embedding = np.asarray(vector_index.embeddings[row], dtype=np.float32)
+    top_indices, similarity_scores = vector_index.search(query_embedding, min(top_k, len(filtered_indices)),
+                                                         filtered_indices)
+    return catalog.records(top_indices, similarity_scores)
+
+def get_movie_recommendations_by_movie(movie_title: str, model_name: str = "paraphrase-MiniLM-L6-v2",
+                                       top_k: int = 5, **kwargs):
+    """
+    Get recommendations similar to a catalog movie.
+    Uses the model's neighbour table, or the movie's precomputed row in the
+    embedding matrix as the query, and excludes every movie with that title.
+    """
+    current_config = get_model_config()
+    if model_name not in current_config:
+        raise ValueError(f"Model {model_name} does not exist in configuration")
+    
+    try:
+        catalog, vector_index = _load_data(model_name)
+        rows = catalog.title_rows([movie_title])
+        if len(rows) == 0:
+            raise ValueError(f"Movie '{movie_title}' not found in catalog")
         
-        return recommendations
+        return _recommend_similar(catalog, vector_index, int(rows[0]), top_k, rows, **kwargs)
     except Exception as e:
-        logger.error(f"Error in get_movie_recommendations: {e}")
+        logger.error(f"Error in get_movie_recommendations_by_movie: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def get_similar_movies(movie_id: int, model_name: str = "paraphrase-MiniLM-L6-v2", top_k: int = 5, **kwargs):
+    """
+    Get recommendations similar to the catalog movie with the given id.
+    
+    Raises:
+        HTTPException: 404 if no movie has this id, 500 on other errors
+    """
+    current_config = get_model_config()
+    if model_name not in current_config:
+        raise ValueError(f"Model {model_name} does not exist in configuration")
+    
+    try:
+        catalog, vector_index = _load_data(model_name)
+        rows = catalog.id_rows([movie_id])
+        if len(rows) == 0:
+            raise HTTPException(status_code=404, detail=f"Movie id {movie_id} not found in catalog")
+        
+        return _recommend_similar(catalog, vector_index, int(rows[0]), top_k, rows, **kwargs)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_similar_movies: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def search_movie_titles(query: str, limit: int = 20) -> list:
+    """
+    Type-ahead search over the catalog titles.
+    
+    Returns:
+        list of (label, movie id) tuples, best match first; an empty query
+        returns the most popular movies
+    """
+    return _load_catalog().suggest_titles(query, limit)
+
 def get_movie_df():
     """
-    Returns the movies DataFrame loaded in _CACHE or loads it if needed.
+    Returns the cached movies DataFrame or loads it if needed.
     """
-    if 'df' not in _CACHE:
-        csv_path = os.getenv("MOVIES_CSV_PATH", "data/processed/movies_processed.csv")
-        if csv_path.startswith("s3://"):
-            _CACHE['df'] = read_from_s3(csv_path)
-        else:
-            _CACHE['df'] = pd.read_csv(csv_path)
-    return _CACHE['df'] 
\ No newline at end of file
+    return _load_catalog().df
@@ -0,0 +1,228 @@
+"""
+Response-level cache of recommendation lists.
+Identical requests (the Gradio defaults, homepage queries) are answered
+without encoding, filtering or scoring. Keys are canonical: the normalized
+query, the filters resolved to the catalog rows they select, the excluded
+rows, the model's configuration and the catalog generation. A changed config
+or a new generation therefore never serves stale results.
+
+top_k is rounded up to a bucket (RESULT_CACHE_TOP_K_BUCKETS) before scoring,
+so one cached list also answers every smaller top_k by slicing.
+
+Entries live in a per-process LRU bounded in bytes. With RESULT_CACHE_REDIS_URL
+set, entries are also written to Redis (e.g. a local redis-server) so uvicorn
+workers, the Gradio process and process-pool workers share them; the redis
+package is then required.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from src.utils.logger import logger
+
+RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", "64"))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600"))
+RESULT_CACHE_TOP_K_BUCKETS = os.getenv("RESULT_CACHE_TOP_K_BUCKETS", "10,25,50,100")
+RESULT_CACHE_REDIS_URL = os.getenv("RESULT_CACHE_REDIS_URL", "")
+
+_REDIS_PREFIX = "movie-recommender:results:"
+
+
+def _plain(value):
+    """Frozen configuration (MappingProxyType, tuples) as plain dicts and lists."""
+    if isinstance(value, Mapping):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
+
+def config_digest(config: dict) -> str:
+    """Short hash of a model configuration, part of every result key (independent of key order)."""
+    return hashlib.md5(json.dumps(_plain(config), sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int = 0, ttl_seconds: float = 3600.0, top_k_buckets=(10, 25, 50, 100),
+                 redis_url: str = ""):
+        """
+        Args:
+            max_bytes: Size bound of the local LRU (serialized results; 0 disables the cache)
+            ttl_seconds: Time after which an entry expires (0 disables expiry)
+            top_k_buckets: top_k values results are computed for; a larger top_k is cached as is
+            redis_url: Optional Redis URL shared by every process
+        """
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.top_k_buckets = sorted(int(k) for k in top_k_buckets)
+        self.redis_url = redis_url
+        self._redis = self._connect(redis_url) if redis_url else None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.remote_hits = 0
+        self.remote_errors = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_bytes=int(RESULT_CACHE_MAX_MB * 1024**2),
+            ttl_seconds=RESULT_CACHE_TTL_SECONDS,
+            top_k_buckets=[k for k in RESULT_CACHE_TOP_K_BUCKETS.split(",") if k.strip()],
+            redis_url=RESULT_CACHE_REDIS_URL,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def cache_top_k(self, top_k: int) -> int:
+        """The top_k to compute so the result can be cached: the smallest bucket >= top_k."""
+        if not self.enabled:
+            return top_k
+        for bucket in self.top_k_buckets:
+            if bucket >= top_k:
+                return bucket
+        return top_k
+
+    @staticmethod
+    def _connect(redis_url: str):
+        """
+        Raises:
+            ImportError: If a Redis URL is configured without the redis package
+        """
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("RESULT_CACHE_REDIS_URL is set but the redis package is not installed "
+                              "(pip install redis)") from e
+        # Connections are opened on first use; a slow Redis degrades to local misses
+        return redis.Redis.from_url(redis_url, socket_timeout=0.05, socket_connect_timeout=0.05)
+
+    @staticmethod
+    def _redis_key(key: tuple) -> str:
+        return _REDIS_PREFIX + hashlib.sha1(repr(key).encode()).hexdigest()
+
+    @staticmethod
+    def _covers(entry: tuple, top_k: int) -> bool:
+        # A shorter list than was computed holds every movie that passed the filters
+        cached_k, results = entry
+        return len(results) >= top_k or len(results) < cached_k
+
+    def get(self, key: tuple, top_k: int):
+        """
+        Returns the top_k cached recommendations for a key, or None on a miss
+        (including a cached list computed for a smaller top_k).
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                payload, stored_at, _ = entry
+                if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+                    self._remove(key)
+                    self.expirations += 1
+                elif self._covers(payload, top_k):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return [dict(record) for record in payload[1][:top_k]]
+        if self.redis_url:
+            payload = self._remote_get(key)
+            if payload is not None and self._covers(payload, top_k):
+                self._store(key, payload, len(json.dumps(payload)))
+                with self._lock:
+                    self.hits += 1
+                    self.remote_hits += 1
+                return [dict(record) for record in payload[1][:top_k]]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: tuple, cached_k: int, results: list):
+        """Stores the results computed with top_k=cached_k (locally and in Redis)."""
+        if not self.enabled:
+            return
+        payload = (cached_k, [dict(record) for record in results])
+        encoded = json.dumps(payload)
+        self._store(key, payload, len(encoded))
+        if self.redis_url:
+            self._remote_put(key, encoded)
+
+    def _store(self, key: tuple, payload: tuple, size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (payload, time.monotonic(), size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: tuple):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def _remote_get(self, key: tuple):
+        try:
+            encoded = self._redis.get(self._redis_key(key))
+        except Exception as e:
+            with self._lock:
+                self.remote_errors += 1
+            logger.warning(f"Result cache Redis read failed: {e}")
+            return None
+        if encoded is None:
+            return None
+        cached_k, results = json.loads(encoded)
+        return cached_k, results
+
+    def _remote_put(self, key: tuple, encoded: str):
+        try:
+            ttl = int(self.ttl_seconds) or None
+            self._redis.set(self._redis_key(key), encoded, ex=ttl)
+        except Exception as e:
+            with self._lock:
+                self.remote_errors += 1
+            logger.warning(f"Result cache Redis write failed: {e}")
+
+    def clear(self, model_name: str = None):
+        """
+        Drops every local entry, or only the entries of one model. Redis entries
+        are not deleted: their keys name the old config or generation, so they
+        are never read again and expire with the TTL.
+        """
+        with self._lock:
+            for key in [key for key in self._entries if model_name is None or key[0] == model_name]:
+                self._remove(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "top_k_buckets": self.top_k_buckets,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "redis": bool(self.redis_url),
+                "remote_hits": self.remote_hits,
+                "remote_errors": self.remote_errors,
+            }
+
+
+# Process-wide cache used by the recommendation service
+RESULT_CACHE = ResultCache.from_env()
@@ -0,0 +1,193 @@
+"""
+Catalog and embeddings shared by every serving process on the host.
+With SHARED_MEMORY=true the first process that needs a catalog generation or
+a normalized embedding matrix publishes it as .npy files in a segment under
+SHARED_MEMORY_DIR (tmpfs, /dev/shm by default); every other uvicorn worker and
+the Gradio process attaches the same files read-only with mmap instead of
+building its own copy.
+
+Each segment is reference-counted with flock: attached processes hold a
+shared lock on '<segment>/refs' for as long as an object built on the segment
+is alive. Segments of replaced generations are removed once no process holds
+them; memory maps still in use stay valid until they are closed.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from src.utils.logger import logger
+
+# Publish the catalog and embeddings once per host instead of once per process
+SHARED_MEMORY = os.getenv("SHARED_MEMORY", "false").lower() == "true"
+SHARED_MEMORY_DIR = os.getenv("SHARED_MEMORY_DIR", "/dev/shm/movie-recommender")
+
+_MANIFEST_FILE = "manifest.json"
+
+
+def segment_name(kind: str, *parts) -> str:
+    """Name of a segment identified by its kind and source (paths, sizes, mtimes, options)."""
+    return f"{kind}-{hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()[:16]}"
+
+
+def file_stamp(path: str) -> str:
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+# One attached segment: the open refs file whose shared lock counts this process
+# as a user. Objects built on the segment's arrays keep a reference to it;
+# closing it (explicitly or when the last of them is collected) drops the reference.
+class Segment:
+    def __init__(self, name: str, path: str, meta: dict, refs_file):
+        self.name = name
+        self.path = path
+        self.meta = meta
+        self._refs_file = refs_file
+
+    def close(self):
+        if self._refs_file is not None:
+            self._refs_file.close()
+            self._refs_file = None
+
+    def __del__(self):
+        self.close()
+
+
+def _lock(path: str, flags: int):
+    f = open(path, "a")
+    try:
+        fcntl.flock(f, flags)
+    except BlockingIOError:
+        f.close()
+        return None
+    return f
+
+
+def _attach(name: str, path: str):
+    refs_file = _lock(os.path.join(path, "refs"), fcntl.LOCK_SH)
+    with open(os.path.join(path, _MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    arrays = {key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode="r") for key in manifest["arrays"]}
+    return Segment(name, path, manifest.get("meta", {}), refs_file), arrays
+
+
+def attach_or_publish(name: str, build_fn, directory: str = None):
+    """
+    Attaches a published segment, publishing it first if no process has.
+
+    Args:
+        name: Segment name (see segment_name)
+        build_fn: Returns (dict of numpy arrays, JSON-serializable meta); only
+            called by the one process that publishes
+        directory: Segments root (defaults to SHARED_MEMORY_DIR)
+
+    Returns:
+        tuple: (Segment to keep referenced while the arrays are used, dict of
+        read-only memory-mapped arrays)
+    """
+    directory = directory or SHARED_MEMORY_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    # The name lock serializes publishing with attaching and with collection
+    name_lock = _lock(f"{path}.lock", fcntl.LOCK_EX)
+    try:
+        if not os.path.exists(os.path.join(path, _MANIFEST_FILE)):
+            arrays, meta = build_fn()
+            tmp_path = f"{path}.{os.getpid()}.part"
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            os.makedirs(tmp_path)
+            for key, array in arrays.items():
+                np.save(os.path.join(tmp_path, f"{key}.npy"), np.ascontiguousarray(array))
+            with open(os.path.join(tmp_path, _MANIFEST_FILE), "w") as f:
+                json.dump({"arrays": list(arrays), "meta": meta}, f)
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+            size_mb = sum(array.nbytes for array in arrays.values()) / 1024**2
+            logger.info(f"Published shared segment {name} ({size_mb:.1f} MB)")
+            # Also clear segments left behind by replaced generations or dead processes
+            collect(keep=(name,), directory=directory)
+        else:
+            logger.info(f"Attaching shared segment {name}")
+        return _attach(name, path)
+    finally:
+        name_lock.close()
+
+
+def collect(keep=(), directory: str = None) -> list:
+    """
+    Removes segments that no process is attached to.
+
+    Args:
+        keep: Segment names to keep even if unreferenced
+
+    Returns:
+        list: Names of the removed segments
+    """
+    directory = directory or SHARED_MEMORY_DIR
+    removed = []
+    if not os.path.isdir(directory):
+        return removed
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name in keep or not os.path.isdir(path) or not os.path.exists(os.path.join(path, _MANIFEST_FILE)):
+            continue
+        name_lock = _lock(f"{path}.lock", fcntl.LOCK_EX | fcntl.LOCK_NB)
+        if name_lock is None:
+            continue
+        try:
+            refs_lock = _lock(os.path.join(path, "refs"), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            if refs_lock is None:
+                continue
+            refs_lock.close()
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(name)
+        finally:
+            name_lock.close()
+    if removed:
+        logger.info(f"Removed unreferenced shared segments: {removed}")
+    return removed
+
+
+def shared_catalog(catalog_path: str, generation: int, load_df):
+    """
+    The catalog of a generation attached from shared memory.
+
+    Args:
+        catalog_path: Local catalog file (its size and mtime identify the segment)
+        generation: Catalog generation number
+        load_df: Returns the catalog DataFrame; only called when publishing
+    """
+    from src.api.catalog import Catalog
+
+    def build():
+        return Catalog(load_df()).to_arrays(), {}
+
+    name = segment_name(f"catalog-g{generation}", file_stamp(catalog_path), Catalog.arrays_version)
+    segment, arrays = attach_or_publish(name, build)
+    catalog = Catalog.from_arrays(arrays)
+    # The catalog keeps its segment referenced for as long as it is in use
+    catalog.segment = segment
+    return catalog
+
+
+def shared_embeddings(embeddings_path: str, dtype: str, load_embeddings) -> np.ndarray:
+    """
+    A normalized embedding matrix attached from shared memory.
+
+    Args:
+        embeddings_path: Local embeddings .npy (its size and mtime identify the segment)
+        dtype: Storage dtype of the normalized matrix
+        load_embeddings: Returns the normalized matrix; only called when publishing
+    """
+    def build():
+        return {"embeddings": load_embeddings()}, {}
+
+    segment, arrays = attach_or_publish(segment_name("embeddings", file_stamp(embeddings_path), dtype), build)
+    embeddings = arrays["embeddings"]
+    # np.memmap objects accept attributes; views of it keep it (and the segment) alive
+    embeddings.segment = segment
+    return embeddings
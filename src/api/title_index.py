@@ -0,0 +1,204 @@
+"""
+Title and id lookup index of the movie catalog.
+It is built once with the catalog. Exact lookups hash every title (pandas'
+stable 64-bit hash) into a sorted array, so a title resolves with a binary
+search plus a comparison of its few candidate rows; ids are kept sorted the
+same way. Both are flat arrays, shared with the catalog in shared memory.
+Duplicate titles resolve to all of their rows; ids tell them apart.
+
+Type-ahead search (suggest) uses a prefix index over case-folded titles and a
+trigram index for words inside titles. Both are built on first use, only in
+the processes that serve type-ahead (the Gradio UI).
+"""
+import threading
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# Minimum share of the query's trigrams a title must contain to be suggested
+MIN_TRIGRAM_SIMILARITY = 0.5
+# Highest code point, used as the upper bound of a prefix range
+_MAX_CHAR = "\U0010ffff"
+
+
+def normalize_title(title) -> str:
+    """Search form of a title: accents removed, case-folded, whitespace collapsed."""
+    decomposed = unicodedata.normalize("NFKD", str(title))
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.casefold().split())
+
+
+def trigrams(text: str) -> set:
+    """Trigrams of a normalized text, padded so word starts and ends count."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _hash_titles(titles) -> np.ndarray:
+    return pd.util.hash_array(np.asarray(titles, dtype=object), categorize=False)
+
+
+def _rank_values(rank: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    return np.nan_to_num(np.asarray(rank[rows], dtype=np.float64), nan=-np.inf)
+
+
+def _top_ranked(rows: np.ndarray, rank: np.ndarray, limit: int) -> np.ndarray:
+    """The limit rows with the highest rank, best first (the first rows without a rank)."""
+    if rank is None or len(rows) == 0:
+        return rows[:limit]
+    values = _rank_values(rank, rows)
+    if len(rows) > limit:
+        top = np.argpartition(-values, limit - 1)[:limit]
+        rows, values = rows[top], values[top]
+    return rows[np.lexsort((rows, -values))]
+
+
+# Prefix and trigram structures for type-ahead, built lazily from the titles.
+class _TypeAhead:
+    def __init__(self, titles):
+        keys = np.array([normalize_title(title) for title in titles], dtype=object)
+        self.num_rows = len(keys)
+        self.key_rows = np.argsort(keys, kind="stable")
+        self.sorted_keys = keys[self.key_rows]
+
+        postings = {}
+        for row, key in enumerate(keys):
+            for gram in trigrams(key):
+                postings.setdefault(gram, []).append(row)
+        self.grams = {gram: position for position, gram in enumerate(postings)}
+        lengths = [len(rows) for rows in postings.values()]
+        self.gram_offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.gram_offsets[1:])
+        self.gram_rows = np.fromiter((row for rows in postings.values() for row in rows), dtype=np.int64,
+                                     count=int(self.gram_offsets[-1]))
+
+    def prefix_rows(self, key: str):
+        """Rows whose title is the key, and rows whose title starts with it (other than the key)."""
+        start = np.searchsorted(self.sorted_keys, key, side="left")
+        exact_stop = np.searchsorted(self.sorted_keys, key, side="right")
+        stop = np.searchsorted(self.sorted_keys, key + _MAX_CHAR, side="left")
+        return self.key_rows[start:exact_stop], self.key_rows[exact_stop:stop]
+
+    def trigram_rows(self, key: str):
+        """Rows sharing at least MIN_TRIGRAM_SIMILARITY of the key's trigrams, with that share."""
+        grams = trigrams(key)
+        counts = np.zeros(self.num_rows, dtype=np.int16)
+        for gram in grams:
+            position = self.grams.get(gram)
+            if position is not None:
+                # A posting lists every row once, so the fancy-index increment is exact
+                counts[self.gram_rows[self.gram_offsets[position]:self.gram_offsets[position + 1]]] += 1
+        rows = np.flatnonzero(counts >= MIN_TRIGRAM_SIMILARITY * len(grams))
+        return rows, counts[rows] / len(grams)
+
+
+class TitleIndex:
+    def __init__(self, titles, ids: np.ndarray = None):
+        """
+        Args:
+            titles: Title of every catalog row (object array or StringColumn)
+            ids: Optional movie id of every row
+        """
+        self.titles = titles
+        hashes = _hash_titles(titles[np.arange(len(titles))])
+        self.title_order = np.argsort(hashes, kind="stable")
+        self.title_hashes = hashes[self.title_order]
+        self.id_order = None if ids is None else np.argsort(ids, kind="stable")
+        self.sorted_ids = None if ids is None else ids[self.id_order]
+        self._type_ahead = None
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.title_order, self.title_hashes]
+        if self.sorted_ids is not None:
+            arrays += [self.id_order, self.sorted_ids]
+        return sum(array.nbytes for array in arrays)
+
+    def to_arrays(self) -> dict:
+        arrays = {"title_index.order": self.title_order, "title_index.hashes": self.title_hashes}
+        if self.sorted_ids is not None:
+            arrays.update({"title_index.id_order": self.id_order, "title_index.ids": self.sorted_ids})
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, titles, arrays: dict):
+        """Rebuilds an index from to_arrays() output (e.g. read-only shared memory maps)."""
+        index = cls.__new__(cls)
+        index.titles = titles
+        index.title_order, index.title_hashes = arrays["title_index.order"], arrays["title_index.hashes"]
+        index.id_order, index.sorted_ids = arrays.get("title_index.id_order"), arrays.get("title_index.ids")
+        index._type_ahead = None
+        index._lock = threading.Lock()
+        return index
+
+    def title_rows(self, titles) -> np.ndarray:
+        """Sorted row ids of the movies with any of the given (exact) titles."""
+        titles = [str(title) for title in titles]
+        if not titles:
+            return np.empty(0, dtype=np.int64)
+        hashes = _hash_titles(titles)
+        starts = np.searchsorted(self.title_hashes, hashes, side="left")
+        stops = np.searchsorted(self.title_hashes, hashes, side="right")
+        matches = []
+        for title, start, stop in zip(titles, starts, stops):
+            rows = self.title_order[start:stop]
+            # Hash collisions are possible; compare the candidate titles
+            matches.append(rows[self.titles[rows] == title] if len(rows) else rows)
+        return np.unique(np.concatenate(matches)).astype(np.int64)
+
+    def id_rows(self, ids) -> np.ndarray:
+        """Sorted row ids of the movies with any of the given ids (empty without an id column)."""
+        if self.sorted_ids is None:
+            return np.empty(0, dtype=np.int64)
+        ids = np.asarray(ids, dtype=self.sorted_ids.dtype)
+        starts = np.searchsorted(self.sorted_ids, ids, side="left")
+        stops = np.searchsorted(self.sorted_ids, ids, side="right")
+        rows = [self.id_order[start:stop] for start, stop in zip(starts, stops)]
+        return np.unique(np.concatenate(rows)).astype(np.int64) if rows else np.empty(0, dtype=np.int64)
+
+    def _get_type_ahead(self) -> _TypeAhead:
+        with self._lock:
+            if self._type_ahead is None:
+                self._type_ahead = _TypeAhead(self.titles[np.arange(len(self.titles))])
+            return self._type_ahead
+
+    def suggest(self, query: str, limit: int = 20, rank: np.ndarray = None) -> np.ndarray:
+        """
+        Rows whose title matches a partial query, best first: titles starting
+        with the query, then titles sharing most of its trigrams (words inside
+        the title, small typos). Exact titles come first. Ties are ordered by
+        rank (e.g. popularity).
+
+        Args:
+            query: Partial title as typed
+            limit: Maximum number of rows
+            rank: Optional per-row score, higher first; an empty query returns
+                the top rows by rank
+
+        Returns:
+            numpy array of at most limit row ids
+        """
+        key = normalize_title(query)
+        if not key:
+            return _top_ranked(np.arange(len(self.titles)), rank, limit)
+        type_ahead = self._get_type_ahead()
+        exact, prefixed = type_ahead.prefix_rows(key)
+        rows = np.concatenate([_top_ranked(exact, rank, limit), _top_ranked(prefixed, rank, limit)])[:limit]
+        if len(rows) < limit and len(key) >= 3:
+            trigram_rows, similarity = type_ahead.trigram_rows(key)
+            new = ~np.isin(trigram_rows, rows)
+            trigram_rows, similarity = trigram_rows[new], similarity[new]
+            wanted = limit - len(rows)
+            if len(trigram_rows) > wanted:
+                # Keep the rows above the wanted-th best similarity and the best ranked at it
+                threshold = np.partition(similarity, len(similarity) - wanted)[len(similarity) - wanted]
+                above = similarity > threshold
+                at = _top_ranked(trigram_rows[similarity == threshold], rank, wanted - int(above.sum()))
+                trigram_rows = np.concatenate([trigram_rows[above], at])
+                similarity = np.concatenate([similarity[above], np.full(len(at), threshold)])
+            ties = np.zeros(len(trigram_rows)) if rank is None else -_rank_values(rank, trigram_rows)
+            order = np.lexsort((trigram_rows, ties, -similarity))
+            rows = np.concatenate([rows, trigram_rows[order]])
+        return rows
@@ -0,0 +1,503 @@
+"""
+Vector index layer used to search the catalog embeddings of each model.
+It provides an exact FlatIndex and an approximate IVFIndex (pure numpy
+k-means inverted lists), both supporting a metadata pre-filter given as
+catalog row ids.
+
+IVF indexes are built offline and persisted next to the embeddings file:
+    python -m src.api.vector_index build --model <model_name>
+    python -m src.api.vector_index report --model <model_name>
+"""
+import argparse
+import hashlib
+import os
+import time
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from src.utils.logger import logger
+
+# Below this fraction of the catalog, exact scoring gathers the filtered rows
+# first instead of running the product over the full matrix
+_GATHER_FRACTION = 0.5
+# Rows upcast to float32 per product when the matrix is stored as float16
+_UPCAST_CHUNK = 4096
+
+
+def normalize_embeddings(embeddings: np.ndarray, dtype: str = "float32") -> np.ndarray:
+    """
+    L2-normalizes embeddings row-wise so cosine similarity becomes a dot product.
+
+    Args:
+        embeddings: Array of shape (n, dim) or (dim,)
+        dtype: Storage dtype of the result ("float32" or "float16")
+
+    Returns:
+        numpy array with unit-norm rows (zero rows are left as zeros)
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (embeddings / norms).astype(dtype, copy=False)
+
+
+def score_rows(matrix: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    """
+    float32 matrix.dot(vectors). numpy has no fast float16 product, so float16
+    rows are upcast to float32 chunk by chunk. This avoids the slow float16
+    product and a full float32 copy, but the upcast still makes a float16 scan
+    several times slower than a float32 one: float16 trades scan latency for
+    half the memory.
+    """
+    if matrix.dtype == np.float32:
+        return matrix.dot(vectors)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scores = np.empty((len(matrix),) + vectors.shape[1:], dtype=np.float32)
+    for start in range(0, len(matrix), _UPCAST_CHUNK):
+        stop = start + _UPCAST_CHUNK
+        scores[start:stop] = matrix[start:stop].astype(np.float32).dot(vectors)
+    return scores
+
+
+def is_normalized(embeddings: np.ndarray, sample_size: int = 1000, atol: float = 1e-3) -> bool:
+    """Checks on a sample of rows whether embeddings already have unit (or zero) norm."""
+    if len(embeddings) == 0:
+        return True
+    rows = np.linspace(0, len(embeddings) - 1, min(sample_size, len(embeddings))).astype(np.int64)
+    norms = np.linalg.norm(np.asarray(embeddings[rows], dtype=np.float32), axis=-1)
+    return bool(np.all((np.abs(norms - 1.0) <= atol) | (norms == 0)))
+
+
+def load_normalized_memmap(path: str, dtype: str = "float32", cache_dir: str = None) -> np.ndarray:
+    """
+    Opens a local embeddings .npy as a read-only memory map of L2-normalized rows.
+
+    If the file is already normalized and stored in the requested dtype it is
+    mapped directly. Otherwise a normalized copy is written once to cache_dir
+    (keyed by path, size and mtime) and mapped, so every process on the host
+    shares the same page-cache-backed matrix.
+
+    Args:
+        path: Local path of the embeddings .npy
+        dtype: Storage dtype of the normalized matrix ("float32" or "float16")
+        cache_dir: Directory for normalized copies (defaults to ARTIFACT_CACHE_DIR)
+    """
+    embeddings = np.load(path, mmap_mode="r")
+    if embeddings.dtype == np.dtype(dtype) and is_normalized(embeddings):
+        return embeddings
+
+    if cache_dir is None:
+        from src.utils.s3_utils import ARTIFACT_CACHE_DIR
+        cache_dir = ARTIFACT_CACHE_DIR
+    stat = os.stat(path)
+    digest = hashlib.md5(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+    normalized_path = os.path.join(cache_dir, f"{digest}.{dtype}.normalized.npy")
+
+    if not os.path.exists(normalized_path):
+        logger.info(f"Writing normalized copy of {path} to {normalized_path}")
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{normalized_path}.{os.getpid()}.part"
+        out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=embeddings.shape)
+        # Normalize in chunks to keep peak memory bounded
+        for start in range(0, len(embeddings), 65536):
+            out[start:start + 65536] = normalize_embeddings(embeddings[start:start + 65536], dtype)
+        out.flush()
+        del out
+        # Atomic rename: concurrent workers either see the full file or none
+        os.replace(tmp_path, normalized_path)
+    return np.load(normalized_path, mmap_mode="r")
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """
+    Returns the positions of the top_k highest scores in descending order.
+    Uses np.argpartition (O(N)) and only sorts the selected k candidates.
+    """
+    top_k = min(top_k, len(scores))
+    if top_k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if top_k < len(scores):
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def index_path_for(embeddings_path: str, index_type: str) -> str:
+    """
+    Returns the path of the persisted index that sits next to an embeddings .npy
+    (e.g. 'embeddings_x.npy' -> 'embeddings_x.ivf.npz').
+    """
+    base = embeddings_path[:-len(".npy")] if embeddings_path.endswith(".npy") else embeddings_path
+    return f"{base}.{index_type}.npz"
+
+
+# Base class for vector indexes over an L2-normalized embedding matrix.
+class BaseVectorIndex(ABC):
+    # Optional src.api.neighbors.NeighborTable over the same rows, attached by the service
+    neighbors = None
+
+    def __init__(self, embeddings: np.ndarray):
+        self.embeddings = embeddings
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    @property
+    def nbytes(self) -> int:
+        """Resident bytes held by the index (a memory-mapped matrix lives in the page cache)."""
+        return 0 if isinstance(self.embeddings, np.memmap) else self.embeddings.nbytes
+
+    def _exact(self, query: np.ndarray, top_k: int, candidates=None):
+        """Exact top-k over the full matrix or over the given row ids."""
+        if candidates is None:
+            scores = score_rows(self.embeddings, query)
+            top = top_k_indices(scores, top_k)
+            return top, scores[top]
+        if len(candidates) < _GATHER_FRACTION * len(self.embeddings):
+            # Small candidate set: only touch the filtered rows
+            scores = score_rows(self.embeddings[candidates], query)
+        else:
+            # Large candidate set: one GEMV over the full matrix, then pick the scores
+            scores = score_rows(self.embeddings, query)[candidates]
+        top = top_k_indices(scores, top_k)
+        return candidates[top], scores[top]
+
+    @abstractmethod
+    def search(self, query_embedding: np.ndarray, top_k: int, candidates=None):
+        """
+        Finds the catalog rows most similar to the query.
+
+        Args:
+            query_embedding: Query embedding of shape (dim,) or (1, dim)
+            top_k: Number of results to return
+            candidates: Optional sorted array of allowed row ids (pre-filter);
+                None means the whole catalog
+
+        Returns:
+            tuple: (row ids, float32 cosine scores), best first
+        """
+        pass
+
+    def search_batch(self, query_embeddings: np.ndarray, top_k, candidates=None):
+        """
+        Searches several queries that share the same pre-filter.
+
+        Args:
+            query_embeddings: Array of shape (m, dim)
+            top_k: Number of results, either one int or one per query
+            candidates: Optional sorted array of allowed row ids shared by all queries
+
+        Returns:
+            list of (row ids, scores) tuples, one per query
+        """
+        top_ks = np.broadcast_to(top_k, len(query_embeddings))
+        return [self.search(query, int(k), candidates) for query, k in zip(query_embeddings, top_ks)]
+
+
+# Exact brute-force search.
+class FlatIndex(BaseVectorIndex):
+    index_type = "flat"
+
+    # Queries scored per matrix-matrix product, bounding the (rows x queries) score block
+    _QUERY_CHUNK = 256
+
+    def search(self, query_embedding: np.ndarray, top_k: int, candidates=None):
+        query = normalize_embeddings(np.ravel(query_embedding))
+        return self._exact(query, top_k, candidates)
+
+    def search_batch(self, query_embeddings: np.ndarray, top_k, candidates=None):
+        queries = normalize_embeddings(np.atleast_2d(query_embeddings))
+        top_ks = np.broadcast_to(top_k, len(queries))
+        gather = candidates is not None and len(candidates) < _GATHER_FRACTION * len(self.embeddings)
+        matrix = self.embeddings[candidates] if gather else self.embeddings
+        results = []
+        for start in range(0, len(queries), self._QUERY_CHUNK):
+            # One matrix-matrix product scores the whole chunk of queries
+            scores = score_rows(matrix, queries[start:start + self._QUERY_CHUNK].T)
+            if candidates is not None and not gather:
+                scores = scores[candidates]
+            for column, k in enumerate(top_ks[start:start + self._QUERY_CHUNK]):
+                column_scores = np.ascontiguousarray(scores[:, column])
+                top = top_k_indices(column_scores, int(k))
+                row_ids = top if candidates is None else candidates[top]
+                results.append((row_ids, column_scores[top]))
+        return results
+
+
+# Inverted-file index: rows are bucketed by their nearest k-means centroid and
+# a query only scores the rows of its `nprobe` closest buckets.
+class IVFIndex(BaseVectorIndex):
+    index_type = "ivf"
+
+    def __init__(self, embeddings: np.ndarray, centroids: np.ndarray, list_offsets: np.ndarray,
+                 list_ids: np.ndarray, nprobe: int = 8):
+        super().__init__(embeddings)
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.nprobe = nprobe
+
+    @property
+    def nbytes(self) -> int:
+        return super().nbytes + self.centroids.nbytes + self.list_offsets.nbytes + self.list_ids.nbytes
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, nlist: int = None, nprobe: int = 8,
+              iterations: int = 20, sample_size: int = 100000, seed: int = 0):
+        """
+        Trains spherical k-means centroids and assigns every row to its nearest list.
+
+        Args:
+            embeddings: L2-normalized embedding matrix
+            nlist: Number of inverted lists (defaults to ~4*sqrt(N))
+            nprobe: Default number of lists scanned per query
+            iterations: k-means iterations
+            sample_size: Maximum number of rows used for training
+            seed: Random seed for the training sample and initialization
+        """
+        num_rows = len(embeddings)
+        if nlist is None:
+            nlist = int(4 * np.sqrt(num_rows))
+        nlist = max(1, min(nlist, num_rows))
+        rng = np.random.default_rng(seed)
+
+        sample = embeddings
+        if num_rows > sample_size:
+            sample = embeddings[rng.choice(num_rows, sample_size, replace=False)]
+        sample = np.asarray(sample, dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignment = np.argmax(sample.dot(centroids.T), axis=1)
+            counts = np.bincount(assignment, minlength=nlist)
+            order = np.argsort(assignment, kind="stable")
+            sums = np.zeros_like(centroids)
+            non_empty = counts > 0
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[non_empty]
+            sums[non_empty] = np.add.reduceat(sample[order], starts, axis=0)
+            empty = ~non_empty
+            # Re-seed empty lists with random rows so every list stays usable
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = normalize_embeddings(sums)
+
+        assignment = cls._nearest_lists(embeddings, centroids, np.arange(num_rows))
+        return cls.from_assignment(embeddings, centroids, assignment, nprobe)
+
+    @staticmethod
+    def _nearest_lists(embeddings: np.ndarray, centroids: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        # Assign rows in chunks to bound the temporary score matrix
+        assignment = np.empty(len(rows), dtype=np.int64)
+        for start in range(0, len(rows), 8192):
+            chunk = np.asarray(embeddings[rows[start:start + 8192]], dtype=np.float32)
+            assignment[start:start + 8192] = np.argmax(chunk.dot(centroids.T), axis=1)
+        return assignment
+
+    @classmethod
+    def from_assignment(cls, embeddings: np.ndarray, centroids: np.ndarray, assignment: np.ndarray,
+                        nprobe: int = 8):
+        """Builds the inverted lists from the list number of every row."""
+        list_ids = np.argsort(assignment, kind="stable")
+        list_offsets = np.concatenate(([0], np.cumsum(np.bincount(assignment, minlength=len(centroids)))))
+        return cls(embeddings, centroids, list_offsets, list_ids, nprobe)
+
+    def assignment(self) -> np.ndarray:
+        """List number of every row."""
+        assignment = np.empty(len(self.list_ids), dtype=np.int64)
+        assignment[self.list_ids] = np.repeat(np.arange(len(self.centroids)), np.diff(self.list_offsets))
+        return assignment
+
+    def update(self, embeddings: np.ndarray, rows: np.ndarray):
+        """
+        Returns an index over a new version of the embeddings that keeps the
+        trained centroids: only the given rows (changed or appended, possibly
+        beyond the current length) are re-assigned.
+        """
+        assignment = np.empty(len(embeddings), dtype=np.int64)
+        kept = min(len(self), len(embeddings))
+        assignment[:kept] = self.assignment()[:kept]
+        rows = np.asarray(rows, dtype=np.int64)
+        assignment[rows] = self._nearest_lists(embeddings, self.centroids, rows)
+        return self.from_assignment(embeddings, self.centroids, assignment, self.nprobe)
+
+    def search(self, query_embedding: np.ndarray, top_k: int, candidates=None, nprobe: int = None):
+        query = normalize_embeddings(np.ravel(query_embedding))
+        nlist = len(self.centroids)
+        nprobe = min(nprobe or self.nprobe, nlist)
+
+        allowed = None
+        if candidates is not None:
+            # A selective pre-filter is cheaper to score exactly than to probe
+            expected_scan = len(self) * nprobe / nlist
+            if len(candidates) <= expected_scan:
+                return self._exact(query, top_k, candidates)
+            allowed = np.zeros(len(self), dtype=bool)
+            allowed[candidates] = True
+
+        list_order = np.argsort(-self.centroids.dot(query))
+        probed = 0
+        row_ids = np.empty(0, dtype=np.int64)
+        # Keep probing more lists until the filter leaves enough rows
+        while probed < nlist:
+            lists = list_order[probed:probed + nprobe]
+            probed += len(lists)
+            new_ids = np.concatenate(
+                [self.list_ids[self.list_offsets[l]:self.list_offsets[l + 1]] for l in lists]
+            )
+            if allowed is not None:
+                new_ids = new_ids[allowed[new_ids]]
+            row_ids = np.concatenate((row_ids, new_ids))
+            if len(row_ids) >= top_k:
+                break
+            nprobe *= 2
+
+        scores = score_rows(self.embeddings[row_ids], query)
+        top = top_k_indices(scores, top_k)
+        return row_ids[top], scores[top]
+
+    def save(self, path: str):
+        """Persists the index structure (not the embeddings) as a .npz file."""
+        np.savez(
+            path,
+            num_rows=np.int64(len(self)),
+            centroids=self.centroids,
+            list_offsets=self.list_offsets,
+            list_ids=self.list_ids,
+        )
+
+    @classmethod
+    def load(cls, source, embeddings: np.ndarray, nprobe: int = 8):
+        """
+        Loads a persisted index for the given embeddings.
+
+        Args:
+            source: Path or file-like object of the .npz written by save()
+
+        Raises:
+            ValueError: If the index was built for a different number of rows
+        """
+        with np.load(source) as data:
+            if int(data["num_rows"]) != len(embeddings):
+                raise ValueError(
+                    f"Index was built for {int(data['num_rows'])} rows, "
+                    f"embeddings have {len(embeddings)}"
+                )
+            return cls(embeddings, data["centroids"], data["list_offsets"], data["list_ids"], nprobe)
+
+
+def load_vector_index(embeddings: np.ndarray, embeddings_path: str, index_config: dict = None,
+                      quantization_config: dict = None) -> BaseVectorIndex:
+    """
+    Builds the vector index selected by a model's "index" and "quantization" configuration.
+
+    Args:
+        embeddings: L2-normalized embedding matrix of the model
+        embeddings_path: Path of the embeddings .npy (the index is stored next to it)
+        index_config: e.g. {"type": "ivf", "nprobe": 8}; defaults to a flat index
+        quantization_config: e.g. {"type": "int8", "rerank": 200}; scores on compressed
+            codes and re-ranks exactly (see src.api.quantization)
+
+    Returns:
+        BaseVectorIndex: The persisted ANN index, or a FlatIndex when the
+        configuration asks for one or the ANN index cannot be loaded
+    """
+    index_config = index_config or {}
+    index_type = index_config.get("type", "flat").lower()
+    if quantization_config:
+        from src.api.quantization import load_quantized_index
+        if index_type != "flat":
+            logger.warning(f"Quantization replaces the {index_type} index, using a quantized flat scan")
+        return load_quantized_index(embeddings, embeddings_path, quantization_config)
+    if index_type == "flat":
+        return FlatIndex(embeddings)
+    if index_type != "ivf":
+        raise ValueError(f"Unsupported index type: {index_type}")
+
+    path = index_config.get("path") or index_path_for(embeddings_path, index_type)
+    try:
+        if path.startswith("s3://"):
+            from src.utils.s3_utils import download_model_from_s3
+            path = download_model_from_s3(path)
+        index = IVFIndex.load(path, embeddings, nprobe=int(index_config.get("nprobe", 8)))
+        logger.info(f"Loaded IVF index from {path} ({len(index.centroids)} lists)")
+        return index
+    except Exception as e:
+        logger.warning(f"Could not load IVF index from {path} ({e}), falling back to exact search")
+        return FlatIndex(embeddings)
+
+
+def benchmark(embeddings: np.ndarray, index: BaseVectorIndex, num_queries: int = 200,
+              top_k: int = 10, nprobes=(1, 2, 4, 8, 16, 32), seed: int = 0):
+    """
+    Measures recall@k and latency of an IVF index against the exact path,
+    using catalog rows as queries.
+
+    Returns:
+        list of dicts with keys nprobe, recall, latency_ms (nprobe=None is the exact path)
+    """
+    rng = np.random.default_rng(seed)
+    queries = embeddings[rng.choice(len(embeddings), min(num_queries, len(embeddings)), replace=False)]
+    exact = FlatIndex(embeddings)
+
+    start = time.perf_counter()
+    truth = [set(exact.search(q, top_k)[0].tolist()) for q in queries]
+    rows = [{"nprobe": None, "recall": 1.0, "latency_ms": (time.perf_counter() - start) * 1000 / len(queries)}]
+
+    for nprobe in nprobes:
+        start = time.perf_counter()
+        results = [index.search(q, top_k, nprobe=nprobe)[0] for q in queries]
+        latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        recall = np.mean([len(truth[i] & set(r.tolist())) / top_k for i, r in enumerate(results)])
+        rows.append({"nprobe": nprobe, "recall": float(recall), "latency_ms": latency_ms})
+    return rows
+
+
+def _load_model_embeddings(model_name: str):
+    from src.config.model_config import MODEL_CONFIG
+    from src.utils.s3_utils import read_from_s3
+    config = MODEL_CONFIG.get(model_name)
+    if not config or not config.get("embeddings_path"):
+        raise ValueError(f"No embeddings_path configured for model {model_name}")
+    embeddings_path = config["embeddings_path"]
+    if embeddings_path.startswith("s3://"):
+        embeddings = read_from_s3(embeddings_path)
+    else:
+        embeddings = np.load(embeddings_path)
+    return config, embeddings_path, normalize_embeddings(embeddings, config.get("embeddings_dtype", "float32"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or evaluate the vector index of a model.")
+    parser.add_argument("command", choices=["build", "report"])
+    parser.add_argument("--model", required=True, help="Model name in the models configuration")
+    parser.add_argument("--nlist", type=int, default=None, help="Number of IVF lists (default ~4*sqrt(N))")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    config, embeddings_path, embeddings = _load_model_embeddings(args.model)
+    index_config = config.get("index", {})
+    path = index_config.get("path") or index_path_for(embeddings_path, "ivf")
+
+    if args.command == "build":
+        start = time.perf_counter()
+        index = IVFIndex.build(embeddings, nlist=args.nlist or index_config.get("nlist"))
+        logger.info(f"Built IVF index with {len(index.centroids)} lists in {time.perf_counter() - start:.1f}s")
+        from src.utils.s3_utils import save_artifact
+        save_artifact(path, index.save)
+        logger.info(f"IVF index saved to {path}")
+    else:
+        index = load_vector_index(embeddings, embeddings_path, {**index_config, "type": "ivf"})
+        if not isinstance(index, IVFIndex):
+            index = IVFIndex.build(embeddings, nlist=args.nlist or index_config.get("nlist"))
+        print(f"Model: {args.model} | rows: {len(embeddings)} | lists: {len(index.centroids)} | top_k: {args.top_k}")
+        print("| nprobe | recall@k | latency (ms/query) |")
+        print("|--------|----------|--------------------|")
+        for row in benchmark(embeddings, index, num_queries=args.queries, top_k=args.top_k):
+            nprobe = "exact" if row["nprobe"] is None else row["nprobe"]
+            print(f"| {nprobe} | {row['recall']:.3f} | {row['latency_ms']:.3f} |")
+
+
+if __name__ == "__main__":
+    main()
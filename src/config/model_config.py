@@ -1,76 +1,233 @@
 """
 Configuration module for model settings.
 Loads model configuration either from a local JSON file or AWS SSM Parameter Store.
+
+The configuration is kept as an immutable, versioned snapshot. Requests read the
+current snapshot without locking; it is only replaced by refresh_model_config(),
+which is driven by the file-mtime / SSM-version watcher, the Gradio
+"Reload Config" button or an explicit load_model_config() call.
 """
 import os
+import hashlib
 import json
+import threading
+import time
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import NamedTuple
 import boto3
 from dotenv import load_dotenv
 from src.utils.logger import logger
 
 load_dotenv()
 
-MODEL_CONFIG = {}
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), "models_config.json")
+
+# Seconds between watcher checks of the file mtime / SSM parameter version (0 disables)
+CONFIG_POLL_SECONDS = float(os.getenv("CONFIG_POLL_SECONDS", "30"))
+
+
+class ConfigSnapshot(NamedTuple):
+    version: str
+    source: str
+    models: Mapping
+    loaded_at: float
+
+
+def _freeze(value):
+    """Recursively wraps dicts in read-only mappings and lists in tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+# Current snapshot; replaced atomically (a single reference assignment)
+_SNAPSHOT = ConfigSnapshot(version="", source="", models=MappingProxyType({}), loaded_at=0.0)
+_REFRESH_LOCK = threading.Lock()
+_LISTENERS = []
+# Last version read from the local file (it differs from the snapshot version
+# while SSM is used) and digest of the published configuration content
+_FILE_VERSION = None
+_CONTENT_DIGEST = None
+
+
+# Read-only view of the current snapshot's models. Modules that imported
+# MODEL_CONFIG keep seeing the latest configuration without any copying.
+class _ModelConfigView(Mapping):
+    def __getitem__(self, key):
+        return _SNAPSHOT.models[key]
+
+    def __iter__(self):
+        return iter(_SNAPSHOT.models)
+
+    def __len__(self):
+        return len(_SNAPSHOT.models)
 
-def load_model_config_from_ssm():
+    def __repr__(self):
+        return f"MODEL_CONFIG(version={_SNAPSHOT.version!r}, models={list(_SNAPSHOT.models)})"
+
+
+MODEL_CONFIG = _ModelConfigView()
+
+def _ssm_parameter_name() -> str:
+    environment = os.getenv("ENVIRONMENT", "dev")
+    return f"/{environment}/movie-recommender/models-config"
+
+def load_model_config_from_ssm(known_version: str = None):
     """
     Loads the model configuration from AWS SSM Parameter Store.
     It assumes the parameter contains a JSON string.
+
+    Args:
+        known_version: Version of the current snapshot; if SSM reports the same
+            parameter version the value is not parsed again.
+
+    Returns:
+        tuple: (config dict or None if unchanged, version string), or None on error
     """
-    logger.info("Attempting to load config from SSM...")
-    environment = os.getenv("ENVIRONMENT", "dev")
-    param_name = f"/{environment}/movie-recommender/models-config"
-    logger.info(f"Looking for SSM parameter: {param_name}")
-    
+    param_name = _ssm_parameter_name()
+    logger.debug(f"Looking for SSM parameter: {param_name}")
+
     try:
         ssm = boto3.client("ssm")
-        logger.info("SSM client created successfully")
         response = ssm.get_parameter(Name=param_name, WithDecryption=True)
-        logger.info("SSM parameter retrieved successfully")
-        logger.info(f"SSM Response: {response}")
+        version = f"ssm:{response['Parameter'].get('Version', '')}"
+        if version == known_version:
+            return None, version
         config = json.loads(response["Parameter"]["Value"])
-        logger.info(f"Parsed config from SSM: {config}")
-        return config
+        logger.debug(f"Parsed config from SSM: {config}")
+        return config, version
     except Exception as e:
         logger.error(f"Error loading config from SSM: {str(e)}", exc_info=True)
         return None
 
-def load_model_config_from_file():
+def _file_version() -> str:
+    stat = os.stat(CONFIG_PATH)
+    return f"file:{stat.st_mtime_ns}:{stat.st_size}"
+
+def load_model_config_from_file(known_version: str = None):
     """
     Loads configuration from local models_config.json file.
+
+    Args:
+        known_version: Version of the current snapshot; if the file mtime and
+            size are unchanged the file is not read again.
+
+    Returns:
+        tuple: (config dict or None if unchanged, version string)
     """
-    logger.info("Loading config from local file...")
-    config_path = os.path.join(os.path.dirname(__file__), "models_config.json")
-    with open(config_path, "r") as f:
+    version = _file_version()
+    if version == known_version:
+        return None, version
+    with open(CONFIG_PATH, "r") as f:
         config = json.load(f)
-        logger.info(f"Parsed config from file: {config}")
-        return config
+        logger.debug(f"Parsed config from file: {config}")
+        return config, version
 
-def load_model_config():
+def _content_digest(config: dict) -> str:
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+def add_config_listener(callback):
+    """
+    Registers callback(old_models, new_models), called after a new snapshot
+    is published (e.g. to drop cached data of models whose config changed).
+    """
+    _LISTENERS.append(callback)
+
+def get_model_config() -> Mapping:
+    """
+    Returns the models of the current configuration snapshot (read-only, lock-free).
     """
-    Loads model configuration from either SSM or local file.
+    return _SNAPSHOT.models
+
+def get_config_snapshot() -> ConfigSnapshot:
+    """Returns the current configuration snapshot with its version."""
+    return _SNAPSHOT
+
+def refresh_model_config(force: bool = False) -> ConfigSnapshot:
+    """
+    Checks the configuration source and publishes a new snapshot if it changed.
     Tries SSM first if USE_SSM is True, falls back to local if SSM fails.
+    The file fallback is compared with the last file version read, and a
+    configuration with the same content as the current snapshot is not
+    published again, so an SSM outage does not republish on every poll.
+
+    Args:
+        force: Re-read and publish the configuration even if its version is unchanged
+
+    Returns:
+        ConfigSnapshot: The current snapshot after the refresh
+    """
+    global _SNAPSHOT, _FILE_VERSION, _CONTENT_DIGEST
+    with _REFRESH_LOCK:
+        use_ssm = os.getenv("USE_SSM", "false").lower() == "true"
+
+        result = None
+        if use_ssm:
+            result = load_model_config_from_ssm(None if force else _SNAPSHOT.version)
+            if result is None:
+                logger.warning("Could not load from SSM, falling back to local file")
+        if result is None:
+            result = load_model_config_from_file(None if force else _FILE_VERSION)
+            _FILE_VERSION = result[1]
+
+        config, version = result
+        if config is None:
+            return _SNAPSHOT
+        digest = _content_digest(config)
+        if digest == _CONTENT_DIGEST and not force:
+            logger.debug(f"Model config {version} has the content of {_SNAPSHOT.version}, not republished")
+            return _SNAPSHOT
+        _CONTENT_DIGEST = digest
+
+        old_snapshot = _SNAPSHOT
+        _SNAPSHOT = ConfigSnapshot(
+            version=version,
+            source="ssm" if version.startswith("ssm:") else "file",
+            models=_freeze(config),
+            loaded_at=time.time(),
+        )
+        logger.info(f"Model config {version} loaded from {_SNAPSHOT.source}: {list(config)}")
+
+    for callback in _LISTENERS:
+        try:
+            callback(old_snapshot.models, _SNAPSHOT.models)
+        except Exception as e:
+            logger.error(f"Error in config listener: {e}")
+    return _SNAPSHOT
+
+def load_model_config():
     """
-    use_ssm = os.getenv("USE_SSM", "false").lower() == "true"
-
-    if use_ssm:
-        logger.info("USE_SSM=True: Attempting to load config from SSM...")
-        config_from_ssm = load_model_config_from_ssm()
-        if config_from_ssm is None:
-            logger.warning("Could not load from SSM, falling back to local file")
-            config = load_model_config_from_file()
-        else:
-            config = config_from_ssm
-    else:
-        logger.info("USE_SSM=False: Loading config from local file")
-        config = load_model_config_from_file()
-
-    # Update global MODEL_CONFIG in place to maintain reference
-    global MODEL_CONFIG
-    MODEL_CONFIG.clear()
-    MODEL_CONFIG.update(config)
-    logger.info(f"MODEL_CONFIG updated to: {MODEL_CONFIG}")
+    Reloads the model configuration from SSM or the local file and returns
+    MODEL_CONFIG (kept for the "Reload Config" button and existing callers).
+    """
+    refresh_model_config(force=True)
     return MODEL_CONFIG
 
+def _watch_config(interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            refresh_model_config()
+        except Exception as e:
+            logger.error(f"Error refreshing model config: {e}")
+
+_WATCHER = None
+
+def start_config_watcher(interval: float = None):
+    """
+    Starts (once per process) a daemon thread that polls the file mtime or the
+    SSM parameter version and publishes a new snapshot when it changes.
+    """
+    global _WATCHER
+    interval = CONFIG_POLL_SECONDS if interval is None else interval
+    if interval <= 0 or (_WATCHER is not None and _WATCHER.is_alive()):
+        return
+    _WATCHER = threading.Thread(target=_watch_config, args=(interval,), name="config-watcher", daemon=True)
+    _WATCHER.start()
+    logger.info(f"Config watcher started (every {interval:.0f}s)")
+
 # Load configuration on startup
-MODEL_CONFIG = load_model_config()
+refresh_model_config(force=True)
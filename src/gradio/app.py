@@ -5,8 +5,15 @@ It sends queries to the backend and displays the recommendations.
 import os
 import json
 import gradio as gr
-from src.api.recommendation_service import get_movie_recommendations, clear_cache, get_movie_df
-from src.config.model_config import load_model_config, MODEL_CONFIG
+from src.api.recommendation_service import (
+    get_movie_recommendations,
+    get_movie_recommendations_by_movie,
+    get_similar_movies,
+    search_movie_titles,
+    clear_cache,
+    start_catalog_watcher,
+)
+from src.config.model_config import load_model_config, start_config_watcher, MODEL_CONFIG
 from src.utils.logger import logger
 import concurrent.futures
 import html
@@ -14,6 +21,10 @@ import html
 # Executor to handle heavy operations in a single worker
 executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
 
+# Pick up models_config.json / SSM changes in the background
+start_config_watcher()
+start_catalog_watcher()
+
 def cleanup():
     """Cleanup resources on application close"""
     executor.shutdown(wait=True)
@@ -25,10 +36,10 @@ def predict_async(*args):
     Returns a tuple (html, debug dictionary).
     """
     try:
-        logger.info("Starting predict_async")
+        logger.debug("Starting predict_async")
         future = executor.submit(recommend_movies, *args)
         result = future.result()
-        logger.info(f"Result in predict_async: {result[1]}")
+        logger.debug(f"Result in predict_async: {result[1]}")
         return result  # Return result directly (html, debug)
     except Exception as e:
         logger.error(f"Error in predict_async: {e}")
@@ -62,55 +73,69 @@ def recommend_movies(query_sentence: str, model_name: str, date_from: str, date_
             exclude_movies=exclude_movies
         )
         
-        if not recommendations:
-            return "No recommendations found matching your criteria.", {"error": "No results"}
-            
-        # Build HTML with escaped special characters
-        user_friendly = "<div style='display: flex; flex-wrap: wrap;'>"
-        for rec in recommendations:
-            title = rec.get("title", "Unknown")
-            desc = rec.get("overview", "No Description")
-            score = rec.get("score", 0.0)
-            match_percentage = int(score * 100)
-            # Escape special characters to avoid DOM errors
-            title_escaped = html.escape(title)
-            desc_escaped = html.escape(desc)
-            card = f"""
-            <div style="flex: 1; min-width: 250px; margin: 10px; border: 1px solid #ddd; padding: 10px;">
-              <h3>{title_escaped} - {match_percentage}% Match</h3>
-              <p>{desc_escaped}</p>
-            </div>
-            """
-            user_friendly += card
-        user_friendly += "</div>"
-        
-        logger.info(f"Recommendation completed successfully for model {model_name}")
-        return user_friendly, {"success": True, "model": model_name, "results": recommendations}
+        return format_recommendations(recommendations, model_name)
         
     except Exception as e:
         logger.error(f"Error in recommend_movies: {str(e)}", exc_info=True)
         return f"An error occurred: {str(e)}", {"error": str(e)}
 
-def recommend_by_movie(selected_movie: str, model_name: str, date_from: str, date_to: str, 
+def format_recommendations(recommendations: list, model_name: str):
+    """
+    Builds the HTML cards and debug dictionary shown for a list of recommendations.
+    """
+    if not recommendations:
+        return "No recommendations found matching your criteria.", {"error": "No results"}
+        
+    # Build HTML with escaped special characters
+    user_friendly = "<div style='display: flex; flex-wrap: wrap;'>"
+    for rec in recommendations:
+        title = rec.get("title", "Unknown")
+        desc = rec.get("overview", "No Description")
+        score = rec.get("score", 0.0)
+        match_percentage = int(score * 100)
+        # Escape special characters to avoid DOM errors
+        title_escaped = html.escape(str(title))
+        desc_escaped = html.escape(str(desc))
+        card = f"""
+        <div style="flex: 1; min-width: 250px; margin: 10px; border: 1px solid #ddd; padding: 10px;">
+          <h3>{title_escaped} - {match_percentage}% Match</h3>
+          <p>{desc_escaped}</p>
+        </div>
+        """
+        user_friendly += card
+    user_friendly += "</div>"
+    
+    logger.info(f"Recommendation completed successfully for model {model_name}")
+    return user_friendly, {"success": True, "model": model_name, "results": recommendations}
+
+def recommend_by_movie(selected_movie, model_name: str, date_from: str, date_to: str, 
                        min_popularity: float, min_rating: float):
     """
-    Function for movie-based recommendation using the selected movie's overview.
+    Function for movie-based recommendation using the selected movie's
+    precomputed neighbours or embedding (no re-encoding of its overview).
+    The dropdown passes the movie id, so duplicate titles resolve to the
+    selected movie; catalogs without ids pass the title.
     """
     try:
-        df = get_movie_df()
-        # Get the selected movie's overview
-        selected_movie_data = df[df['title'] == selected_movie].iloc[0]
-        movie_overview = selected_movie_data['overview']
-        
-        return recommend_movies(
-            query_sentence=movie_overview,
+        if selected_movie is None:
+            return "Select a movie first.", {"error": "No movie selected"}
+        # The selected movie itself is excluded by the service
+        if isinstance(selected_movie, str):
+            find_similar, movie = get_movie_recommendations_by_movie, {"movie_title": selected_movie}
+        else:
+            find_similar, movie = get_similar_movies, {"movie_id": selected_movie}
+        recommendations = find_similar(
+            **movie,
             model_name=model_name,
             date_from=date_from,
             date_to=date_to,
             min_popularity=min_popularity,
+            max_popularity=11702,
             min_rating=min_rating,
-            exclude_movies=[selected_movie]  # Exclude the selected movie
+            max_rating=10,
+            top_k=5
         )
+        return format_recommendations(recommendations, model_name)
     except Exception as e:
         return f"Error: {str(e)}", {"error": str(e)}
 
@@ -119,21 +144,28 @@ def recommend_by_movie_async(*args):
     Wrapper to run recommend_by_movie asynchronously.
     """
     try:
-        logger.info("Starting recommend_by_movie_async")
+        logger.debug("Starting recommend_by_movie_async")
         future = executor.submit(recommend_by_movie, *args)
         result = future.result()
-        logger.info(f"Result in recommend_by_movie_async: {result[1]}")
+        logger.debug(f"Result in recommend_by_movie_async: {result[1]}")
         return result
     except Exception as e:
         logger.error(f"Error in recommend_by_movie_async: {e}")
         return f"Error: {str(e)}", {"error": str(e)}
 
-def load_movie_titles():
+# Number of titles offered in the movie dropdown
+TITLE_SUGGESTIONS = int(os.getenv("TITLE_SUGGESTIONS", "20"))
+
+def suggest_movies(query: str):
     """
-    Load the list of available movie titles.
+    Updates the movie dropdown with the titles matching the typed text
+    (type-ahead), instead of shipping every title to the browser.
     """
-    df = get_movie_df()
-    return sorted(df['title'].unique().tolist())
+    try:
+        return gr.Dropdown.update(choices=search_movie_titles(query or "", TITLE_SUGGESTIONS))
+    except Exception as e:
+        logger.error(f"Error in suggest_movies: {e}")
+        return gr.Dropdown.update()
 
 def reload_config():
     """
@@ -142,9 +174,9 @@ def reload_config():
     logger.debug("Entering reload_config function")
     try:
         logger.info("Reloading config...")
-        logger.info(f"CONFIG before reload: {MODEL_CONFIG}")
+        logger.debug(f"Models before reload: {list(MODEL_CONFIG)}")
         updated_config = load_model_config()
-        logger.info(f"CONFIG after reload: {updated_config}")
+        logger.info(f"Models after reload: {list(updated_config)}")
         clear_cache()
         new_choices = list(updated_config.keys())
         logger.debug("==== DEBUG INFO ====")
@@ -201,8 +233,12 @@ with gr.Blocks() as demo:
         
         # Tab: Search by Movie
         with gr.TabItem("Search by Movie"):
-            movie_dropdown = gr.Dropdown(choices=load_movie_titles(), label="Select a movie to find similar ones",
-                                         info="Select a movie from our database")
+            movie_search = gr.Textbox(label="Search for a movie", placeholder="Start typing a title")
+            movie_dropdown = gr.Dropdown(choices=search_movie_titles("", TITLE_SUGGESTIONS),
+                                         label="Select a movie to find similar ones",
+                                         info="Titles matching the search, most popular first")
+            movie_search.input(fn=suggest_movies, inputs=movie_search, outputs=movie_dropdown,
+                               show_progress="hidden")
             model_dropdown_movie = gr.Dropdown(choices=list(MODEL_CONFIG.keys()), label="Model",value=list(MODEL_CONFIG.keys())[0])
             with gr.Accordion("Filters", open=False):
                 with gr.Row():
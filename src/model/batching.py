@@ -0,0 +1,100 @@
+"""
+Dynamic micro-batching of query encoding.
+Concurrent requests for the same model are collected for a short window and
+encoded with a single batched forward pass in a worker thread, instead of
+one sentence at a time on the event loop.
+"""
+
+import asyncio
+import os
+
+import numpy as np
+
+from src.utils.logger import logger
+
+# Default batching window (overridable through environment variables)
+MAX_BATCH_SIZE = int(os.getenv("ENCODE_BATCH_MAX_SIZE", "32"))
+MAX_WAIT_MS = float(os.getenv("ENCODE_BATCH_WAIT_MS", "5"))
+
+
+class MicroBatcher:
+    def __init__(self, encode_fn, max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS,
+                 executor=None):
+        """
+        Args:
+            encode_fn: Blocking function mapping a list of sentences to an array of embeddings
+            max_batch_size: Maximum number of sentences per forward pass
+            max_wait_ms: Maximum time the first queued sentence waits for others to join
+            executor: concurrent.futures executor running encode_fn (None uses the loop's default)
+        """
+        self.encode_fn = encode_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.executor = executor
+        self._queue = None
+        self._worker = None
+        self._loop = None
+        self.batches = 0
+        self.items = 0
+
+    async def encode(self, sentence: str) -> np.ndarray:
+        """Queues one sentence and waits for its embedding."""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((sentence, future))
+        return await future
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def _collect(self):
+        """Waits for a first item, then gathers more until the batch is full or the window closes."""
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Take whatever else is already queued, up to the batch size
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Requests cancelled while waiting do not need to be encoded
+            batch = [(sentence, future) for sentence, future in batch if not future.done()]
+            if not batch:
+                continue
+            sentences = [sentence for sentence, _ in batch]
+            try:
+                embeddings = await self._loop.run_in_executor(self.executor, self.encode_fn, sentences)
+                embeddings = np.asarray(embeddings, dtype=np.float32)
+            except Exception as e:
+                logger.error(f"Error encoding batch of {len(batch)} queries: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
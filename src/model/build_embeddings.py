@@ -0,0 +1,255 @@
+"""
+Offline catalog embedding pipeline.
+Streams the movies CSV in chunks, encodes the overviews of each chunk with
+load_embedding_model (sentences sorted by length so batches pad little), and
+writes L2-normalized rows into a memory-mappable .npy next to a manifest:
+
+    python -m src.model.build_embeddings --model paraphrase-MiniLM-L6-v2 --workers 4
+
+Progress is checkpointed after every chunk; re-running the same command
+resumes from the last completed chunk as long as the model and the catalog
+are unchanged.
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.config.model_config import MODEL_CONFIG
+from src.utils.logger import logger
+from src.utils.artifact_cache import parse_s3_path, s3_client
+from src.utils.s3_utils import ARTIFACT_CACHE_DIR, download_to_cache
+
+TEXT_COLUMN = "overview"
+
+# Model loaded once per worker process
+_WORKER_MODEL = None
+
+
+def file_hash(path: str) -> str:
+    """sha256 of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(8 * 1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def model_hash(model_name: str) -> str:
+    """
+    sha256 identifying the model: its configuration entry, plus the file
+    contents for local model files (ONNX exports).
+    """
+    config = dict(MODEL_CONFIG.get(model_name, {}))
+    digest = hashlib.sha256(json.dumps({"model_name": model_name, **config}, sort_keys=True, default=str).encode())
+    model_path = config.get("model_path", "")
+    if model_path and os.path.isfile(model_path):
+        digest.update(file_hash(model_path).encode())
+    return digest.hexdigest()
+
+
+def _write_json(path: str, data: dict):
+    """Writes JSON atomically so an interrupted run never leaves a truncated file."""
+    tmp_path = f"{path}.{os.getpid()}.part"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def encode_sorted(model, texts: list, batch_size: int) -> np.ndarray:
+    """
+    Encodes texts in batches of similar length and returns the embeddings
+    in the original order, L2-normalized as float32.
+    """
+    texts = [text if isinstance(text, str) else "" for text in texts]
+    order = np.argsort([len(text) for text in texts], kind="stable")
+    embeddings = None
+    for start in range(0, len(order), batch_size):
+        rows = order[start:start + batch_size]
+        batch = np.asarray(model.encode([texts[i] for i in rows], show_progress_bar=False), dtype=np.float32)
+        if embeddings is None:
+            embeddings = np.empty((len(texts), batch.shape[1]), dtype=np.float32)
+        embeddings[rows] = batch
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return embeddings / norms
+
+
+def _init_worker(model_name: str, threads: int):
+    global _WORKER_MODEL
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from src.model.embeddings import load_embedding_model
+    _WORKER_MODEL = load_embedding_model(model_name)
+
+
+def _encode_chunk(chunk_id: int, texts: list, batch_size: int):
+    return chunk_id, encode_sorted(_WORKER_MODEL, texts, batch_size)
+
+
+def _iter_chunks(csv_path: str, chunk_size: int, skip: set):
+    """Yields (chunk id, texts) for every chunk of the CSV not in skip."""
+    reader = pd.read_csv(csv_path, usecols=[TEXT_COLUMN], chunksize=chunk_size)
+    for chunk_id, chunk in enumerate(reader):
+        if chunk_id not in skip:
+            yield chunk_id, chunk[TEXT_COLUMN].tolist()
+
+
+def _count_rows(csv_path: str) -> int:
+    return sum(len(chunk) for chunk in pd.read_csv(csv_path, usecols=[TEXT_COLUMN], chunksize=65536))
+
+
+def build_embeddings(model_name: str, csv_path: str, output_path: str, chunk_size: int = 2048,
+                     batch_size: int = 64, workers: int = 1, resume: bool = True) -> dict:
+    """
+    Builds the normalized embeddings .npy of the catalog for a model.
+
+    Args:
+        model_name: Model in the models configuration
+        csv_path: Local movies CSV
+        output_path: Local .npy to write ('<base>.manifest.json' is written next to it)
+        chunk_size: Catalog rows per chunk (unit of work and of checkpointing)
+        batch_size: Sentences per forward pass
+        workers: Encoding processes (1 encodes in this process)
+        resume: Continue from a matching checkpoint instead of starting over
+
+    Returns:
+        dict: The manifest
+    """
+    base = output_path[:-len(".npy")] if output_path.endswith(".npy") else output_path
+    partial_path = f"{base}.partial.npy"
+    checkpoint_path = f"{base}.checkpoint.json"
+    manifest_path = f"{base}.manifest.json"
+
+    catalog_hash = file_hash(csv_path)
+    identity = {
+        "model_name": model_name,
+        "model_hash": model_hash(model_name),
+        "catalog_hash": catalog_hash,
+        "rows": _count_rows(csv_path),
+        "chunk_size": chunk_size,
+    }
+
+    checkpoint = None
+    if resume and os.path.exists(checkpoint_path) and os.path.exists(partial_path):
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if any(checkpoint.get(key) != value for key, value in identity.items()):
+            logger.warning("Checkpoint does not match the current model/catalog, starting over")
+            checkpoint = None
+    if checkpoint is None:
+        checkpoint = {**identity, "dim": None, "done_chunks": []}
+    done = set(checkpoint["done_chunks"])
+    num_chunks = -(-identity["rows"] // chunk_size)
+    logger.info(f"Embedding {identity['rows']} rows for {model_name} in {num_chunks} chunks "
+                f"({len(done)} already done, {workers} workers)")
+
+    out = None
+    if checkpoint["dim"] is not None:
+        out = np.load(partial_path, mmap_mode="r+")
+
+    def store(chunk_id: int, embeddings: np.ndarray):
+        nonlocal out
+        if out is None:
+            checkpoint["dim"] = int(embeddings.shape[1])
+            out = np.lib.format.open_memmap(partial_path, mode="w+", dtype=np.float32,
+                                            shape=(identity["rows"], checkpoint["dim"]))
+        start = chunk_id * chunk_size
+        out[start:start + len(embeddings)] = embeddings
+        out.flush()
+        checkpoint["done_chunks"].append(chunk_id)
+        _write_json(checkpoint_path, checkpoint)
+        logger.info(f"Chunk {chunk_id + 1}/{num_chunks} done ({len(checkpoint['done_chunks'])} total)")
+
+    start_time = time.perf_counter()
+    chunks = _iter_chunks(csv_path, chunk_size, done)
+    if workers <= 1:
+        from src.model.embeddings import load_embedding_model
+        model = load_embedding_model(model_name)
+        for chunk_id, texts in chunks:
+            store(chunk_id, encode_sorted(model, texts, batch_size))
+    else:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(model_name, threads)
+        ) as pool:
+            # Keep a bounded number of chunks in flight so memory stays flat
+            pending = set()
+            for chunk_id, texts in chunks:
+                pending.add(pool.submit(_encode_chunk, chunk_id, texts, batch_size))
+                if len(pending) >= 2 * workers:
+                    finished, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in finished:
+                        store(*future.result())
+            for future in concurrent.futures.as_completed(pending):
+                store(*future.result())
+
+    if out is None:
+        raise ValueError(f"No rows to embed in {csv_path}")
+    del out
+    os.replace(partial_path, output_path)
+    manifest = {
+        "model_name": model_name,
+        "model_hash": identity["model_hash"],
+        "catalog_hash": catalog_hash,
+        "rows": identity["rows"],
+        "dim": checkpoint["dim"],
+        "dtype": "float32",
+        "normalized": True,
+        "text_column": TEXT_COLUMN,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    _write_json(manifest_path, manifest)
+    os.remove(checkpoint_path)
+    logger.info(f"Embeddings written to {output_path} in {time.perf_counter() - start_time:.1f}s")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the catalog embeddings of a model.")
+    parser.add_argument("--model", required=True, help="Model name in the models configuration")
+    parser.add_argument("--csv", default=os.getenv("MOVIES_CSV_PATH", "data/processed/movies_processed.csv"),
+                        help="Movies CSV (local path or s3://)")
+    parser.add_argument("--output", default=None, help="Output .npy (defaults to the model's embeddings_path)")
+    parser.add_argument("--chunk-size", type=int, default=2048)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=1, help="Encoding processes (CPU)")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    output = args.output or MODEL_CONFIG.get(args.model, {}).get("embeddings_path")
+    if not output:
+        raise ValueError(f"No --output given and no embeddings_path configured for {args.model}")
+    csv_path = download_to_cache(args.csv) if args.csv.startswith("s3://") else args.csv
+
+    # S3 outputs are built locally first and uploaded once complete
+    # (keyed by the whole URI, so outputs sharing a basename never share a build or checkpoint)
+    local_output = output
+    if output.startswith("s3://"):
+        bucket, key = parse_s3_path(output)
+        build_dir = hashlib.sha256(f"{bucket}/{key}".encode()).hexdigest()[:32]
+        local_output = os.path.join(ARTIFACT_CACHE_DIR, "build", build_dir, os.path.basename(key))
+        os.makedirs(os.path.dirname(local_output), exist_ok=True)
+
+    build_embeddings(args.model, csv_path, local_output, chunk_size=args.chunk_size,
+                     batch_size=args.batch_size, workers=args.workers, resume=not args.no_resume)
+
+    if output.startswith("s3://"):
+        s3 = s3_client()
+        manifest_key = (key[:-len(".npy")] if key.endswith(".npy") else key) + ".manifest.json"
+        local_base = local_output[:-len(".npy")] if local_output.endswith(".npy") else local_output
+        s3.upload_file(local_output, bucket, key)
+        s3.upload_file(f"{local_base}.manifest.json", bucket, manifest_key)
+        logger.info(f"Uploaded embeddings and manifest to s3://{bucket}/{key}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 """Module for loading an embedding model and generating sentence embeddings."""
 
-from src.config.model_config import MODEL_CONFIG
+from src.config.model_config import MODEL_CONFIG, add_config_listener
 from src.model.model_wrappers import (
     BaseEmbeddingModel,
     SentenceTransformerWrapper,
@@ -9,53 +9,31 @@ from src.model.model_wrappers import (
     SageMakerEmbeddingWrapper,
 )
 from src.utils.s3_utils import download_model_from_s3
-import psutil
+from src.model.query_cache import QUERY_CACHE
+from src.model.batching import MicroBatcher
+from src.utils.cache_manager import CACHE, measure_nbytes, process_rss_bytes
+from src.utils.metrics import span
+import asyncio
+import time
+import numpy as np
 
-# Global dictionary to store loaded models in memory
-LOADED_MODELS = {}
+# One micro-batcher per model, used by encode_queries_async
+BATCHERS = {}
 
-def _get_available_ram_gb() -> float:
+def _on_config_change(old_models, new_models):
     """
-    Get system's available RAM in gigabytes.
+    Unloads models whose configuration changed or was removed in a new config snapshot.
     """
-    mem = psutil.virtual_memory()
-    return mem.available / (1024**3)
+    for model_name in set(old_models) | set(new_models):
+        if old_models.get(model_name) != new_models.get(model_name):
+            CACHE.pop("model", model_name)
 
-def _free_memory(required_ram_gb: float):
-    """
-    Frees models from LOADED_MODELS (from highest to lowest RAM usage)
-    until there is enough memory for 'required_ram_gb'.
-    If after removing all models there is not enough memory available,
-    raises MemoryError.
-    """
-    # Sort loaded models in descending order by RAM usage
-    # (taken from 'RAM' in MODEL_CONFIG)
-    loaded_model_names = sorted(
-        LOADED_MODELS.keys(),
-        key=lambda name: float(MODEL_CONFIG.get(name, {}).get("RAM", 0.0)),
-        reverse=True
-    )
-    
-    while True:
-        available_ram_gb = _get_available_ram_gb()
-        if available_ram_gb >= required_ram_gb:
-            # There is enough memory
-            return
-
-        if not loaded_model_names:
-            # No more models to free and still not enough memory
-            raise MemoryError(
-                f"Not enough memory to load the new model. "
-                f"Required ~{required_ram_gb:.2f}GB, "
-                f"and could not free more memory."
-            )
-        # Remove the model with highest RAM usage
-        model_to_remove = loaded_model_names.pop(0)
-        del LOADED_MODELS[model_to_remove]
+add_config_listener(_on_config_change)
 
 def load_embedding_model(model_name: str = "sentence-transformers/all-MiniLM-L6-v2") -> BaseEmbeddingModel:
     """
     Loads an embedding model based on the configuration for the specified model_name.
+    Concurrent first calls for the same model share a single load.
     
     Args:
         model_name: Name of the model to load, must exist in MODEL_CONFIG
@@ -65,47 +43,52 @@ def load_embedding_model(model_name: str = "sentence-transformers/all-MiniLM-L6-
     
     Raises:
         ValueError: If model_type is not supported
-        MemoryError: If there isn't enough RAM to load the model
+        MemoryError: If there isn't enough RAM to load the model, even after evicting cached entries
     """
-    # First check if the model is already loaded in memory (cache)
-    if model_name in LOADED_MODELS:
-        return LOADED_MODELS[model_name]
+    return CACHE.get_or_load("model", model_name, lambda: _load_model(model_name))
+
+def _load_model(model_name: str) -> BaseEmbeddingModel:
+    """Loads a model, timed as stage 'model_load' (download, init and measure are stages too)."""
+    with span("model_load", model_name):
+        return _build_model(model_name)
 
+def _build_model(model_name: str) -> BaseEmbeddingModel:
+    """Builds the model wrapper and caches it with its measured footprint."""
     config = MODEL_CONFIG.get(model_name, {})
     model_type = config.get("type", "sentence_transformer").lower()
     model_path = config.get("model_path", model_name)
     
-    # Check free RAM if "RAM" field exists in JSON and, if not enough,
-    # try to free models from cache
-    required_ram_gb = float(config.get("RAM", 0.0))  # Estimated GB required by the model
-    if required_ram_gb > 0.0:
-        available_ram_gb = _get_available_ram_gb()
-        if available_ram_gb < required_ram_gb:
-            # Try to free memory by removing models from cache
-            _free_memory(required_ram_gb)
-            # After freeing, check memory again
-            if _get_available_ram_gb() < required_ram_gb:
-                raise MemoryError(
-                    f"Not enough memory to load model '{model_name}'. "
-                    f"Required ~{required_ram_gb:.2f}GB, but could not free enough memory."
-                )
+    # The "RAM" field (estimated GB) is only used to make room before loading;
+    # the cache then accounts for the measured footprint
+    required_ram_bytes = int(float(config.get("RAM", 0.0)) * 1024**3)
+    if required_ram_bytes > 0:
+        with span("model_evict", model_name):
+            CACHE.ensure_available(required_ram_bytes)
+
+    start = time.perf_counter()
+    rss_before = process_rss_bytes()
 
     if model_type == "s3":
-        model_path = download_model_from_s3(model_path)
-        model_wrapper = OnnxEmbeddingWrapper(model_path, model_name)
-    elif model_type == "sagemaker":
-        model_wrapper = SageMakerEmbeddingWrapper(model_path, model_name)
-    elif model_type == "local":
-        model_wrapper = OnnxEmbeddingWrapper(model_path, model_name)
-    elif model_type == "sentence_transformer":
-        model_wrapper = SentenceTransformerWrapper(model_path)
-    elif model_type == "bert":
-        model_wrapper = BertEmbeddingWrapper(model_path)
-    else:
-        raise ValueError(f"Unsupported model type: {model_type}")
+        with span("model_download", model_name):
+            model_path = download_model_from_s3(model_path)
+    with span("model_init", model_name):
+        if model_type in ("s3", "local"):
+            model_wrapper = OnnxEmbeddingWrapper(model_path, model_name)
+        elif model_type == "sagemaker":
+            model_wrapper = SageMakerEmbeddingWrapper(model_path, model_name)
+        elif model_type == "sentence_transformer":
+            model_wrapper = SentenceTransformerWrapper(model_path)
+        elif model_type == "bert":
+            model_wrapper = BertEmbeddingWrapper(model_path)
+        else:
+            raise ValueError(f"Unsupported model type: {model_type}")
     
-    # Save model for later use
-    LOADED_MODELS[model_name] = model_wrapper
+    # Save model for later use. Torch models are measured by their tensors,
+    # others (ONNX sessions) by the growth of the process RSS while loading.
+    with span("model_measure", model_name):
+        nbytes = measure_nbytes(model_wrapper) or max(process_rss_bytes() - rss_before, 0) or required_ram_bytes
+    CACHE.put("model", model_name, model_wrapper, nbytes=nbytes, pinned=bool(config.get("preload", False)),
+              load_seconds=time.perf_counter() - start)
     
     return model_wrapper
 
@@ -122,3 +105,67 @@ def generate_embeddings(model: BaseEmbeddingModel, sentences: list, show_progres
         A numpy array of embeddings.
     """
     return model.encode(sentences, show_progress_bar=show_progress_bar)
+
+def encode_queries(model_name: str, sentences: list) -> np.ndarray:
+    """
+    Encodes query sentences with the given model, reusing cached embeddings.
+    Only the sentences missing from QUERY_CACHE are encoded, in a single batch.
+    
+    Args:
+        model_name: Name of the model in MODEL_CONFIG
+        sentences: A list of query strings
+    
+    Returns:
+        A float32 numpy array of shape (len(sentences), dim).
+    """
+    cached = [QUERY_CACHE.get(model_name, sentence) for sentence in sentences]
+    missing = [i for i, embedding in enumerate(cached) if embedding is None]
+    if missing:
+        model = load_embedding_model(model_name)
+        new_embeddings = np.asarray(
+            generate_embeddings(model, [sentences[i] for i in missing], show_progress_bar=False),
+            dtype=np.float32
+        )
+        for i, embedding in zip(missing, new_embeddings):
+            QUERY_CACHE.put(model_name, sentences[i], embedding)
+            cached[i] = embedding
+    return np.vstack(cached)
+
+def _encode_batch(model_name: str, sentences: list) -> np.ndarray:
+    """Blocking batched encode used by the micro-batchers."""
+    model = load_embedding_model(model_name)
+    return generate_embeddings(model, sentences, show_progress_bar=False)
+
+def get_batcher(model_name: str, executor=None) -> MicroBatcher:
+    """
+    Returns the micro-batcher of a model, creating it on first use.
+    
+    Args:
+        model_name: Name of the model in MODEL_CONFIG
+        executor: Optional concurrent.futures executor running the batched encodes
+    """
+    if model_name not in BATCHERS:
+        BATCHERS[model_name] = MicroBatcher(lambda sentences: _encode_batch(model_name, sentences))
+    batcher = BATCHERS[model_name]
+    if executor is not None:
+        batcher.executor = executor
+    return batcher
+
+async def encode_queries_async(model_name: str, sentences: list, executor=None) -> np.ndarray:
+    """
+    Async counterpart of encode_queries: cache misses are sent to the model's
+    micro-batcher, so concurrent requests share one batched forward pass that
+    runs in a worker thread instead of blocking the event loop.
+    
+    Returns:
+        A float32 numpy array of shape (len(sentences), dim).
+    """
+    cached = [QUERY_CACHE.get(model_name, sentence) for sentence in sentences]
+    missing = [i for i, embedding in enumerate(cached) if embedding is None]
+    if missing:
+        batcher = get_batcher(model_name, executor)
+        new_embeddings = await asyncio.gather(*(batcher.encode(sentences[i]) for i in missing))
+        for i, embedding in zip(missing, new_embeddings):
+            QUERY_CACHE.put(model_name, sentences[i], embedding)
+            cached[i] = embedding
+    return np.vstack(cached)
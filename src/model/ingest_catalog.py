@@ -0,0 +1,240 @@
+"""
+Incremental catalog ingestion.
+Merges a CSV of new and updated movies into the catalog and publishes the
+result as a new catalog generation (see src.api.catalog_store):
+
+    python -m src.model.ingest_catalog --updates data/raw/tmdb_delta.csv
+
+Rows are matched by id. Only rows that are new or whose overview changed
+(compared by hash) are embedded; every other embedding is copied from the
+current generation, IVF lists / quantization codes are updated with the
+already trained centroids and codebooks, and neighbour tables recompute only
+the lists the changed rows affect. Running services pick the new
+generation up on their next manifest poll (CATALOG_POLL_SECONDS).
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.api.catalog_format import columnar_path_for, write_columnar
+from src.api.catalog_store import (CatalogGeneration, catalog_base_path, embeddings_path_for,
+                                   generation_path, read_generation, write_generation)
+from src.api.neighbors import NeighborTable
+from src.api.vector_index import IVFIndex, index_path_for, load_normalized_memmap
+from src.config.model_config import MODEL_CONFIG
+from src.model.build_embeddings import TEXT_COLUMN, encode_sorted
+from src.utils.logger import logger
+
+ID_COLUMN = "id"
+_COPY_CHUNK = 65536
+
+
+def text_hashes(texts: pd.Series) -> np.ndarray:
+    """md5 of every text (missing texts hash like the empty string)."""
+    return np.array([hashlib.md5((text if isinstance(text, str) else "").encode()).hexdigest() for text in texts])
+
+
+def merge_updates(catalog: pd.DataFrame, updates: pd.DataFrame):
+    """
+    Applies new and updated rows to the catalog without reordering existing rows.
+
+    Returns:
+        tuple: (merged DataFrame, positions of the rows whose text must be embedded)
+
+    Raises:
+        ValueError: If the updates have no id column or repeat an id
+    """
+    if ID_COLUMN not in updates.columns:
+        raise ValueError(f"Updates need an '{ID_COLUMN}' column")
+    if updates[ID_COLUMN].duplicated().any():
+        raise ValueError(f"Updates contain duplicate {ID_COLUMN}s")
+    merged = catalog.copy()
+    positions = pd.Series(np.arange(len(merged)), index=merged[ID_COLUMN])
+    positions = positions[~positions.index.duplicated(keep="last")]
+
+    existing = updates[updates[ID_COLUMN].isin(positions.index)]
+    rows = positions.loc[existing[ID_COLUMN]].to_numpy()
+    columns = [column for column in updates.columns if column in merged.columns]
+    old_hashes = text_hashes(merged[TEXT_COLUMN].iloc[rows])
+    for column in columns:
+        merged.iloc[rows, merged.columns.get_loc(column)] = existing[column].to_numpy()
+    changed = rows[old_hashes != text_hashes(merged[TEXT_COLUMN].iloc[rows])]
+
+    added = updates[~updates[ID_COLUMN].isin(positions.index)]
+    if len(added):
+        merged = pd.concat([merged, added.reindex(columns=merged.columns)], ignore_index=True)
+    appended = np.arange(len(catalog), len(merged))
+    logger.info(f"{len(existing)} updated rows ({len(changed)} with a new {TEXT_COLUMN}), {len(added)} new rows")
+    return merged, np.concatenate([changed, appended]).astype(np.int64)
+
+
+def _write_catalog(df: pd.DataFrame, path: str):
+    """Writes the catalog CSV and the column store the service loads it from."""
+    tmp_path = f"{path}.{os.getpid()}.part"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    write_columnar(df, columnar_path_for(path), source_path=path)
+
+
+def _write_embeddings(model, old_path: str, new_path: str, num_rows: int, rows: np.ndarray,
+                      texts: list, batch_size: int):
+    """Copies the old embeddings in chunks and writes the embeddings of the given rows."""
+    old = np.load(old_path, mmap_mode="r")
+    encoded = encode_sorted(model, texts, batch_size) if len(rows) else None
+    if encoded is not None and encoded.shape[1] != old.shape[1]:
+        raise ValueError(f"{old_path} has dimension {old.shape[1]}, the model encodes {encoded.shape[1]}")
+    tmp_path = f"{new_path}.{os.getpid()}.part.npy"
+    out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(num_rows, old.shape[1]))
+    kept = min(len(old), num_rows)
+    for start in range(0, kept, _COPY_CHUNK):
+        stop = min(start + _COPY_CHUNK, kept)
+        out[start:stop] = old[start:stop]
+    if encoded is not None:
+        out[rows] = encoded
+    out.flush()
+    del out, old
+    os.replace(tmp_path, new_path)
+
+
+def _update_indexes(config: dict, old_path: str, new_path: str, rows: np.ndarray, generation: int):
+    """
+    Writes the IVF lists, PQ codes and neighbour table of the new embeddings
+    by re-assigning only the given rows (and the neighbour lists they affect).
+    Without a persisted artifact for the old embeddings nothing is written and
+    the service falls back as it does for generation 0.
+    """
+    index_config = config.get("index") or {}
+    quantization = config.get("quantization") or {}
+    artifacts = []
+    if index_config.get("type", "flat").lower() == "ivf":
+        artifacts.append(("ivf", index_config))
+    if quantization.get("type", "").lower() == "pq":
+        artifacts.append(("pq", quantization))
+    if config.get("neighbors") is not None:
+        artifacts.append(("neighbors", config["neighbors"]))
+    if not artifacts:
+        return
+    embeddings = load_normalized_memmap(new_path, config.get("embeddings_dtype", "float32"))
+    old_embeddings = load_normalized_memmap(old_path, config.get("embeddings_dtype", "float32"))
+    for index_type, artifact_config in artifacts:
+        # Explicit paths only describe the configured (generation 0) artifacts
+        old_index_path = (artifact_config.get("path") if generation == 1 else None) or index_path_for(old_path, index_type)
+        new_index_path = index_path_for(new_path, index_type)
+        if not os.path.exists(old_index_path):
+            logger.warning(f"No {index_type} index at {old_index_path}, not carried over to {new_path}")
+            continue
+        if index_type == "ivf":
+            index = IVFIndex.load(old_index_path, old_embeddings)
+        elif index_type == "neighbors":
+            index = NeighborTable.load(old_index_path, len(old_embeddings))
+        else:
+            from src.api.quantization import QuantizedIndex
+            index = QuantizedIndex.load(old_index_path, old_embeddings)
+        index = index.update(embeddings, rows)
+        tmp_path = f"{new_index_path}.{os.getpid()}.part.npz"
+        index.save(tmp_path)
+        os.replace(tmp_path, new_index_path)
+        logger.info(f"Updated {index_type} index written to {new_index_path}")
+
+
+def _remove_generation(catalog_path: str, paths: list):
+    shutil.rmtree(columnar_path_for(catalog_path), ignore_errors=True)
+    for path in [catalog_path] + paths:
+        for artifact in (path, index_path_for(path, "ivf"), index_path_for(path, "pq"),
+                         index_path_for(path, "neighbors")):
+            if os.path.exists(artifact):
+                os.remove(artifact)
+                logger.info(f"Removed {artifact}")
+
+
+def _stale_paths(current: CatalogGeneration, stale: int) -> list:
+    """Embeddings of the stale generation: of every configured model and every model of the current one."""
+    paths = {generation_path(config["embeddings_path"], stale)
+             for config in MODEL_CONFIG.values() if config.get("embeddings_path")}
+    suffix = f".g{current.generation}"
+    for path in current.embeddings.values():
+        base, extension = os.path.splitext(path)
+        if base.endswith(suffix):
+            paths.add(f"{base[:-len(suffix)]}.g{stale}{extension}")
+    return sorted(paths)
+
+
+def ingest(updates_path: str, catalog_path: str = None, batch_size: int = 64) -> CatalogGeneration:
+    """
+    Publishes a new catalog generation with the rows of updates_path applied.
+    Every configured model with an embeddings_path is carried into the new
+    generation: a model left on the previous generation's embeddings would no
+    longer match the catalog rows.
+
+    Args:
+        updates_path: CSV with an id column and any catalog columns
+        catalog_path: Configured catalog (defaults to MOVIES_CSV_PATH); local only
+        batch_size: Sentences per forward pass
+
+    Returns:
+        CatalogGeneration: The published generation
+
+    Raises:
+        ValueError: If the catalog or the embeddings of a configured model are
+            not local (nothing is written)
+    """
+    from src.model.embeddings import load_embedding_model
+
+    catalog_path = catalog_path or catalog_base_path()
+    if catalog_path.startswith("s3://"):
+        raise ValueError("Incremental ingestion needs a local catalog")
+    start_time = time.perf_counter()
+    current = read_generation(catalog_path)
+    models = {name: config for name, config in MODEL_CONFIG.items() if config.get("embeddings_path")}
+    old_paths = {name: embeddings_path_for(current, name, config) for name, config in models.items()}
+    remote = sorted(name for name, config in models.items()
+                    if old_paths[name].startswith("s3://") or config["embeddings_path"].startswith("s3://"))
+    if remote:
+        raise ValueError(f"Incremental ingestion needs local embeddings for every model; {remote} "
+                         f"are on S3 and could not be carried into the new generation")
+    catalog = pd.read_csv(current.catalog_path)
+    merged, rows = merge_updates(catalog, pd.read_csv(updates_path))
+    generation = current.generation + 1
+
+    new_catalog_path = generation_path(catalog_path, generation)
+    _write_catalog(merged, new_catalog_path)
+
+    texts = merged[TEXT_COLUMN].iloc[rows].tolist()
+    embeddings = {}
+    for model_name, config in models.items():
+        old_path = old_paths[model_name]
+        new_path = generation_path(config["embeddings_path"], generation)
+        logger.info(f"Embedding {len(rows)} rows for {model_name}")
+        _write_embeddings(load_embedding_model(model_name), old_path, new_path, len(merged), rows, texts, batch_size)
+        _update_indexes(config, old_path, new_path, rows, generation)
+        embeddings[model_name] = new_path
+
+    published = CatalogGeneration(generation, new_catalog_path, embeddings, len(merged))
+    write_generation(catalog_path, published)
+    logger.info(f"Published catalog generation {generation} ({len(merged)} rows, {len(rows)} embedded) "
+                f"in {time.perf_counter() - start_time:.1f}s")
+
+    # Services may still serve the previous generation until their next poll;
+    # the one before it is no longer referenced
+    if generation >= 3:
+        stale = generation - 2
+        _remove_generation(generation_path(catalog_path, stale), _stale_paths(current, stale))
+    return published
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply new and updated movies as a new catalog generation.")
+    parser.add_argument("--updates", required=True, help="CSV of new/updated movies (needs an id column)")
+    parser.add_argument("--catalog", default=None, help="Configured catalog CSV (defaults to MOVIES_CSV_PATH)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+    ingest(args.updates, catalog_path=args.catalog, batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
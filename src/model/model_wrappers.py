@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 import numpy as np
+from src.preprocessing.custom_pooling import mean_pooling
 
 # Base class for embedding model wrappers.
 class BaseEmbeddingModel(ABC):
@@ -90,30 +91,150 @@ class BertEmbeddingWrapper(BaseEmbeddingModel):
 
         return embeddings.cpu().numpy()
 
+# ONNX Runtime session settings taken from the "onnx" key of a model's configuration.
+_GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+_EXECUTION_MODES = {"sequential": "ORT_SEQUENTIAL", "parallel": "ORT_PARALLEL"}
+_ONNX_DTYPES = {"tensor(int64)": np.int64, "tensor(int32)": np.int32, "tensor(float)": np.float32}
+
+def _onnx_session_options(onnx_config: dict):
+    """
+    Builds onnxruntime.SessionOptions from e.g.
+    {"intra_op_threads": 4, "inter_op_threads": 1, "graph_optimization": "all", "execution_mode": "sequential"}.
+    Thread counts of 0 let ONNX Runtime decide.
+    """
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = int(onnx_config.get("intra_op_threads", 0))
+    options.inter_op_num_threads = int(onnx_config.get("inter_op_threads", 0))
+    level = onnx_config.get("graph_optimization", "all").lower()
+    if level not in _GRAPH_OPTIMIZATION_LEVELS:
+        raise ValueError(f"Unsupported graph optimization level: {level}")
+    options.graph_optimization_level = getattr(onnxruntime.GraphOptimizationLevel, _GRAPH_OPTIMIZATION_LEVELS[level])
+    mode = onnx_config.get("execution_mode", "sequential").lower()
+    if mode not in _EXECUTION_MODES:
+        raise ValueError(f"Unsupported execution mode: {mode}")
+    options.execution_mode = getattr(onnxruntime.ExecutionMode, _EXECUTION_MODES[mode])
+    return options
+
+def quantize_onnx_dynamic(model_path: str) -> str:
+    """
+    Writes (once) a dynamically int8-quantized copy of an ONNX model and returns its path.
+    The copy sits next to the model ('model.onnx' -> 'model.int8.onnx'), or in
+    ARTIFACT_CACHE_DIR when that directory is not writable.
+    """
+    import os
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    from src.utils.s3_utils import ARTIFACT_CACHE_DIR
+    from src.utils.logger import logger
+    base = model_path[:-len(".onnx")] if model_path.endswith(".onnx") else model_path
+    quantized_path = f"{base}.int8.onnx"
+    if not os.access(os.path.dirname(os.path.abspath(quantized_path)), os.W_OK):
+        os.makedirs(ARTIFACT_CACHE_DIR, exist_ok=True)
+        quantized_path = os.path.join(ARTIFACT_CACHE_DIR, os.path.basename(quantized_path))
+    if not os.path.exists(quantized_path) or os.path.getmtime(quantized_path) < os.path.getmtime(model_path):
+        logger.info(f"Quantizing {model_path} to int8 ({quantized_path})")
+        tmp_path = f"{quantized_path}.{os.getpid()}.part"
+        quantize_dynamic(model_path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, quantized_path)
+    return quantized_path
+
 # Wrapper for ONNX models.
 class OnnxEmbeddingWrapper(BaseEmbeddingModel):
     def __init__(self, model_path: str, model_name: str):
         import onnxruntime
-        self.session = onnxruntime.InferenceSession(model_path)
         # Use pipeline components (text preprocessor, tokenizer, pooling function).
-        self.text_preprocessor, self.tokenizer, self.pooling_fn, _ = _get_pipeline_components(model_name)
+        self.text_preprocessor, self.tokenizer, self.pooling_fn, config = _get_pipeline_components(model_name)
+        onnx_config = config.get("onnx", {})
+        if onnx_config.get("quantize") == "dynamic_int8":
+            model_path = quantize_onnx_dynamic(model_path)
+        self.session = onnxruntime.InferenceSession(
+            model_path,
+            sess_options=_onnx_session_options(onnx_config),
+            providers=onnx_config.get("providers") or onnxruntime.get_available_providers(),
+        )
+        self.batch_size = int(onnx_config.get("batch_size", 32))
+        self.max_length = onnx_config.get("max_length")
+        self.io_binding = bool(onnx_config.get("io_binding", False))
+        # Input/output metadata is fixed for a session, so it is read once
+        inputs = self.session.get_inputs()
+        self.input_names = [model_input.name for model_input in inputs]
+        self.input_dtypes = {model_input.name: _ONNX_DTYPES.get(model_input.type, np.int64) for model_input in inputs}
+        self.output_name = self.session.get_outputs()[0].name
+        self.pad_token_id = getattr(self.tokenizer, "pad_token_id", None) or 0
+
+    def _feed_key(self, position: int, name: str, encoded: dict):
+        """
+        Tokenizer output fed to an ONNX input: the output of the same name, else
+        (input_ids, attention_mask) by position for the first two inputs.
+        Returns None for a token_type_ids input the tokenizer does not produce
+        (fed as zeros, i.e. a single segment).
+
+        Raises:
+            ValueError: If any other input has no matching tokenizer output
+        """
+        if name in encoded:
+            return name
+        if name == "token_type_ids":
+            return None
+        if position < 2:
+            return ("input_ids", "attention_mask")[position]
+        raise ValueError(f"ONNX input '{name}' has no matching tokenizer output "
+                         f"(tokenizer returns {sorted(encoded)})")
+
+    def _feeds(self, encoded: dict, rows: np.ndarray, lengths: np.ndarray) -> dict:
+        """Pads the given rows to their own longest length (not the longest of the whole call)."""
+        width = int(lengths[rows].max())
+        feeds = {}
+        for position, name in enumerate(self.input_names):
+            key = self._feed_key(position, name, encoded)
+            pad_value = self.pad_token_id if key == "input_ids" else 0
+            array = np.full((len(rows), width), pad_value, dtype=self.input_dtypes[name])
+            if key is not None:
+                for i, row in enumerate(rows):
+                    # A missing attention_mask covers every real token
+                    values = encoded[key][row] if key in encoded else np.ones(lengths[row])
+                    array[i, :lengths[row]] = values
+            feeds[name] = array
+        return feeds
+
+    def _run(self, feeds: dict) -> np.ndarray:
+        if not self.io_binding:
+            return self.session.run([self.output_name], feeds)[0]
+        binding = self.session.io_binding()
+        for name, array in feeds.items():
+            binding.bind_cpu_input(name, array)
+        binding.bind_output(self.output_name)
+        self.session.run_with_iobinding(binding)
+        return binding.copy_outputs_to_cpu()[0]
 
     def encode(self, sentences: list, show_progress_bar: bool = True):
         if self.tokenizer is None:
             raise ValueError("Tokenizer is not set for OnnxEmbeddingWrapper.")
-        # Preprocess sentences and tokenize.
+        # Preprocess sentences and tokenize once, without padding.
         processed = [self.text_preprocessor(sentence) for sentence in sentences]
-        inputs = self.tokenizer(processed, return_tensors="np", padding=True, truncation=True)
-        # Prepare inputs for ONNX; assume the first input is "input_ids".
-        input_name = self.session.get_inputs()[0].name
-        ort_inputs = {input_name: inputs["input_ids"]}
-        if len(self.session.get_inputs()) > 1 and "attention_mask" in inputs:
-            ort_inputs[self.session.get_inputs()[1].name] = inputs["attention_mask"]
-        outputs = self.session.run(None, ort_inputs)
-        embeddings = outputs[0]
-        # Optionally apply pooling if available.
-        if self.pooling_fn is not None and "attention_mask" in inputs:
-            embeddings = self.pooling_fn(embeddings, inputs["attention_mask"])
+        encoded = self.tokenizer(processed, padding=False, truncation=True, max_length=self.max_length)
+        lengths = np.array([len(ids) for ids in encoded["input_ids"]], dtype=np.int64)
+        # Length bucketing: batches of similar length are padded only to their own maximum
+        order = np.argsort(lengths, kind="stable")
+        embeddings = None
+        for start in range(0, len(order), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            feeds = self._feeds(encoded, rows, lengths)
+            output = self._run(feeds)
+            if output.ndim == 3:
+                # Token embeddings: pool with the attention mask (mean pooling by default)
+                mask = (np.arange(output.shape[1])[None, :] < lengths[rows][:, None]).astype(np.float32)
+                output = (self.pooling_fn or mean_pooling)(output, mask)
+            if embeddings is None:
+                embeddings = np.empty((len(sentences), output.shape[-1]), dtype=np.float32)
+            embeddings[rows] = output
+        if embeddings is None:
+            return np.empty((0, 0), dtype=np.float32)
         return embeddings
 
 # Wrapper for models served via a SageMaker endpoint.
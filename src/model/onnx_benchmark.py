@@ -0,0 +1,98 @@
+"""
+Benchmark of an ONNX model (OnnxEmbeddingWrapper with its configured session
+options) against the SentenceTransformerWrapper of the same model:
+    python -m src.model.onnx_benchmark --model <onnx_model_name> --reference sentence-transformers/<model>
+
+Movie overviews from MOVIES_CSV_PATH are used as the workload (queries are short,
+so single-sentence latency is measured on the first words of each overview).
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.config.model_config import MODEL_CONFIG
+from src.model.model_wrappers import OnnxEmbeddingWrapper, SentenceTransformerWrapper
+from src.utils.s3_utils import download_model_from_s3, read_from_s3
+
+
+def _load_sentences(num_sentences: int) -> list:
+    csv_path = os.getenv("MOVIES_CSV_PATH", "data/processed/movies_processed.csv")
+    df = read_from_s3(csv_path) if csv_path.startswith("s3://") else pd.read_csv(csv_path)
+    overviews = df["overview"].dropna().astype(str)
+    return overviews.sample(min(num_sentences, len(overviews)), random_state=0).tolist()
+
+
+def benchmark_model(model, sentences: list, queries: list, batch_size: int) -> dict:
+    """
+    Returns throughput of batched encoding and single-query latency percentiles.
+    """
+    model.encode(sentences[:batch_size], show_progress_bar=False)  # warm-up
+    start = time.perf_counter()
+    embeddings = [model.encode(sentences[i:i + batch_size], show_progress_bar=False)
+                  for i in range(0, len(sentences), batch_size)]
+    elapsed = time.perf_counter() - start
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        model.encode([query], show_progress_bar=False)
+        latencies.append((time.perf_counter() - started) * 1000)
+    p50, p95 = np.percentile(latencies, [50, 95])
+    return {
+        "embeddings": np.concatenate([np.asarray(e, dtype=np.float32) for e in embeddings]),
+        "sentences_per_second": len(sentences) / elapsed,
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+    }
+
+
+def _cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b = b / np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    return (a * b).sum(axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare an ONNX model with its sentence-transformers version.")
+    parser.add_argument("--model", required=True, help="ONNX model name in the models configuration")
+    parser.add_argument("--reference", default=None,
+                        help="sentence-transformers model id (defaults to the model's tokenizer_model)")
+    parser.add_argument("--sentences", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    config = MODEL_CONFIG.get(args.model)
+    if not config or config.get("type") not in ("local", "s3"):
+        raise ValueError(f"{args.model} is not an ONNX model in the configuration")
+    reference = args.reference or config.get("tokenizer_model")
+    if not reference:
+        raise ValueError("No reference model given and no tokenizer_model configured")
+
+    model_path = config["model_path"]
+    if model_path.startswith("s3://"):
+        model_path = download_model_from_s3(model_path)
+
+    sentences = _load_sentences(args.sentences)
+    queries = [" ".join(sentence.split()[:8]) for sentence in sentences[:args.queries]]
+    models = {
+        "sentence_transformer": SentenceTransformerWrapper(reference),
+        f"onnx ({config.get('onnx', {}) or 'default options'})": OnnxEmbeddingWrapper(model_path, args.model),
+    }
+    results = {name: benchmark_model(model, sentences, queries, args.batch_size) for name, model in models.items()}
+    baseline = results["sentence_transformer"]["embeddings"]
+
+    print(f"Model: {args.model} vs {reference} | sentences: {len(sentences)} | batch size: {args.batch_size}")
+    print("| implementation | sentences/s | query p50 (ms) | query p95 (ms) | cosine vs reference (min / mean) |")
+    print("|----------------|-------------|----------------|----------------|----------------------------------|")
+    for name, result in results.items():
+        cosine = _cosine(result["embeddings"], baseline)
+        print(f"| {name} | {result['sentences_per_second']:.1f} | {result['p50_ms']:.2f} | "
+              f"{result['p95_ms']:.2f} | {cosine.min():.4f} / {cosine.mean():.4f} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Bounded LRU cache with TTL for query embeddings, keyed by model and normalized text."""
+
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_query(sentence: str) -> str:
+    """
+    Canonical form of a query used as cache key: unicode NFC, surrounding
+    whitespace stripped and inner whitespace collapsed. Case is kept because
+    cased models embed "US" and "us" differently.
+    """
+    return " ".join(unicodedata.normalize("NFC", str(sentence)).split())
+
+
+class QueryEmbeddingCache:
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 3600.0):
+        """
+        Args:
+            max_size: Maximum number of cached embeddings (least recently used are evicted)
+            ttl_seconds: Time after which an entry expires (0 disables expiry)
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, model_name: str, sentence: str):
+        """Returns the cached embedding or None on a miss."""
+        key = (model_name, normalize_query(sentence))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                embedding, stored_at = entry
+                if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+                    del self._entries[key]
+                    self.expirations += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return embedding
+            self.misses += 1
+            return None
+
+    def put(self, model_name: str, sentence: str, embedding: np.ndarray):
+        """Stores a read-only copy of the embedding, evicting the LRU entries if full."""
+        if self.max_size <= 0:
+            return
+        embedding = np.array(embedding, dtype=np.float32)
+        embedding.setflags(write=False)
+        key = (model_name, normalize_query(sentence))
+        with self._lock:
+            self._entries[key] = (embedding, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self, model_name: str = None):
+        """Drops every entry, or only the entries of one model."""
+        with self._lock:
+            if model_name is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == model_name]:
+                    del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Process-wide cache used by encode_queries in embeddings.py
+QUERY_CACHE = QueryEmbeddingCache(
+    max_size=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600")),
+)
@@ -0,0 +1,334 @@
+"""
+Local disk cache of S3 artifacts (models, embeddings, indexes, catalogs).
+Objects are stored by bucket, key and ETag:
+
+    <ARTIFACT_CACHE_DIR>/s3/<sha256(bucket/key)>/<etag>/<basename>
+
+so two keys with the same basename never collide and a changed object is
+fetched again under its new ETag. Downloads go to a temporary file that is
+checked (size, and MD5 for single-part ETags) and renamed into place, under an
+flock shared by every process on the host. Large objects are fetched with
+parallel range GETs. The total size is capped (ARTIFACT_CACHE_MAX_MB) by
+evicting the least recently used versions.
+
+Set S3_ENDPOINT_URL to use a local S3 stand-in (moto server, MinIO).
+"""
+import concurrent.futures
+import fcntl
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+import boto3
+import botocore.exceptions
+
+from src.utils.logger import logger
+
+# Local directory where S3 artifacts are downloaded once and shared by every process
+ARTIFACT_CACHE_DIR = os.getenv("ARTIFACT_CACHE_DIR", "/tmp/movie-recommender-cache")
+# Maximum size of cached S3 objects in MB (0 means no cap)
+ARTIFACT_CACHE_MAX_MB = float(os.getenv("ARTIFACT_CACHE_MAX_MB", "0"))
+# Seconds a checked ETag is trusted before asking S3 again
+ARTIFACT_CACHE_REVALIDATE_SECONDS = float(os.getenv("ARTIFACT_CACHE_REVALIDATE_SECONDS", "300"))
+# Objects larger than this are downloaded with parallel range GETs
+S3_MULTIPART_THRESHOLD_MB = float(os.getenv("S3_MULTIPART_THRESHOLD_MB", "64"))
+S3_MULTIPART_CHUNK_MB = float(os.getenv("S3_MULTIPART_CHUNK_MB", "16"))
+S3_DOWNLOAD_CONCURRENCY = int(os.getenv("S3_DOWNLOAD_CONCURRENCY", "8"))
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+
+_STREAM_CHUNK_BYTES = 8 * 1024 * 1024
+
+
+def parse_s3_path(s3_path: str):
+    """'s3://bucket/path/to/key' -> ('bucket', 'path/to/key')"""
+    if not s3_path.startswith("s3://"):
+        raise ValueError(f"Not an S3 path: {s3_path}")
+    bucket, _, key = s3_path[len("s3://"):].partition("/")
+    if not bucket or not key:
+        raise ValueError(f"S3 path needs a bucket and a key: {s3_path}")
+    return bucket, key
+
+
+def s3_client():
+    return boto3.client("s3", endpoint_url=S3_ENDPOINT_URL)
+
+
+@contextmanager
+def _file_lock(path: str, blocking: bool = True):
+    """Exclusive flock on path (created if needed); yields False if not blocking and busy."""
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _precondition_failed(error) -> bool:
+    """Whether a ClientError is S3 rejecting an IfMatch ETag (HTTP 412)."""
+    code = str(error.response.get("Error", {}).get("Code", ""))
+    status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return code in ("PreconditionFailed", "412") or status == 412
+
+
+def _dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+class ArtifactCache:
+    def __init__(self, directory: str = ARTIFACT_CACHE_DIR, max_bytes: int = 0,
+                 revalidate_seconds: float = ARTIFACT_CACHE_REVALIDATE_SECONDS,
+                 multipart_threshold: int = int(S3_MULTIPART_THRESHOLD_MB * 1024**2),
+                 chunk_size: int = int(S3_MULTIPART_CHUNK_MB * 1024**2),
+                 concurrency: int = S3_DOWNLOAD_CONCURRENCY, client_factory=s3_client):
+        """
+        Args:
+            directory: Cache root (objects live under '<directory>/s3')
+            max_bytes: Size cap of cached objects (0 means no cap)
+            revalidate_seconds: How long a HEADed ETag is reused without asking S3
+            multipart_threshold: Objects of at least this size use parallel range GETs
+            chunk_size: Bytes per range GET
+            concurrency: Parallel range GETs per object
+            client_factory: Returns a boto3 S3 client (e.g. one pointed at moto)
+        """
+        self.root = os.path.join(directory, "s3")
+        self.max_bytes = int(max_bytes)
+        self.revalidate_seconds = revalidate_seconds
+        self.multipart_threshold = max(1, int(multipart_threshold))
+        self.chunk_size = max(1, int(chunk_size))
+        self.concurrency = max(1, concurrency)
+        self.client_factory = client_factory
+        self._client = None
+        self._lock = threading.Lock()
+        # (bucket, key) -> (etag, size, checked at)
+        self._etags = {}
+        self.hits = 0
+        self.downloads = 0
+        self.downloaded_bytes = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(max_bytes=int(ARTIFACT_CACHE_MAX_MB * 1024**2))
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = self.client_factory()
+            return self._client
+
+    def _key_dir(self, bucket: str, key: str) -> str:
+        return os.path.join(self.root, hashlib.sha256(f"{bucket}/{key}".encode()).hexdigest()[:32])
+
+    def _head(self, bucket: str, key: str):
+        """Current (etag, size) of an object, reusing a recent answer."""
+        cached = self._etags.get((bucket, key))
+        if cached is not None and time.monotonic() - cached[2] < self.revalidate_seconds:
+            return cached[0], cached[1]
+        response = self.client.head_object(Bucket=bucket, Key=key)
+        etag, size = response["ETag"].strip('"'), int(response["ContentLength"])
+        self._etags[(bucket, key)] = (etag, size, time.monotonic())
+        return etag, size
+
+    def _latest_local(self, key_dir: str, basename: str):
+        """Most recently used cached version of a key, or None."""
+        versions = []
+        if os.path.isdir(key_dir):
+            for name in os.listdir(key_dir):
+                path = os.path.join(key_dir, name, basename)
+                if os.path.exists(path):
+                    versions.append((os.path.getmtime(path), path))
+        return max(versions)[1] if versions else None
+
+    def fetch(self, s3_path: str) -> str:
+        """
+        Returns the local path of the current version of an S3 object,
+        downloading it once per ETag for all processes on the host.
+
+        Raises:
+            ValueError: If a downloaded object fails its integrity check
+            botocore.exceptions.ClientError: If S3 fails and no cached copy exists
+        """
+        bucket, key = parse_s3_path(s3_path)
+        basename = os.path.basename(key)
+        key_dir = self._key_dir(bucket, key)
+        try:
+            etag, size = self._head(bucket, key)
+        except Exception as e:
+            # S3 unreachable: serve the last cached version if there is one
+            path = self._latest_local(key_dir, basename)
+            if path is None:
+                raise
+            logger.warning(f"Could not check {s3_path} ({e}), using cached {path}")
+            return path
+
+        try:
+            return self._fetch_version(bucket, key, etag, size, key_dir, basename)
+        except botocore.exceptions.ClientError as e:
+            if not _precondition_failed(e):
+                raise
+            # The remembered ETag is outdated (the object was replaced since the last
+            # HEAD and its cached version removed): ask S3 again and retry once
+            logger.info(f"{s3_path} changed since ETag {etag} was checked, fetching the current version")
+            self._etags.pop((bucket, key), None)
+            etag, size = self._head(bucket, key)
+            return self._fetch_version(bucket, key, etag, size, key_dir, basename)
+
+    def _fetch_version(self, bucket: str, key: str, etag: str, size: int, key_dir: str, basename: str) -> str:
+        """Local path of one version of an object, downloading it if it is not cached."""
+        version_dir = os.path.join(key_dir, re.sub(r"[^A-Za-z0-9_-]", "_", etag))
+        path = os.path.join(version_dir, basename)
+        if not os.path.exists(path):
+            os.makedirs(version_dir, exist_ok=True)
+            with _file_lock(f"{version_dir}.lock"):
+                # Another process may have finished the download while we waited
+                if not os.path.exists(path):
+                    self._download(bucket, key, etag, size, path)
+                    # mtime tracks last use for LRU eviction (atime is often disabled)
+                    os.utime(path)
+                    self._drop_other_versions(key_dir, version_dir)
+                    self._evict(keep=version_dir)
+                    return path
+        with self._lock:
+            self.hits += 1
+        os.utime(path)
+        return path
+
+    def _download(self, bucket: str, key: str, etag: str, size: int, path: str):
+        start = time.perf_counter()
+        tmp_path = f"{path}.{os.getpid()}.part"
+        try:
+            if size >= self.multipart_threshold:
+                self._download_ranges(bucket, key, etag, size, tmp_path)
+            else:
+                self._download_single(bucket, key, etag, tmp_path)
+            self._verify(tmp_path, etag, size)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with self._lock:
+            self.downloads += 1
+            self.downloaded_bytes += size
+        elapsed = time.perf_counter() - start
+        logger.info(f"Downloaded s3://{bucket}/{key} ({size / 1024**2:.1f} MB) to {path} in {elapsed:.2f}s "
+                    f"({size / 1024**2 / max(elapsed, 1e-9):.0f} MB/s)")
+
+    def _download_single(self, bucket: str, key: str, etag: str, tmp_path: str):
+        body = self.client.get_object(Bucket=bucket, Key=key, IfMatch=etag)["Body"]
+        with open(tmp_path, "wb") as f:
+            for chunk in iter(lambda: body.read(_STREAM_CHUNK_BYTES), b""):
+                f.write(chunk)
+
+    def _download_ranges(self, bucket: str, key: str, etag: str, size: int, tmp_path: str):
+        with open(tmp_path, "wb") as f:
+            f.truncate(size)
+        fd = os.open(tmp_path, os.O_WRONLY)
+
+        def fetch_range(offset: int):
+            stop = min(offset + self.chunk_size, size) - 1
+            # IfMatch makes every part come from the same version of the object
+            body = self.client.get_object(Bucket=bucket, Key=key, IfMatch=etag, Range=f"bytes={offset}-{stop}")["Body"]
+            position = offset
+            for chunk in iter(lambda: body.read(_STREAM_CHUNK_BYTES), b""):
+                os.pwrite(fd, chunk, position)
+                position += len(chunk)
+            if position != stop + 1:
+                raise ValueError(f"Short read for bytes {offset}-{stop} of s3://{bucket}/{key}")
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                list(pool.map(fetch_range, range(0, size, self.chunk_size)))
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _verify(path: str, etag: str, size: int):
+        if os.path.getsize(path) != size:
+            raise ValueError(f"Downloaded {os.path.getsize(path)} bytes, expected {size}")
+        # Single-part uploads have the MD5 of the content as ETag; multipart ETags
+        # ('<md5>-<parts>') depend on the upload part size and are only size-checked
+        if re.fullmatch(r"[0-9a-f]{32}", etag):
+            digest = hashlib.md5()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(_STREAM_CHUNK_BYTES), b""):
+                    digest.update(block)
+            if digest.hexdigest() != etag:
+                raise ValueError(f"MD5 of {path} does not match ETag {etag}")
+
+    def _drop_other_versions(self, key_dir: str, keep: str):
+        """Removes older versions of a key (memory maps of them stay valid until closed)."""
+        for name in os.listdir(key_dir):
+            path = os.path.join(key_dir, name)
+            if path != keep and os.path.isdir(path):
+                self._remove_version(path)
+
+    def _remove_version(self, version_dir: str) -> bool:
+        with _file_lock(f"{version_dir}.lock", blocking=False) as locked:
+            if not locked:
+                return False
+            shutil.rmtree(version_dir, ignore_errors=True)
+        os.remove(f"{version_dir}.lock")
+        with self._lock:
+            self.evictions += 1
+        logger.info(f"Removed cached artifact {version_dir}")
+        return True
+
+    def _versions(self) -> list:
+        """(last use, size, directory) of every cached version."""
+        versions = []
+        if not os.path.isdir(self.root):
+            return versions
+        for key_name in os.listdir(self.root):
+            key_dir = os.path.join(self.root, key_name)
+            if not os.path.isdir(key_dir):
+                continue
+            for name in os.listdir(key_dir):
+                version_dir = os.path.join(key_dir, name)
+                if os.path.isdir(version_dir):
+                    files = [os.path.join(version_dir, f) for f in os.listdir(version_dir)]
+                    last_use = max((os.path.getmtime(f) for f in files), default=0.0)
+                    versions.append((last_use, _dir_size(version_dir), version_dir))
+        return versions
+
+    def _evict(self, keep: str = None):
+        """Removes least recently used versions until the cache fits in max_bytes."""
+        if self.max_bytes <= 0:
+            return
+        with _file_lock(os.path.join(self.root, ".evict.lock")):
+            versions = sorted(self._versions())
+            total = sum(size for _, size, _ in versions)
+            for _, size, version_dir in versions:
+                if total <= self.max_bytes:
+                    break
+                if version_dir != keep and self._remove_version(version_dir):
+                    total -= size
+            if total > self.max_bytes:
+                logger.warning(f"Artifact cache holds {total / 1024**2:.0f} MB, over its "
+                               f"{self.max_bytes / 1024**2:.0f} MB cap")
+
+    def stats(self) -> dict:
+        versions = self._versions()
+        return {
+            "directory": self.root,
+            "max_mb": self.max_bytes / 1024**2,
+            "size_mb": sum(size for _, size, _ in versions) / 1024**2,
+            "objects": len(versions),
+            "hits": self.hits,
+            "downloads": self.downloads,
+            "downloaded_mb": self.downloaded_bytes / 1024**2,
+            "evictions": self.evictions,
+        }
+
+
+# Shared by every S3 read of the process
+ARTIFACT_CACHE = ArtifactCache.from_env()
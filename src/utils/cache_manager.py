@@ -0,0 +1,275 @@
+"""
+Process-wide, size-aware cache for loaded models, vector indexes and the catalog.
+Every entry records its measured footprint in bytes. When the total exceeds
+the memory budget (or the host runs low on available RAM) the entries with
+the lowest LRU/LFU-weighted score are evicted; pinned entries (preloaded
+models and the catalog) are never evicted for space.
+
+Loads go through get_or_load(), which is single-flight per key: concurrent
+callers for a cold entry wait for one in-flight load instead of each
+downloading and building their own copy.
+"""
+import concurrent.futures
+import math
+import os
+import threading
+import time
+
+import psutil
+
+from src.utils.logger import logger
+
+# Global budget for cached entries in MB (0 means no budget, only the host RAM check)
+CACHE_BUDGET_MB = float(os.getenv("CACHE_BUDGET_MB", "0"))
+# Seconds of recency one extra order of magnitude of hits is worth when picking a victim
+CACHE_LFU_WEIGHT_SECONDS = float(os.getenv("CACHE_LFU_WEIGHT_SECONDS", "60"))
+
+
+def available_ram_bytes() -> int:
+    """Available RAM of the host in bytes."""
+    return psutil.virtual_memory().available
+
+
+def process_rss_bytes() -> int:
+    """Resident memory of the current process in bytes."""
+    return psutil.Process(os.getpid()).memory_info().rss
+
+
+def measure_nbytes(value) -> int:
+    """
+    Resident footprint of a cached value: numpy arrays, vector indexes and the
+    catalog expose `nbytes` (memory maps count as 0, they live in the page cache);
+    torch-based model wrappers are measured through their parameters and buffers.
+    """
+    nbytes = getattr(value, "nbytes", None)
+    if nbytes is not None:
+        return int(nbytes)
+    module = getattr(value, "model", None)
+    if module is not None and hasattr(module, "parameters"):
+        tensors = list(module.parameters()) + list(module.buffers())
+        return int(sum(tensor.numel() * tensor.element_size() for tensor in tensors))
+    return 0
+
+
+# One cached value with its size and usage statistics
+class _Entry:
+    __slots__ = ("value", "nbytes", "pinned", "hits", "last_access", "load_seconds", "loaded_at")
+
+    def __init__(self, value, nbytes: int, pinned: bool, load_seconds: float):
+        self.value = value
+        self.nbytes = nbytes
+        self.pinned = pinned
+        self.hits = 0
+        self.load_seconds = load_seconds
+        self.loaded_at = self.last_access = time.monotonic()
+
+    def score(self, lfu_weight: float) -> float:
+        # Recency in seconds, boosted logarithmically by how often the entry was used
+        return self.last_access + lfu_weight * math.log1p(self.hits)
+
+
+class CacheManager:
+    def __init__(self, budget_bytes: int = 0, lfu_weight_seconds: float = CACHE_LFU_WEIGHT_SECONDS):
+        """
+        Args:
+            budget_bytes: Maximum total size of cached entries (0 disables the budget)
+            lfu_weight_seconds: Weight of the hit count against recency when evicting
+        """
+        self.budget_bytes = int(budget_bytes)
+        self.lfu_weight = lfu_weight_seconds
+        self._entries = {}
+        self._lock = threading.RLock()
+        # In-flight loads: (namespace, key) -> (Future, start time)
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.loads = 0
+        self.load_failures = 0
+        self.coalesced = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(budget_bytes=int(CACHE_BUDGET_MB * 1024**2))
+
+    def get(self, namespace: str, key: str):
+        """Returns the cached value or None on a miss."""
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                self.misses += 1
+                return None
+            entry.hits += 1
+            entry.last_access = time.monotonic()
+            self.hits += 1
+            return entry.value
+
+    def get_or_load(self, namespace: str, key: str, load_fn):
+        """
+        Returns the cached value, or loads it once for all concurrent callers.
+
+        Args:
+            load_fn: Blocking function that loads the value, caches it with put()
+                (with its size and pin state) and returns it
+
+        Raises:
+            Exception: Whatever load_fn raised, re-raised in every waiting caller
+        """
+        value = self.get(namespace, key)
+        if value is not None:
+            return value
+        with self._lock:
+            value = self._entry_value(namespace, key)
+            if value is not None:
+                return value
+            in_flight = self._loading.get((namespace, key))
+            if in_flight is None:
+                future = concurrent.futures.Future()
+                self._loading[(namespace, key)] = (future, time.monotonic())
+                self.loads += 1
+            else:
+                future = in_flight[0]
+                self.coalesced += 1
+        if in_flight is not None:
+            logger.info(f"Waiting for in-flight load of {namespace} '{key}'")
+            return future.result()
+
+        try:
+            value = load_fn()
+        except BaseException as e:
+            with self._lock:
+                self.load_failures += 1
+                del self._loading[(namespace, key)]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[(namespace, key)]
+        future.set_result(value)
+        return value
+
+    def _entry_value(self, namespace: str, key: str):
+        entry = self._entries.get((namespace, key))
+        return None if entry is None else entry.value
+
+    def __contains__(self, item) -> bool:
+        with self._lock:
+            return item in self._entries
+
+    def keys(self, namespace: str = None) -> list:
+        with self._lock:
+            return [key for (ns, key) in self._entries if namespace is None or ns == namespace]
+
+    def put(self, namespace: str, key: str, value, nbytes: int = None, pinned: bool = False,
+            load_seconds: float = 0.0):
+        """
+        Caches a value, evicting other entries if it does not fit in the budget.
+
+        Args:
+            nbytes: Measured footprint (defaults to measure_nbytes(value))
+            pinned: Never evict this entry for space (e.g. preloaded models)
+            load_seconds: Time the value took to load, reported in stats
+        """
+        nbytes = measure_nbytes(value) if nbytes is None else int(nbytes)
+        with self._lock:
+            self._entries.pop((namespace, key), None)
+            self._evict_for(nbytes)
+            self._entries[(namespace, key)] = _Entry(value, nbytes, pinned, load_seconds)
+        logger.info(f"Cached {namespace} '{key}' ({nbytes / 1024**2:.1f} MB, pinned: {pinned}, "
+                    f"total: {self.total_bytes / 1024**2:.1f} MB)")
+        return value
+
+    def pop(self, namespace: str, key: str):
+        """Removes an entry (pinned or not) and returns its value, or None."""
+        with self._lock:
+            entry = self._entries.pop((namespace, key), None)
+        return None if entry is None else entry.value
+
+    def clear(self, namespace: str = None, include_pinned: bool = False):
+        """Drops the entries of a namespace (or all), keeping pinned ones unless asked."""
+        with self._lock:
+            for item in list(self._entries):
+                if (namespace is None or item[0] == namespace) and (include_pinned or not self._entries[item].pinned):
+                    del self._entries[item]
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.nbytes for entry in self._entries.values())
+
+    def ensure_available(self, required_bytes: int):
+        """
+        Makes room before loading something of about required_bytes: evicts
+        entries until both the budget and the host's available RAM allow it.
+
+        Raises:
+            MemoryError: If not enough memory can be freed
+        """
+        with self._lock:
+            self._evict_for(required_bytes)
+            while available_ram_bytes() < required_bytes:
+                if not self._evict_one():
+                    raise MemoryError(
+                        f"Not enough memory to load ~{required_bytes / 1024**3:.2f}GB "
+                        f"and could not free more memory."
+                    )
+
+    def _evict_for(self, nbytes: int):
+        if self.budget_bytes <= 0:
+            return
+        while sum(entry.nbytes for entry in self._entries.values()) + nbytes > self.budget_bytes:
+            if not self._evict_one():
+                logger.warning(f"Cache budget of {self.budget_bytes / 1024**2:.0f} MB exceeded "
+                               f"by pinned entries")
+                return
+
+    def _evict_one(self) -> bool:
+        """Evicts the unpinned entry with the lowest LRU/LFU score; False if none is left."""
+        candidates = [(entry.score(self.lfu_weight), item) for item, entry in self._entries.items()
+                      if not entry.pinned]
+        if not candidates:
+            return False
+        _, item = min(candidates)
+        entry = self._entries.pop(item)
+        self.evictions += 1
+        logger.info(f"Evicted {item[0]} '{item[1]}' ({entry.nbytes / 1024**2:.1f} MB, {entry.hits} hits)")
+        return True
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            entries = [
+                {
+                    "namespace": namespace,
+                    "key": key,
+                    "size_mb": entry.nbytes / 1024**2,
+                    "pinned": entry.pinned,
+                    "hits": entry.hits,
+                    "load_seconds": entry.load_seconds,
+                    "idle_seconds": now - entry.last_access,
+                }
+                for (namespace, key), entry in self._entries.items()
+            ]
+            loading = [
+                {"namespace": namespace, "key": key, "elapsed_seconds": now - started}
+                for (namespace, key), (_, started) in self._loading.items()
+            ]
+            lookups = self.hits + self.misses
+            return {
+                "budget_mb": self.budget_bytes / 1024**2,
+                "size_mb": sum(entry["size_mb"] for entry in entries),
+                "available_ram_mb": available_ram_bytes() / 1024**2,
+                "process_rss_mb": process_rss_bytes() / 1024**2,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "loads": self.loads,
+                "load_failures": self.load_failures,
+                "coalesced_loads": self.coalesced,
+                "loading": loading,
+                "entries": entries,
+            }
+
+
+# Single cache shared by the embedding models and the recommendation service
+CACHE = CacheManager.from_env()
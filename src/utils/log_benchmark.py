@@ -0,0 +1,139 @@
+"""
+Benchmark of the logging setup: time spent on the calling (request) thread
+per log record, and time until every record is written, for
+    - the previous setup (basicConfig root handlers plus the logger's own
+      file and console handlers: each record written four times, synchronously),
+    - one synchronous handler set,
+    - the queue setup of src/utils/logger.py (text, JSON, JSON with sampling).
+    python -m src.utils.log_benchmark --records 5000 --threads 1 8
+
+Records go to files in a temporary directory; the console handler writes to a
+file too, so terminal speed does not skew the numbers.
+"""
+import argparse
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from logging.handlers import QueueListener
+
+import numpy as np
+
+from src.utils.logger import (LOG_QUEUE_SIZE, TEXT_FORMAT, DroppingQueueHandler, SamplingFilter,
+                              make_formatter)
+
+# Message shaped like the service's per-request lines
+_MESSAGE = "Selected top %d movies from %d filtered movies"
+
+
+def _handlers(directory: str, name: str, formatter: logging.Formatter) -> list:
+    handlers = [logging.StreamHandler(open(os.path.join(directory, f"{name}.console"), "a")),
+                logging.FileHandler(os.path.join(directory, f"{name}.log"))]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def _setup(kind: str, directory: str):
+    """Returns (logger, listener or None, handlers to close, queue handler or None)."""
+    logger = logging.getLogger(f"log_benchmark.{kind}")
+    logger.handlers.clear()
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if kind == "previous":
+        parent = logging.getLogger("log_benchmark")
+        parent.handlers.clear()
+        parent.propagate = False
+        root_handlers = _handlers(directory, "root", logging.Formatter(TEXT_FORMAT))
+        for handler in root_handlers:
+            parent.addHandler(handler)
+        own = _handlers(directory, kind, logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+        for handler in own:
+            logger.addHandler(handler)
+        logger.propagate = True
+        return logger, None, root_handlers + own, None
+    if kind == "sync":
+        handlers = _handlers(directory, kind, make_formatter("text"))
+        for handler in handlers:
+            logger.addHandler(handler)
+        return logger, None, handlers, None
+    log_format, _, sampled = kind.partition("+")
+    handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    if sampled:
+        handler.addFilter(SamplingFilter({"log_benchmark": 0.1}))
+    logger.addHandler(handler)
+    handlers = _handlers(directory, kind, make_formatter(log_format))
+    listener = QueueListener(handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return logger, listener, handlers, handler
+
+
+def benchmark(kind: str, num_records: int, num_threads: int, directory: str) -> dict:
+    """
+    Logs num_records INFO records split over num_threads threads.
+
+    Returns:
+        dict: Calling-thread latency per record (mean, p99 in microseconds),
+        total time until all records are written, and records dropped by a full queue
+    """
+    logger, listener, handlers, queue_handler = _setup(kind, directory)
+    per_thread = num_records // num_threads
+    latencies = [None] * num_threads
+
+    def work(slot: int):
+        timings = np.empty(per_thread)
+        for i in range(per_thread):
+            started = time.perf_counter()
+            logger.info(_MESSAGE, i, num_records)
+            timings[i] = time.perf_counter() - started
+        latencies[slot] = timings
+
+    threads = [threading.Thread(target=work, args=(slot,)) for slot in range(num_threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if listener is not None:
+        listener.stop()  # returns once every queued record is written
+    total = time.perf_counter() - start
+    for handler in handlers:
+        handler.close()
+
+    timings = np.concatenate(latencies) * 1e6
+    return {
+        "mean_us": float(timings.mean()),
+        "p99_us": float(np.percentile(timings, 99)),
+        "total_ms": total * 1000,
+        "dropped": queue_handler.dropped if queue_handler is not None else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the per-record cost of the logging setups.")
+    parser.add_argument("--records", type=int, default=5000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8])
+    args = parser.parse_args()
+
+    kinds = {
+        "previous": "previous (4 synchronous handlers)",
+        "sync": "single handler set, synchronous",
+        "text": "queue, text",
+        "json": "queue, JSON",
+        "json+sampled": "queue, JSON, sampled 10%",
+    }
+    print(f"Records: {args.records} INFO lines | queue size: {LOG_QUEUE_SIZE}")
+    print("| setup | threads | caller mean (us) | caller p99 (us) | all written (ms) | dropped |")
+    print("|-------|---------|------------------|-----------------|------------------|---------|")
+    with tempfile.TemporaryDirectory() as directory:
+        for num_threads in args.threads:
+            for kind, label in kinds.items():
+                result = benchmark(kind, args.records, num_threads, directory)
+                print(f"| {label} | {num_threads} | {result['mean_us']:.1f} | {result['p99_us']:.1f} | "
+                      f"{result['total_ms']:.0f} | {result['dropped']} |")
+
+
+if __name__ == "__main__":
+    main()
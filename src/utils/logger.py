@@ -1,45 +1,198 @@
+"""
+Logging setup shared by every module (`from src.utils.logger import logger`).
+
+Records are not written on the calling thread: the 'MovieRecommender' logger
+only puts them on a bounded in-memory queue (QueueHandler), and a
+QueueListener thread formats and writes them to a single handler set, stdout
+and LOG_FILE. When the queue is full records are dropped (and counted) rather
+than blocking a request. The logger does not propagate to the root logger, so
+each record is written once per handler.
+
+LOG_FORMAT=json writes one JSON object per line (timestamp, level, module,
+function, message, process, thread, plus any `extra=` fields).
+
+LOG_SAMPLE_RATES keeps only a share of the DEBUG/INFO records of hot-path
+modules, e.g. "recommendation_service=0.1,embeddings=0.5" (module file names,
+"*" for every other module). Warnings and errors are always kept.
+"""
+import atexit
+import copy
+import json
 import logging
 import os
+import queue
+import random
 import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
 
 # Determine the project root directory and the logs folder
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 LOG_DIR = os.path.join(PROJECT_ROOT, 'logs')
 
-# Create the logs directory if it doesn't exist
-if not os.path.exists(LOG_DIR):
-    os.makedirs(LOG_DIR)
+# Define the logfile path (LOG_FILE="" logs to stdout only)
+LOG_FILE = os.getenv("LOG_FILE", os.path.join(LOG_DIR, 'project.log'))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
 
-# Define the logfile path
-LOG_FILE = os.path.join(LOG_DIR, 'project.log')
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(module)s.%(funcName)s: %(message)s"
 
-# Configure logging with both file and console handlers
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(module)s.%(funcName)s: %(message)s",
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Attributes every LogRecord has; anything else was passed with extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+_EXCEPTION_FORMATTER = logging.Formatter()
 
-# Create a global logger
-logger = logging.getLogger('MovieRecommender')
-logger.setLevel(logging.INFO)  # Default to INFO level for production
 
-# File handler
-file_handler = logging.FileHandler(LOG_FILE)
-file_handler.setLevel(logging.DEBUG)
+# One JSON object per record, for log shippers (CloudWatch, Loki, ...)
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "function": record.funcName,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+def make_formatter(log_format: str = None) -> logging.Formatter:
+    """
+    Raises:
+        ValueError: If the format is neither 'text' nor 'json'
+    """
+    log_format = log_format or LOG_FORMAT
+    if log_format == "json":
+        return JsonFormatter()
+    if log_format == "text":
+        return logging.Formatter(TEXT_FORMAT)
+    raise ValueError(f"Unknown LOG_FORMAT '{log_format}' (expected 'text' or 'json')")
+
+
+def parse_sample_rates(spec: str) -> dict:
+    """Parses 'module=rate,...' into {module: rate}, rates clipped to [0, 1]."""
+    rates = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        module, _, rate = item.partition("=")
+        rates[module.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+# Keeps a random share of the DEBUG/INFO records of the configured modules.
+# It runs on the calling thread before the record is queued, so dropped
+# records cost no formatting or I/O.
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = dict(rates)
+        self.default_rate = self.rates.pop("*", 1.0)
+        self.dropped = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.module, self.default_rate)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        self.dropped[record.module] = self.dropped.get(record.module, 0) + 1
+        return False
+
+
+# Non-blocking QueueHandler: drops (and counts) records when the listener falls behind
+class DroppingQueueHandler(QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only resolve what cannot cross threads; formatting is left to the listener
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = _EXCEPTION_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
 
-# Console handler
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setLevel(logging.DEBUG)
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
 
-# Log format
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
-console_handler.setFormatter(formatter)
 
-# Add handlers to logger
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
\ No newline at end of file
+def make_handlers(log_file: str = None, log_format: str = None) -> list:
+    """The single handler set: stdout, plus the log file unless log_file is ''."""
+    log_file = LOG_FILE if log_file is None else log_file
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+        handlers.append(logging.FileHandler(log_file))
+    formatter = make_formatter(log_format)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _start_listener():
+    """Replaces the logger's queue handler and starts a listener thread writing its records."""
+    global _listener
+    with _listener_lock:
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        handler = DroppingQueueHandler(log_queue)
+        handler.addFilter(sampling_filter)
+        for old in list(logger.handlers):
+            logger.removeHandler(old)
+        logger.addHandler(handler)
+        _listener = QueueListener(log_queue, *make_handlers(), respect_handler_level=True)
+        _listener.start()
+
+
+def _after_fork():
+    # A forked child (process-pool worker) inherits the queue but not the listener thread
+    global _listener, _listener_lock
+    _listener, _listener_lock = None, threading.Lock()
+    _start_listener()
+
+
+def shutdown():
+    """Writes the queued records and stops the listener (registered with atexit)."""
+    with _listener_lock:
+        if _listener is not None and _listener._thread is not None:
+            _listener.stop()
+
+
+def stats() -> dict:
+    """Records dropped by sampling (per module) and by a full queue."""
+    handlers = [handler for handler in logger.handlers if isinstance(handler, DroppingQueueHandler)]
+    return {
+        "sampled_out": dict(sampling_filter.dropped),
+        "queue_dropped": sum(handler.dropped for handler in handlers),
+        "queue_size": sum(handler.queue.qsize() for handler in handlers),
+    }
+
+
+# Create a global logger
+logger = logging.getLogger('MovieRecommender')
+logger.setLevel(LOG_LEVEL)
+logger.propagate = False
+sampling_filter = SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES))
+
+_start_listener()
+atexit.register(shutdown)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
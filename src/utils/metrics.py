@@ -0,0 +1,208 @@
+"""
+Prometheus metrics of the serving process, served by GET /metrics.
+The text exposition format is rendered here, so no client library is needed.
+
+Request stages are timed with spans:
+    with span("encode", model_name):
+        ...
+which record into the movie_recommender_stage_seconds histogram labelled by
+stage and model. Values kept by other components (cache hit/miss counters,
+cached model memory, executor queue depth) are read at scrape time by
+collectors registered with add_collector.
+
+Metrics are per process: with several uvicorn workers each one answers
+/metrics for itself, and spans recorded in process-pool workers
+(INFERENCE_EXECUTOR=process) are not exported.
+
+Slow-request profiling: with PROFILE_SAMPLE_RATE > 0 that share of requests
+runs under cProfile (or pyinstrument with PROFILER=pyinstrument); the profile
+of each sampled request slower than PROFILE_SLOW_MS is written to PROFILE_DIR.
+One request is profiled at a time per process.
+"""
+import bisect
+import itertools
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from src.utils.logger import LOG_DIR, logger
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "500"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(LOG_DIR, "profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))
+PROFILER = os.getenv("PROFILER", "cprofile").lower()
+
+# Upper bounds (seconds) of the stage histogram buckets, from cache hits to cold model loads
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+                 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+# Cumulative histogram of observations, one series per combination of label values
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=STAGE_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), then the sum
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> list:
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_values, series in sorted(snapshot.items()):
+            labels = dict(zip(self.labelnames, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels({**labels, 'le': _number(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(labels)} {cumulative}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("movie_recommender_stage_seconds",
+                          "Duration of each stage of recommendation requests and model loads.",
+                          ("stage", "model"))
+
+_collectors = []
+
+
+def add_collector(collector):
+    """
+    Registers a function read at every scrape. It returns a list of
+    (name, type, help, samples) with samples a list of (labels dict, value);
+    type is 'counter' or 'gauge'.
+    """
+    _collectors.append(collector)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = STAGE_SECONDS.render()
+    for collector in _collectors:
+        try:
+            families = collector()
+        except Exception as e:
+            logger.warning(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+            continue
+        for name, metric_type, documentation, samples in families:
+            lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}"]
+            lines += [f"{name}{_labels(labels)} {_number(value)}" for labels, value in samples]
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def span(stage: str, model: str = ""):
+    """Times the enclosed block into the stage histogram (also when it raises)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage, model)
+
+
+_profile_lock = threading.Lock()
+_profile_numbers = itertools.count()
+
+
+def _start_profiler():
+    """
+    Raises:
+        ImportError: If PROFILER=pyinstrument without the pyinstrument package
+    """
+    if PROFILER == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError as e:
+            raise ImportError("PROFILER=pyinstrument but the pyinstrument package is not installed "
+                              "(pip install pyinstrument)") from e
+        profiler = Profiler(async_mode="disabled")
+        profiler.start()
+        return profiler
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _save_profile(profiler, label: str, elapsed_ms: float):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", label)
+    stem = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{elapsed_ms:.0f}ms-"
+                                     f"{os.getpid()}-{next(_profile_numbers)}")
+    if PROFILER == "pyinstrument":
+        path = f"{stem}.html"
+        with open(path, "w") as f:
+            f.write(profiler.output_html())
+    else:
+        path = f"{stem}.prof"
+        profiler.dump_stats(path)
+    logger.warning(f"Slow request {label} took {elapsed_ms:.0f} ms, profile saved to {path}")
+
+    # Keep only the newest PROFILE_MAX_FILES profiles
+    profiles = sorted((os.path.join(PROFILE_DIR, f) for f in os.listdir(PROFILE_DIR)), key=os.path.getmtime)
+    for old in profiles[:max(len(profiles) - PROFILE_MAX_FILES, 0)]:
+        os.remove(old)
+
+
+@contextmanager
+def profile_if_slow(label: str):
+    """
+    Profiles a sampled share (PROFILE_SAMPLE_RATE) of the enclosed blocks on the
+    calling thread and saves the profile when the block took at least
+    PROFILE_SLOW_MS. Other blocks run unprofiled.
+    """
+    if PROFILE_SAMPLE_RATE <= 0 or random.random() >= PROFILE_SAMPLE_RATE \
+            or not _profile_lock.acquire(blocking=False):
+        yield
+        return
+    try:
+        profiler = _start_profiler()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if PROFILER == "pyinstrument":
+                profiler.stop()
+            else:
+                profiler.disable()
+            if elapsed_ms >= PROFILE_SLOW_MS:
+                try:
+                    _save_profile(profiler, label, elapsed_ms)
+                except OSError as e:
+                    logger.warning(f"Could not save the profile of {label}: {e}")
+    finally:
+        _profile_lock.release()
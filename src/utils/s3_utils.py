@@ -1,34 +1,48 @@
 import os
-import boto3
-from urllib.parse import urlparse
+import tempfile
 import pandas as pd
 import numpy as np
-from io import BytesIO
 from src.utils.logger import logger
+from src.utils.artifact_cache import ARTIFACT_CACHE, ARTIFACT_CACHE_DIR, parse_s3_path, s3_client
 
-def download_model_from_s3(s3_model_path: str, local_dir: str = "/tmp") -> str:
+def download_model_from_s3(s3_model_path: str) -> str:
     """
-    Downloads a file from S3 given its s3_model_path (e.g., "s3://my-bucket/path/to/model.onnx").
-    Saves the file in the local folder specified by local_dir (defaults to "/tmp").
+    Downloads a file from S3 given its s3_model_path (e.g., "s3://my-bucket/path/to/model.onnx")
+    into the local artifact cache (once per object version, shared by every process).
     
     Returns the local path to the downloaded file.
     """
     if not s3_model_path.startswith("s3://"):
         raise ValueError("s3_model_path must start with 's3://'.")
-    
-    # Extract bucket and key from S3 path
-    s3_path_trim = s3_model_path[len("s3://"):]
-    bucket, key = s3_path_trim.split("/", 1)
-    
-    # Define local output path
-    local_path = os.path.join(local_dir, os.path.basename(key))
-    
-    # If file doesn't exist locally, download it
-    if not os.path.exists(local_path):
-        s3 = boto3.client("s3")
-        s3.download_file(bucket, key, local_path)
-    
-    return local_path 
+    return ARTIFACT_CACHE.fetch(s3_model_path)
+
+def download_to_cache(s3_path: str) -> str:
+    """
+    Downloads an S3 object once into ARTIFACT_CACHE_DIR and returns the local path,
+    so it can be memory-mapped and shared through the page cache by every process.
+    """
+    return ARTIFACT_CACHE.fetch(s3_path)
+
+def save_artifact(path: str, save_fn):
+    """
+    Writes an artifact with save_fn(local_path) to a local path or an S3 URI.
+    S3 artifacts are written to a unique temporary file in ARTIFACT_CACHE_DIR
+    (keeping the basename's extension), uploaded and removed, so concurrent
+    builds never overwrite each other's files.
+    """
+    if not path.startswith("s3://"):
+        save_fn(path)
+        return
+    bucket, key = parse_s3_path(path)
+    os.makedirs(ARTIFACT_CACHE_DIR, exist_ok=True)
+    handle, local_path = tempfile.mkstemp(suffix=f"-{os.path.basename(key)}", dir=ARTIFACT_CACHE_DIR)
+    os.close(handle)
+    try:
+        save_fn(local_path)
+        s3_client().upload_file(local_path, bucket, key)
+        logger.info(f"Uploaded {path}")
+    finally:
+        os.remove(local_path)
 
 def read_from_s3(s3_path: str):
     """
@@ -50,22 +64,19 @@ def read_from_s3(s3_path: str):
         
         logger.info(f"Parsed S3 path - Bucket: {bucket}, Key: {key}")
         
-        s3_client = boto3.client('s3')
-        response = s3_client.get_object(Bucket=bucket, Key=key)
-        
-        # Read full content into memory
-        file_content = BytesIO(response['Body'].read())
+        if not (s3_path.endswith('.npy') or s3_path.endswith('.csv')):
+            raise ValueError(f"Unsupported file type: {s3_path}")
+
+        # Read through the local artifact cache so cold loads do not refetch
+        local_path = ARTIFACT_CACHE.fetch(s3_path)
         
         # For numpy files (.npy)
         if s3_path.endswith('.npy'):
             logger.info("Loading .npy file from S3")
-            return np.load(file_content)
+            return np.load(local_path)
         # For CSV files
-        elif s3_path.endswith('.csv'):
-            logger.info("Loading .csv file from S3")
-            return pd.read_csv(file_content)
-        else:
-            raise ValueError(f"Unsupported file type: {s3_path}")
+        logger.info("Loading .csv file from S3")
+        return pd.read_csv(local_path)
             
     except Exception as e:
         logger.error(f"Error reading from S3: {str(e)}")
@@ -1,7 +1,7 @@
 #!/bin/bash
 
 # Inicia la API (FastAPI) en segundo plano
-uvicorn src.api.api:app --host 0.0.0.0 --port 8000 &
+uvicorn src.api.api:app --host 0.0.0.0 --port 8000 --workers "${UVICORN_WORKERS:-1}" &
 
 # Inicia la aplicación Gradio (este comando se bloquea)
 python -m src.gradio.app --server-name="0.0.0.0" --server-port=7860 
\ No newline at end of file